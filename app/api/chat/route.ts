@@ -79,6 +79,34 @@ function detectCategory(message: string): keyof typeof responses {
 
 const API_TIMEOUT = 15000; // 15 seconds
 
+// Local Python inference service (python -m src.ml.inference_server)
+const INFERENCE_URL = process.env.INFERENCE_URL || 'http://127.0.0.1:8000';
+const INFERENCE_TIMEOUT = 5000; // 5 seconds
+
+// Ask the local models for a response, or return null if the service is unavailable
+async function getLocalModelResponse(message: string): Promise<string | null> {
+  const controller = new AbortController();
+  const timeoutId = setTimeout(() => controller.abort(), INFERENCE_TIMEOUT);
+
+  try {
+    const response = await fetch(`${INFERENCE_URL}/respond`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ text: message }),
+      signal: controller.signal
+    });
+    if (!response.ok) return null;
+
+    const data = await response.json();
+    return typeof data.response === 'string' ? data.response : null;
+  } catch (error) {
+    console.error('Inference service error:', error);
+    return null;
+  } finally {
+    clearTimeout(timeoutId);
+  }
+}
+
 // Available free models
 const MODELS = {
   DEEPSEEK: "deepseek/deepseek-v3-base:free",
@@ -118,12 +146,9 @@ export async function POST(req: Request) {
     let responseText: string;
 
     if (model === 'local') {
-      // TODO: Implement logic to call your local Python model here.
-      // You would need to run the Python script as a child process
-      // or use a library like python-shell.
-      // For now, returning a placeholder response.
-      console.log("Using local model (placeholder)");
-      responseText = `(Using Local Model) You said: ${message}`;
+      console.log("Using local model");
+      // Fall back to pre-written responses if the inference service is unavailable
+      responseText = (await getLocalModelResponse(message)) ?? getRandomResponse(detectCategory(message));
     } else { // model === 'api'
       console.log("Using API model");
       // Use AbortController for better timeout handling
@@ -1,7 +1,41 @@
 import { NextResponse } from 'next/server';
 import { z } from 'zod';
 
-// Mock sentiment analysis function
+// Local Python inference service (python -m src.ml.inference_server)
+const INFERENCE_URL = process.env.INFERENCE_URL || 'http://127.0.0.1:8000';
+const INFERENCE_TIMEOUT = 5000; // 5 seconds
+
+// Score a message with the sentiment model, or return null if the service is unavailable
+async function predictSentiment(text: string): Promise<number | null> {
+  const controller = new AbortController();
+  const timeoutId = setTimeout(() => controller.abort(), INFERENCE_TIMEOUT);
+
+  try {
+    const response = await fetch(`${INFERENCE_URL}/predict`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ text }),
+      signal: controller.signal
+    });
+    if (!response.ok) return null;
+
+    const data = await response.json();
+    const prediction = data.predictions?.sentiment;
+    if (!prediction) return null;
+
+    // Map the predicted class and its confidence onto the -1 to 1 score
+    if (prediction.label === 'positive') return prediction.confidence;
+    if (prediction.label === 'negative') return -prediction.confidence;
+    return 0;
+  } catch (error) {
+    console.error('Inference service error:', error);
+    return null;
+  } finally {
+    clearTimeout(timeoutId);
+  }
+}
+
+// Mock sentiment analysis function, used when the inference service is unavailable
 function analyzeSentiment(text: string): number {
   // This is a mock implementation
   // In a real application, you would use a proper sentiment analysis model
@@ -30,7 +64,7 @@ export async function POST(request: Request) {
     const body = await request.json();
     const { text } = sentimentRequestSchema.parse(body);
     
-    const sentiment = analyzeSentiment(text);
+    const sentiment = (await predictSentiment(text)) ?? analyzeSentiment(text);
     
     return NextResponse.json({
       sentiment,
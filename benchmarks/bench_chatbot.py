@@ -0,0 +1,44 @@
+"""Compare one-at-a-time MultiModelChatbot.predict with predict_batch.
+
+Run from the repository root against a directory holding emotion_model,
+sentiment_model and intent_model:
+
+    python -m benchmarks.bench_chatbot --model-dir models --samples 1000
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from src.ml.models.multi_model import MultiModelChatbot
+
+TASKS = ["emotion", "sentiment", "intent"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--csv', default='processed_emotion_dataset.csv')
+    parser.add_argument('--samples', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    chatbot = MultiModelChatbot({task: f"{args.model_dir}/{task}_model" for task in TASKS})
+    texts = pd.read_csv(args.csv)['text'].sample(args.samples, random_state=0).tolist()
+
+    start = time.perf_counter()
+    for text in texts:
+        chatbot.predict(text)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chatbot.predict_batch(texts, batch_size=args.batch_size)
+    batched = time.perf_counter() - start
+
+    print(f"predict:       {len(texts) / single:8.1f} messages/s")
+    print(f"predict_batch: {len(texts) / batched:8.1f} messages/s "
+          f"({single / batched:.1f}x, batch size {args.batch_size})")
+
+
+if __name__ == "__main__":
+    main()
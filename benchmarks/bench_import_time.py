@@ -0,0 +1,60 @@
+"""Measure how long it takes to import the training scripts in a fresh interpreter.
+
+For comparison it also times the imports the scripts used to run eagerly
+(TensorFlow, the sklearn estimators and NLTK). The old scripts also called
+nltk.download() three times at import, which is not included in that number.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_import_time
+"""
+import importlib.util
+import statistics
+import subprocess
+import sys
+
+REPEATS = 5
+
+# Imports each training script performed at module level before they were deferred
+EAGER_IMPORTS = {
+    "model1_logistic": ["sklearn.feature_extraction.text", "sklearn.model_selection",
+                        "sklearn.linear_model", "sklearn.metrics", "nltk"],
+    "model2_svm": ["sklearn.feature_extraction.text", "sklearn.model_selection",
+                   "sklearn.svm", "sklearn.metrics", "nltk"],
+    "model3_lstm": ["tensorflow", "sklearn.model_selection", "nltk"],
+}
+
+
+def time_import(statement):
+    """Median wall time of running ``statement`` in a fresh interpreter, minus startup."""
+    def run(code):
+        timer = "import time; _t = time.perf_counter(); {}; print(time.perf_counter() - _t)"
+        output = subprocess.run([sys.executable, "-c", timer.format(code)],
+                                check=True, capture_output=True, text=True).stdout
+        return float(output.strip().splitlines()[-1])
+
+    return statistics.median(run(statement) for _ in range(REPEATS))
+
+
+def main():
+    # What the scripts share for preprocessing, on its own
+    preprocessing = time_import("import src.ml.preprocessing")
+    print(f"src.ml.preprocessing: {preprocessing * 1000:8.1f} ms")
+
+    for module, eager in EAGER_IMPORTS.items():
+        # Pandas, numpy and joblib are imported in both versions
+        base = time_import("import pandas, numpy, joblib")
+        now = time_import(f"import {module}")
+
+        available = [name for name in eager if importlib.util.find_spec(name.split(".")[0])]
+        missing = sorted(set(eager) - set(available))
+        before = base + time_import("; ".join(f"import {name}" for name in available))
+
+        print(f"{module}:")
+        print(f"  import now:          {now * 1000:8.1f} ms")
+        print(f"  eager imports:       {before * 1000:8.1f} ms"
+              + (f"  (not installed: {', '.join(missing)})" if missing else ""))
+
+
+if __name__ == "__main__":
+    main()
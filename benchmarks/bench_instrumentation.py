@@ -0,0 +1,85 @@
+"""Measure the overhead of src.ml.instrumentation.
+
+Reports the cost of one ``stage`` block while disabled and enabled, then
+preprocesses the same messages in batches (the unit the chatbot and the
+scorers time) with instrumentation off, on, and on with the sampling profiler
+running. The settings take turns for ``--repeats`` rounds and the fastest
+run of each is kept.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_instrumentation --csv processed_sentiment_dataset.csv
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from src.ml import instrumentation
+from src.ml.preprocessing import TextPreprocessor
+
+MODES = ("disabled", "enabled", "enabled + profiler")
+
+
+def stage_cost_ns(iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with instrumentation.stage("bench.empty"):
+            pass
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def run_batches(preprocessor: TextPreprocessor, batches) -> float:
+    # Fresh token cache, so every run does the same work
+    preprocessor._normalize_token.cache_clear()
+    start = time.perf_counter()
+    for batch in batches:
+        preprocessor.batch(batch)
+    return time.perf_counter() - start
+
+
+def set_mode(mode: str):
+    instrumentation.disable()
+    instrumentation.profiler.stop()
+    if mode != "disabled":
+        instrumentation.enable()
+    if mode == "enabled + profiler":
+        instrumentation.profiler.start()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default='processed_sentiment_dataset.csv')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--limit', type=int, default=20000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    instrumentation.disable()
+    disabled_ns = stage_cost_ns(args.iterations)
+    instrumentation.enable()
+    enabled_ns = stage_cost_ns(args.iterations)
+    print(f"stage block: {disabled_ns:6.0f} ns disabled, {enabled_ns:6.0f} ns enabled")
+
+    texts = pd.read_csv(args.csv)['text'].astype(str).tolist()[:args.limit]
+    batches = [texts[i:i + args.batch_size] for i in range(0, len(texts), args.batch_size)]
+    preprocessor = TextPreprocessor()
+
+    # Settings take turns, so drift in machine speed affects them alike
+    best = dict.fromkeys(MODES, float("inf"))
+    for _ in range(args.repeats):
+        for mode in MODES:
+            set_mode(mode)
+            best[mode] = min(best[mode], run_batches(preprocessor, batches))
+    set_mode("disabled")
+
+    print(f"preprocess {len(texts)} messages in batches of {args.batch_size}:")
+    for mode, elapsed in best.items():
+        print(f"  {mode:<19} {elapsed * 1000:9.1f} ms  ({(elapsed / best['disabled'] - 1) * 100:+.2f}%)")
+    print(f"profiler: {instrumentation.profiler.samples} samples, top function "
+          f"{instrumentation.profiler.top(1)[0]['function'] if instrumentation.profiler.samples else '-'}")
+
+
+if __name__ == "__main__":
+    main()
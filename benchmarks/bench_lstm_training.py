@@ -0,0 +1,57 @@
+"""Compare LSTM epoch times of the padded numpy input and the tf.data pipeline.
+
+Each combination of input mode (padded arrays vs. length-bucketed tf.data) and
+LSTM variant (recurrent dropout vs. the fused kernel) trains a fresh model for
+a few epochs on the same tokenized data. The first epoch also traces the
+training step, so the median of the remaining epochs is reported next to it.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_lstm_training --csv data/augmented/processed_train.csv
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import model3_lstm
+from src.ml.preprocessing import preprocess_batch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default=model3_lstm.DATA_PATH)
+    parser.add_argument('--rows', type=int, default=None, help='Only use the first N rows')
+    parser.add_argument('--epochs', type=int, default=4)
+    args = parser.parse_args()
+
+    from tensorflow import keras
+
+    df = pd.read_csv(args.csv, nrows=args.rows)
+    texts = preprocess_batch(df['Context'] + ' ' + df['Response'])
+    y = df['is_question'].values
+    tokenizer = keras.preprocessing.text.Tokenizer(num_words=model3_lstm.VOCAB_SIZE)
+    tokenizer.fit_on_texts(texts)
+    sequences = tokenizer.texts_to_sequences(texts)
+    lengths = np.array([min(len(sequence), model3_lstm.MAX_LEN) for sequence in sequences])
+    print(f"{len(sequences)} sequences, length p50/p95/max: {np.percentile(lengths, 50):.0f} / "
+          f"{np.percentile(lengths, 95):.0f} / {lengths.max()} (padded mode pads all to {model3_lstm.MAX_LEN})")
+
+    trainers = {'padded': model3_lstm.train_padded, 'tf.data': model3_lstm.train_tf_data}
+    results = []
+    for mode, train in trainers.items():
+        for fused_lstm in (False, True):
+            keras.backend.clear_session()
+            timer, times = model3_lstm.epoch_timer()
+            train(sequences, y, fused_lstm, [timer], epochs=args.epochs)
+            results.append((mode, 'fused' if fused_lstm else 'recurrent dropout', times))
+
+    print(f"\n{'input':<8} {'lstm':<18} {'first epoch':>12} {'later epochs':>13}")
+    baseline = np.median(results[0][2][1:])
+    for mode, lstm, times in results:
+        steady = np.median(times[1:])
+        print(f"{mode:<8} {lstm:<18} {times[0]:11.2f}s {steady:12.2f}s  ({baseline / steady:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Compare the pickled Keras tokenizer of model 3 with the exported vocabulary.
+
+Cold load (imports included, up to encoding the first message) is measured in
+a fresh interpreter per format. Encoding throughput is measured on the same
+texts once both are loaded, after checking that the padded arrays match.
+
+Run from the repository root after training (or exporting with
+``python -m src.ml.lstm_vocabulary``):
+
+    python -m benchmarks.bench_lstm_vocabulary --model-dir models/saved_models/model3
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+HEAVY_MODULES = ("tensorflow", "keras", "pandas")
+
+COLD_LOAD = {
+    "pickle": (
+        "import joblib\n"
+        "from tensorflow import keras\n"
+        "tokenizer = joblib.load('{dir}/tokenizer.pkl')\n"
+        "keras.preprocessing.sequence.pad_sequences(tokenizer.texts_to_sequences(['i feel great today']), maxlen=100)\n"
+    ),
+    "vocabulary": (
+        "from src.ml.lstm_vocabulary import SequenceVocabulary\n"
+        "vocabulary = SequenceVocabulary.load('{dir}/vocabulary')\n"
+        "vocabulary.encode(['i feel great today'])\n"
+    ),
+}
+
+
+def cold_load(code: str):
+    timed = (f"import sys, time\nstart = time.perf_counter()\n{code}"
+             f"print(time.perf_counter() - start)\n"
+             f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n")
+    output = subprocess.run([sys.executable, "-c", timed], check=True, capture_output=True, text=True)
+    elapsed, modules = output.stdout.split("\n")[-3:-1]
+    return float(elapsed), modules or "none"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-dir', default='models/saved_models/model3')
+    parser.add_argument('--csv', default='processed_sentiment_dataset.csv')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    for name, code in COLD_LOAD.items():
+        runs = [cold_load(code.format(dir=args.model_dir)) for _ in range(args.repeats)]
+        print(f"{name:<10} cold load + first message: {np.median([t for t, _ in runs]) * 1000:8.1f} ms "
+              f"(median of {args.repeats}), imports: {runs[0][1]}")
+    for name, file_names in (("pickle", ["tokenizer.pkl"]),
+                             ("vocabulary", [os.path.join("vocabulary", f) for f in ("vocabulary.json", "words.txt")])):
+        size = sum(os.path.getsize(os.path.join(args.model_dir, f)) for f in file_names)
+        print(f"{name:<10} size: {size / 1024:.0f} KB")
+
+    import joblib
+    from tensorflow import keras
+    from src.ml.lstm_vocabulary import SequenceVocabulary
+
+    tokenizer = joblib.load(os.path.join(args.model_dir, 'tokenizer.pkl'))
+    vocabulary = SequenceVocabulary.load(os.path.join(args.model_dir, 'vocabulary'))
+    texts = pd.read_csv(args.csv)['text'].astype(str).tolist()
+
+    encoders = {
+        "pickle": lambda batch: keras.preprocessing.sequence.pad_sequences(
+            tokenizer.texts_to_sequences(batch), maxlen=vocabulary.maxlen),
+        "vocabulary": vocabulary.encode,
+    }
+    reference = encoders["pickle"](texts)
+    print(f"identical arrays: {np.array_equal(encoders['vocabulary'](texts), reference)}")
+    for name, encode in encoders.items():
+        start = time.perf_counter()
+        encode(texts)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<10} encode: {len(texts) / elapsed:9.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
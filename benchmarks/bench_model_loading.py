@@ -0,0 +1,90 @@
+"""Compare eager, lazy and memory-budgeted loading of the chatbot's task models.
+
+Each mode runs in its own interpreter, so startup and memory are measured
+from a clean process. Reported per mode: constructor time, RSS after startup,
+latency of the first prediction (which loads the models in lazy mode), RSS
+after a prediction per task, and loads/evictions. The modes are:
+
+    eager    every model loaded in the constructor, as before
+    lazy     each model loaded on its first prediction
+    budget   lazy, with --budget-mb of loaded models at most
+
+Run from the repository root:
+
+    python -m benchmarks.bench_model_loading --models models/manifest.json --budget-mb 500
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+MODES = {
+    "eager": {},
+    "lazy": {"lazy": True},
+    "budget": {"lazy": True},
+}
+
+
+def measure(mode, models, budget_mb, text):
+    """Runs inside the child interpreter and prints one JSON line."""
+    from src.ml.models.multi_model import MultiModelChatbot
+
+    options = dict(MODES[mode])
+    if mode == "budget":
+        options["memory_budget_mb"] = budget_mb
+    chatbot = MultiModelChatbot(models, cache_size=0, **options)
+    startup = chatbot.memory_stats()
+
+    start = time.perf_counter()
+    chatbot.predict(text)
+    first_ms = (time.perf_counter() - start) * 1000
+    # One prediction per task, as traffic touching each model in turn would
+    for task in chatbot.available_tasks():
+        chatbot.predict(text, tasks=[task])
+    stats = chatbot.memory_stats()
+
+    print(json.dumps({
+        "mode": mode,
+        "startup_s": startup["startup_seconds"],
+        "startup_rss_mb": startup.get("rss_mb", startup.get("max_rss_mb")),
+        "first_predict_ms": round(first_ms, 1),
+        "rss_mb": stats.get("rss_mb", stats.get("max_rss_mb")),
+        "loaded_mb": stats["loaded_mb"],
+        "loads": stats["loads"],
+        "evictions": stats["evictions"],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', default='models/manifest.json',
+                        help="Manifest written by src.ml.models.train_tasks")
+    parser.add_argument('--budget-mb', type=float, default=500.0)
+    parser.add_argument('--text', default="I have been feeling anxious about my exams")
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--child', choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure(args.child, args.models, args.budget_mb, args.text)
+        return
+
+    results = []
+    for mode in args.modes:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_model_loading", "--child", mode,
+             "--models", args.models, "--budget-mb", str(args.budget_mb), "--text", args.text],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'mode':<7} {'startup s':>9} {'startup RSS MB':>15} {'first predict ms':>17} "
+          f"{'RSS MB':>8} {'loaded MB':>10} {'loads':>6} {'evictions':>10}")
+    for r in results:
+        print(f"{r['mode']:<7} {r['startup_s']:9.3f} {r['startup_rss_mb']:15.1f} {r['first_predict_ms']:17.1f} "
+              f"{r['rss_mb']:8.1f} {r['loaded_mb']:10.1f} {r['loads']:6d} {r['evictions']:10d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compare the joblib pickles of model 1 or 2 with the fused pipeline artifact.
+
+Cold-load time (imports included) is measured in a fresh interpreter per
+format, up to and including scoring the first message, which also shows which
+heavy libraries each path imports. Per-message latency and batched throughput
+are measured once both are loaded; preprocessing is included since a server
+pays for it on every message.
+
+Run from the repository root after training (or exporting with
+``python -m src.ml.linear_pipeline``):
+
+    python -m benchmarks.bench_pipeline --model-dir models/saved_models/model1
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+LATENCY_SAMPLES = 1000
+
+HEAVY_MODULES = ("sklearn", "scipy", "pandas", "nltk")
+
+COLD_LOAD = {
+    "pickle": (
+        "import joblib\n"
+        "from src.ml.preprocessing import preprocess_text\n"
+        "model = joblib.load('{dir}/model.pkl')\n"
+        "vectorizer = joblib.load('{dir}/vectorizer.pkl')\n"
+        "model.predict_proba(vectorizer.transform([preprocess_text('I feel great today')]))\n"
+    ),
+    "pipeline": (
+        "from src.ml.linear_pipeline import LinearPipeline\n"
+        "pipeline = LinearPipeline.load('{dir}/pipeline')\n"
+        "pipeline.predict_proba(['I feel great today'])\n"
+    ),
+}
+
+
+def cold_load(code: str):
+    timed = (f"import sys, time\nstart = time.perf_counter()\n{code}"
+             f"print(time.perf_counter() - start)\n"
+             f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n")
+    output = subprocess.run([sys.executable, "-c", timed], check=True, capture_output=True, text=True)
+    elapsed, modules = output.stdout.split("\n")[-3:-1]
+    return float(elapsed), modules or "none"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-dir', default='models/saved_models/model1')
+    parser.add_argument('--csv', default='processed_sentiment_dataset.csv')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    for name, code in COLD_LOAD.items():
+        runs = [cold_load(code.format(dir=args.model_dir)) for _ in range(args.repeats)]
+        print(f"{name:<8} cold load + first message: {np.median([t for t, _ in runs]) * 1000:8.1f} ms "
+              f"(median of {args.repeats}), imports: {runs[0][1]}")
+
+    import joblib
+    from src.ml.linear_pipeline import LinearPipeline
+    from src.ml.preprocessing import preprocess_batch, preprocess_text
+
+    model = joblib.load(os.path.join(args.model_dir, 'model.pkl'))
+    vectorizer = joblib.load(os.path.join(args.model_dir, 'vectorizer.pkl'))
+    pipeline = LinearPipeline.load(os.path.join(args.model_dir, 'pipeline'))
+    texts = pd.read_csv(args.csv)['text'].astype(str).tolist()
+    sample = texts[:LATENCY_SAMPLES]
+
+    scorers = {
+        "pickle": lambda batch: model.predict_proba(vectorizer.transform(preprocess_batch(batch))),
+        "pipeline": pipeline.predict_proba,
+    }
+    reference = scorers["pickle"](texts)
+    print(f"max probability difference: {np.abs(scorers['pipeline'](texts) - reference).max():.2e}")
+
+    preprocess_text(sample[0])  # warm the preprocessor
+    for name, score in scorers.items():
+        latencies = []
+        for text in sample:
+            start = time.perf_counter()
+            score([text])
+            latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        score(texts)
+        batched = time.perf_counter() - start
+        print(f"{name:<8} latency p50/p99: {np.percentile(latencies, 50) * 1000:.3f} / "
+              f"{np.percentile(latencies, 99) * 1000:.3f} ms, batch: {len(texts) / batched:9.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Compare the shared preprocessing engine against the original per-call function.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_preprocessing
+"""
+import re
+import time
+
+import pandas as pd
+from nltk.tokenize import word_tokenize
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+
+from src.ml.preprocessing import TextPreprocessor
+
+DATASETS = ['processed_emotion_dataset.csv', 'processed_sentiment_dataset.csv']
+
+
+def legacy_preprocess_text(text):
+    # The function previously copied into every training script
+    text = text.lower()
+    text = re.sub(r'[^a-zA-Z\s]', '', text)
+    tokens = word_tokenize(text)
+    stop_words = set(stopwords.words('english'))
+    tokens = [word for word in tokens if word not in stop_words]
+    lemmatizer = WordNetLemmatizer()
+    tokens = [lemmatizer.lemmatize(word) for word in tokens]
+    return ' '.join(tokens)
+
+
+def main():
+    for path in DATASETS:
+        texts = pd.read_csv(path)['text']
+
+        start = time.perf_counter()
+        expected = texts.apply(legacy_preprocess_text)
+        legacy_time = time.perf_counter() - start
+
+        # Fresh instance so the timing includes building resources and a cold cache
+        start = time.perf_counter()
+        preprocessor = TextPreprocessor()
+        actual = preprocessor.batch(texts)
+        engine_time = time.perf_counter() - start
+
+        mismatches = int((expected != actual).sum())
+        print(f"{path}: {len(texts)} rows")
+        print(f"  legacy: {legacy_time:.2f}s  engine: {engine_time:.2f}s  "
+              f"speedup: {legacy_time / engine_time:.1f}x")
+        print(f"  mismatched rows: {mismatches}")
+        print(f"  token cache: {preprocessor.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Compare load time, memory and latency of the fp32 and exported chatbot runtimes.
+
+Each runtime is measured in its own interpreter so memory numbers don't mix.
+Export the models first with ``python -m src.ml.models.export``, then run
+from the repository root:
+
+    python -m benchmarks.bench_runtimes --model-dir models
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+TASKS = ["emotion", "sentiment", "intent"]
+RUNTIMES = ["torch", "onnx", "torch-int8"]
+
+
+def _rss_mb():
+    # Current resident set size (Linux)
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() / 2 ** 20
+
+
+def _artifact_mb(path):
+    # Files directly in ``path``, so the fp32 size doesn't include the export subdirectories
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file()) / 2 ** 20
+
+
+def measure(runtime, model_dir, csv, samples, batch_size):
+    """Runs inside the child interpreter and prints one JSON line."""
+    texts = pd.read_csv(csv)["text"].sample(samples, random_state=0).tolist()
+    import torch  # noqa: F401 - imported before the baseline so it isn't counted as model memory
+    from src.ml.models.multi_model import MultiModelChatbot
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    chatbot = MultiModelChatbot({task: f"{model_dir}/{task}_model" for task in TASKS}, runtime=runtime)
+    load_time = time.perf_counter() - start
+    rss_after = _rss_mb()
+
+    chatbot.predict(texts[0])  # warm up
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        chatbot.predict(text)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    chatbot.predict_batch(texts, batch_size=batch_size)
+    batched = time.perf_counter() - start
+
+    artifact_mb = sum(
+        _artifact_mb(f"{model_dir}/{task}_model" if runtime == "torch" else f"{model_dir}/{task}_model/{runtime}")
+        for task in TASKS
+    )
+    print(json.dumps({
+        "runtime": runtime,
+        "artifact_mb": round(artifact_mb, 1),
+        "load_s": round(load_time, 3),
+        "model_rss_mb": round(rss_after - rss_before, 1),
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "latency_p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+        "batched_msgs_per_s": round(len(texts) / batched, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--csv', default='processed_emotion_dataset.csv')
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--runtimes', nargs='+', default=RUNTIMES)
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure(args.child, args.model_dir, args.csv, args.samples, args.batch_size)
+        return
+
+    for runtime in args.runtimes:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_runtimes", "--child", runtime,
+             "--model-dir", args.model_dir, "--csv", args.csv,
+             "--samples", str(args.samples), "--batch-size", str(args.batch_size)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        print(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Compare the libsvm SVC emotion model with the liblinear + calibration mode.
+
+Reports training time, single-message latency (whole request and
+predict_proba alone), macro-F1 and how often the two modes agree on the label.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_svm [--csv processed_emotion_dataset.csv]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics import f1_score
+from sklearn.model_selection import train_test_split
+
+from model2_svm import SVM_MODES, build_model
+from src.ml.preprocessing import preprocess_batch, preprocess_text
+
+LATENCY_SAMPLES = 500
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default='processed_emotion_dataset.csv')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    texts = preprocess_batch(df['text'])
+    vectorizer = TfidfVectorizer(max_features=5000)
+    X = vectorizer.fit_transform(texts)
+    X_train, X_test, y_train, y_test, _, raw_test = train_test_split(
+        X, df['label'].values, df['text'].values, test_size=0.2, random_state=42
+    )
+
+    predictions = {}
+    for mode in SVM_MODES:
+        model = build_model(mode)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        train_time = time.perf_counter() - start
+
+        predictions[mode] = model.predict(X_test)
+        macro_f1 = f1_score(y_test, predictions[mode], average='macro')
+
+        # One request at a time, the way a server scores messages. The model
+        # latency excludes preprocessing and vectorizing, which both modes share.
+        latencies, model_latencies = [], []
+        for text in raw_test[:LATENCY_SAMPLES]:
+            start = time.perf_counter()
+            features = vectorizer.transform([preprocess_text(text)])
+            model_start = time.perf_counter()
+            model.predict_proba(features)
+            end = time.perf_counter()
+            latencies.append(end - start)
+            model_latencies.append(end - model_start)
+
+        print(f"{mode}:")
+        print(f"  train time:               {train_time:.2f}s")
+        for name, values in (("request", latencies), ("model", model_latencies)):
+            print(f"  {name + ' latency':<15}  p50/p99: {np.percentile(values, 50) * 1000:.3f} / "
+                  f"{np.percentile(values, 99) * 1000:.3f} ms")
+        print(f"  macro-F1:                 {macro_f1:.4f}")
+
+    agreement = np.mean(predictions['svc'] == predictions['linear'])
+    print(f"label agreement svc vs linear: {agreement:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Compare MultiModelChatbot.train_model with static and dynamic padding.
+
+Each setup trains in its own interpreter, so peak memory is measured per
+setup: peak RSS, and peak CUDA memory when training on a GPU. The setups are:
+
+    static       every message padded to max_length (512 for BERT), as before
+    dynamic      batches padded to their longest message, grouped by length,
+                 max_length from the corpus length distribution
+    dynamic-acc  dynamic, with half the batch size and 2 accumulation steps
+                 (same effective batch)
+
+Run from the repository root:
+
+    python -m benchmarks.bench_training_padding --samples 2000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+SETUPS = {
+    "static": {"dynamic_padding": False},
+    "dynamic": {"dynamic_padding": True},
+    "dynamic-acc": {"dynamic_padding": True, "gradient_accumulation_steps": 2},
+}
+
+
+def measure(setup, csv, samples, model_name, batch_size):
+    """Runs inside the child interpreter and prints one JSON line."""
+    import torch
+    from src.ml.models.multi_model import MultiModelChatbot
+
+    df = pd.read_csv(csv).sample(samples, random_state=0)
+    train_data = pd.DataFrame({"text": df["text"].astype(str), "label": pd.factorize(df["label"])[0]})
+    options = dict(SETUPS[setup])
+    if "gradient_accumulation_steps" in options:
+        batch_size //= options["gradient_accumulation_steps"]
+
+    chatbot = MultiModelChatbot(model_paths={})
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        result = chatbot.train_model("emotion", train_data, model_name=model_name, num_epochs=1,
+                                     batch_size=batch_size, output_dir=output_dir, **options)
+        elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "setup": setup,
+        "samples_per_s": round(result.metrics["train_samples_per_second"], 1),
+        "train_s": round(result.metrics["train_runtime"], 1),
+        "total_s": round(elapsed, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_cuda_mb": round(torch.cuda.max_memory_allocated() / 2 ** 20, 1) if torch.cuda.is_available() else None,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default='processed_emotion_dataset.csv')
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--model-name', default='bert-base-uncased')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--setups', nargs='+', choices=list(SETUPS), default=list(SETUPS))
+    parser.add_argument('--child', choices=list(SETUPS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure(args.child, args.csv, args.samples, args.model_name, args.batch_size)
+        return
+
+    results = []
+    for setup in args.setups:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_training_padding", "--child", setup,
+             "--csv", args.csv, "--samples", str(args.samples),
+             "--model-name", args.model_name, "--batch-size", str(args.batch_size)],
+            check=True, capture_output=True, text=True, env={**os.environ, "TOKENIZERS_PARALLELISM": "false"},
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    baseline = results[0]["samples_per_s"]
+    print(f"{'setup':<12} {'samples/s':>10} {'train s':>8} {'peak RSS MB':>12} {'peak CUDA MB':>13}")
+    for r in results:
+        cuda = f"{r['peak_cuda_mb']:13.1f}" if r["peak_cuda_mb"] is not None else f"{'-':>13}"
+        print(f"{r['setup']:<12} {r['samples_per_s']:10.1f} {r['train_s']:8.1f} {r['peak_rss_mb']:12.1f} {cuda}"
+              f"  ({r['samples_per_s'] / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
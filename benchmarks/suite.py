@@ -0,0 +1,377 @@
+"""Benchmark suite for training and inference of every model, with JSON output.
+
+Each group runs in its own interpreter, so imports and peak memory don't leak
+between groups:
+
+    preprocess  preprocess_batch over the messages
+    model1      TF-IDF fit/transform, LogisticRegression fit, predict (model1_logistic)
+    model2      TF-IDF fit/transform, SVM fit, predict (model2_svm)
+    model3      Keras tokenizer, one LSTM epoch, predict (model3_lstm)
+    chatbot     MultiModelChatbot load, predict and predict_batch
+
+Data comes from the bundled ``processed_*_dataset.csv`` files, topped up with
+the seeded ``src.datasets`` generators when ``--rows`` is larger, so every run
+sees the same messages. The chatbot group builds a tiny random BERT checkpoint
+per task (no download) unless ``--chatbot-models`` points at trained ones.
+
+Every case reports seconds (median of ``--repeats`` runs), throughput in
+items/s, latency percentiles for single-message cases, and the peak RSS of
+its process so far. Groups whose dependencies are missing are skipped.
+
+Run from the repository root:
+
+    python -m benchmarks.suite --rows 5000 --output bench.json
+    python -m benchmarks.suite --rows 5000 --compare bench.json
+
+``--compare`` flags every case whose throughput dropped, p95 latency grew or
+peak RSS grew by more than ``--tolerance`` against the baseline, and exits
+with status 1 if any did.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+GROUPS = ("preprocess", "model1", "model2", "model3", "chatbot")
+
+DATASETS = {
+    "sentiment": "processed_sentiment_dataset.csv",
+    "emotion": "processed_emotion_dataset.csv",
+}
+
+CHATBOT_TASKS = ("emotion", "sentiment")
+
+# Lower is better for these; higher for throughput
+LOWER_IS_BETTER = ("p95_ms", "peak_rss_mb")
+
+
+def load_messages(kind: str, rows: int, data_dir: str = ".") -> pd.DataFrame:
+    """``rows`` labelled messages of the bundled dataset, topped up by its generator."""
+    df = pd.read_csv(os.path.join(data_dir, DATASETS[kind]))[["text", "label"]]
+    if rows <= len(df):
+        return df.sample(rows, random_state=0).reset_index(drop=True)
+    if kind == "sentiment":
+        from src.datasets.sentiment_generator import SentimentDataset
+
+        extra = SentimentDataset(seed=0).generate(rows - len(df))
+    else:
+        from src.datasets.emotion_generator import EmotionDataGenerator
+
+        extra = EmotionDataGenerator(seed=0).generate(rows - len(df))
+    return pd.concat([df, extra[["text", "label"]]], ignore_index=True)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 1024), 1)
+
+
+class Recorder:
+    """Times cases and collects their results for one group."""
+
+    def __init__(self, group: str, repeats: int):
+        self.group = group
+        self.repeats = repeats
+        self.cases: Dict[str, Dict[str, Any]] = {}
+
+    def run(self, case: str, items: int, function: Callable[[], Any], repeats: Optional[int] = None) -> Any:
+        """Time ``function`` (median of the repeats) and return its last result."""
+        times = []
+        for _ in range(repeats or self.repeats):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+        seconds = float(np.median(times))
+        self.cases[f"{self.group}.{case}"] = {
+            "items": items,
+            "seconds": round(seconds, 4),
+            "throughput": round(items / seconds, 1) if seconds else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        return result
+
+    def latency(self, case: str, inputs: List[Any], function: Callable[[Any], Any]):
+        """Call ``function`` once per input and record latency percentiles."""
+        function(inputs[0])  # warm-up
+        times = []
+        for item in inputs:
+            start = time.perf_counter()
+            function(item)
+            times.append(time.perf_counter() - start)
+        p50, p95, p99 = np.percentile(times, [50, 95, 99]) * 1000
+        self.cases[f"{self.group}.{case}"] = {
+            "items": len(inputs),
+            "seconds": round(sum(times), 4),
+            "throughput": round(len(inputs) / sum(times), 1),
+            "p50_ms": round(p50, 3),
+            "p95_ms": round(p95, 3),
+            "p99_ms": round(p99, 3),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+def bench_preprocess(recorder: Recorder, args):
+    from src.ml.preprocessing import TextPreprocessor
+
+    texts = load_messages("sentiment", args.rows, args.data_dir)["text"].astype(str).tolist()
+    preprocessor = TextPreprocessor()
+
+    def cold():
+        # Empty token cache, as in a fresh training run
+        preprocessor._normalize_token.cache_clear()
+        return preprocessor.batch(texts)
+
+    recorder.run("batch_cold", len(texts), cold)
+    recorder.run("batch_warm", len(texts), lambda: preprocessor.batch(texts))
+    recorder.latency("single", texts[:args.latency_samples], preprocessor)
+
+
+def bench_linear(recorder: Recorder, args, kind: str, build_model: Callable, vectorizer_params: Dict):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.model_selection import train_test_split
+
+    from src.ml.preprocessing import preprocess_batch, preprocess_text
+
+    df = load_messages(kind, args.rows, args.data_dir)
+    processed = preprocess_batch(df["text"].astype(str).tolist())
+    train_texts, test_texts, y_train, _ = train_test_split(processed, df["label"].values,
+                                                           test_size=0.2, random_state=42)
+
+    vectorizer = recorder.run("vectorizer_fit", len(train_texts),
+                              lambda: TfidfVectorizer(**vectorizer_params).fit(train_texts))
+    X_train = vectorizer.transform(train_texts)
+    X_test = recorder.run("vectorizer_transform", len(test_texts), lambda: vectorizer.transform(test_texts))
+    model = recorder.run("fit", len(train_texts), lambda: build_model().fit(X_train, y_train),
+                         repeats=args.fit_repeats)
+    recorder.run("predict_batch", len(test_texts), lambda: model.predict_proba(X_test))
+    # A served request: preprocessing, vectorizing and scoring one raw message
+    raw = df["text"].astype(str).tolist()[:args.latency_samples]
+    recorder.latency("predict_single", raw,
+                     lambda text: model.predict_proba(vectorizer.transform([preprocess_text(text)])))
+
+
+def bench_model1(recorder: Recorder, args):
+    from model1_logistic import VECTORIZER_PARAMS, build_model
+
+    bench_linear(recorder, args, "sentiment", build_model, VECTORIZER_PARAMS)
+
+
+def bench_model2(recorder: Recorder, args):
+    from model2_svm import VECTORIZER_PARAMS, build_model
+
+    bench_linear(recorder, args, "emotion", lambda: build_model(args.svm_mode), VECTORIZER_PARAMS)
+
+
+def bench_model3(recorder: Recorder, args):
+    from tensorflow import keras
+
+    from model3_lstm import BATCH_SIZE, MAX_LEN, VOCAB_SIZE, build_model
+    from src.ml.preprocessing import preprocess_batch
+
+    # model3 detects questions; the bundled data has no Context/Response pairs,
+    # so the label is whether the message asks something
+    df = load_messages("sentiment", args.rows, args.data_dir)
+    texts = preprocess_batch(df["text"].astype(str).tolist())
+    y = df["text"].astype(str).str.contains("?", regex=False).astype(int).values
+
+    def tokenize():
+        tokenizer = keras.preprocessing.text.Tokenizer(num_words=VOCAB_SIZE)
+        tokenizer.fit_on_texts(texts)
+        return tokenizer, tokenizer.texts_to_sequences(texts)
+
+    tokenizer, sequences = recorder.run("tokenize", len(texts), tokenize)
+    X = keras.preprocessing.sequence.pad_sequences(sequences, maxlen=MAX_LEN)
+    model = build_model()
+    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    # The first epoch also traces the training step; time a steady one
+    model.fit(X, y, epochs=1, batch_size=BATCH_SIZE, verbose=0)
+    recorder.run("fit_epoch", len(X), lambda: model.fit(X, y, epochs=1, batch_size=BATCH_SIZE, verbose=0),
+                 repeats=args.fit_repeats)
+    recorder.run("predict_batch", len(X), lambda: model.predict(X, batch_size=256, verbose=0))
+    recorder.latency("predict_single", list(X[:args.latency_samples]),
+                     lambda row: model.predict_on_batch(row[None, :]))
+
+
+def make_tiny_checkpoint(path: str, df: pd.DataFrame, vocab_size: int = 2000) -> str:
+    """Random 2-layer BERT classifier with a vocabulary of the corpus' most common words."""
+    from collections import Counter
+
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    torch.manual_seed(0)
+    words = Counter(word for text in df["text"].astype(str).str.lower() for word in text.split())
+    special = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    os.makedirs(path, exist_ok=True)
+    vocab_file = os.path.join(path, "vocab.txt")
+    with open(vocab_file, "w") as f:
+        f.write("\n".join(special + [word for word, _ in words.most_common(vocab_size)]))
+    tokenizer = BertTokenizerFast(vocab_file=vocab_file, model_max_length=128)
+
+    labels = sorted(df["label"].astype(str).unique())
+    config = BertConfig(vocab_size=tokenizer.vocab_size, hidden_size=64, num_hidden_layers=2,
+                        num_attention_heads=2, intermediate_size=128, max_position_embeddings=128,
+                        num_labels=len(labels), id2label=dict(enumerate(labels)),
+                        label2id={label: i for i, label in enumerate(labels)})
+    BertForSequenceClassification(config).save_pretrained(path, safe_serialization=True)
+    tokenizer.save_pretrained(path)
+    return path
+
+
+def bench_chatbot(recorder: Recorder, args):
+    import torch
+
+    from src.ml.models.multi_model import MultiModelChatbot
+
+    torch.set_num_threads(args.threads or torch.get_num_threads())
+    frames = {task: load_messages(task, args.rows, args.data_dir) for task in CHATBOT_TASKS}
+    texts = frames["emotion"]["text"].astype(str).tolist()
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        if args.chatbot_models:
+            model_paths = args.chatbot_models
+        else:
+            model_paths = {task: make_tiny_checkpoint(os.path.join(model_dir, f"{task}_model"), df)
+                           for task, df in frames.items()}
+        # No result cache, so repeated messages are scored again
+        chatbot = recorder.run("load", 1, lambda: MultiModelChatbot(model_paths, cache_size=0), repeats=1)
+        recorder.latency("predict_single", texts[:args.latency_samples], chatbot.predict)
+        batch = texts[:args.chatbot_batch_rows]
+        recorder.run("predict_batch", len(batch), lambda: chatbot.predict_batch(batch, batch_size=32))
+
+
+BENCHMARKS = {
+    "preprocess": bench_preprocess,
+    "model1": bench_model1,
+    "model2": bench_model2,
+    "model3": bench_model3,
+    "chatbot": bench_chatbot,
+}
+
+
+def run_group(group: str, args):
+    """Runs inside the child interpreter and prints one JSON line."""
+    recorder = Recorder(group, args.repeats)
+    try:
+        BENCHMARKS[group](recorder, args)
+    except ImportError as e:
+        print(json.dumps({"skipped": f"{group}: {e}"}))
+        return
+    print(json.dumps({"cases": recorder.cases}))
+
+
+def environment() -> Dict[str, Any]:
+    from importlib import metadata
+
+    # Versions from the package metadata; importing the libraries here would
+    # raise this process' peak RSS, which the groups' processes inherit
+    versions = {}
+    for package in ("numpy", "pandas", "scikit-learn", "scipy", "nltk", "tensorflow", "tensorflow-cpu",
+                    "torch", "transformers"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print a current vs baseline table and return the regressed cases."""
+    regressions = []
+    print(f"\n{'case':<34} {'metric':<11} {'baseline':>10} {'current':>10} {'change':>8}")
+    for case, current in results["cases"].items():
+        previous = baseline["cases"].get(case)
+        if previous is None:
+            continue
+        for metric in ("throughput", "p95_ms", "peak_rss_mb"):
+            if not current.get(metric) or not previous.get(metric):
+                continue
+            change = current[metric] / previous[metric] - 1
+            worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            if worse:
+                regressions.append(f"{case} {metric}")
+            print(f"{case:<34} {metric:<11} {previous[metric]:10.2f} {current[metric]:10.2f} "
+                  f"{change * 100:+7.1f}%{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--groups', nargs='+', choices=GROUPS, default=list(GROUPS))
+    parser.add_argument('--rows', type=int, default=5000,
+                        help='Messages per dataset; above the bundled size the generators add more')
+    parser.add_argument('--data-dir', default='.', help='Directory holding processed_*_dataset.csv')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--fit-repeats', type=int, default=1, help='Repeats of the (slow) fit cases')
+    parser.add_argument('--latency-samples', type=int, default=200)
+    parser.add_argument('--svm-mode', default='svc', help='model2 build_model mode')
+    parser.add_argument('--chatbot-models', default=None,
+                        help='Manifest or model directory for the chatbot group (default: tiny random models)')
+    parser.add_argument('--chatbot-batch-rows', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=None, help='Torch threads for the chatbot group')
+    parser.add_argument('--output', default=None, help='Write the results as JSON here')
+    parser.add_argument('--compare', default=None, help='Baseline JSON from an earlier --output')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Relative change beyond which --compare reports a regression')
+    parser.add_argument('--child', choices=GROUPS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_group(args.child, args)
+        return
+
+    results: Dict[str, Any] = {"environment": environment(), "settings": {
+        "rows": args.rows, "repeats": args.repeats, "fit_repeats": args.fit_repeats,
+        "latency_samples": args.latency_samples, "svm_mode": args.svm_mode,
+    }, "cases": {}, "skipped": []}
+    for group in args.groups:
+        print(f"Running {group}...", file=sys.stderr)
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", *sys.argv[1:], "--child", group],
+            check=True, stdout=subprocess.PIPE, text=True,
+            env={**os.environ, "TOKENIZERS_PARALLELISM": "false", "TF_CPP_MIN_LOG_LEVEL": "2"},
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if "skipped" in result:
+            print(f"Skipped {result['skipped']}", file=sys.stderr)
+            results["skipped"].append(result["skipped"])
+        else:
+            results["cases"].update(result["cases"])
+
+    print(f"{'case':<34} {'items/s':>11} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak RSS MB':>12}")
+    for case, r in results["cases"].items():
+        percentiles = "".join(f"{r[key]:9.2f}" if key in r else f"{'-':>9}" for key in ("p50_ms", "p95_ms", "p99_ms"))
+        print(f"{case:<34} {r['throughput']:11.1f}{percentiles} {r['peak_rss_mb']:12.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,102 +1,324 @@
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import classification_report
 import joblib
+import argparse
 import os
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-import re
+import shutil
+import time
 
-# Download required NLTK data
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('wordnet')
+from src.ml.preprocessing import preprocess_batch
+from src.ml.parallel_preprocessing import preprocess_parallel
+from src.ml.corpus_cache import CorpusCache
+from src.ml.nltk_resources import ensure_nltk_resources
+from src.ml.linear_pipeline import export_pipeline
+from src.ml.compact_features import (
+    COMPACT_VECTORIZER_PARAMS, PRUNE_METHODS, PRUNE_TOLERANCE, SizeReport, compact_matrix, csr_nbytes,
+    float64_nbytes, pickled_size, prune_vocabulary, strip_vectorizer
+)
+from src.ml import instrumentation
 
-# Create models directory if it doesn't exist
-os.makedirs('models/saved_models/model1', exist_ok=True)
+DATA_PATH = 'data/augmented/processed_sentiment_dataset.csv'
+MODEL_DIR = 'models/saved_models/model1'
 
-def preprocess_text(text):
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Remove special characters and numbers
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    
-    # Tokenize
-    tokens = word_tokenize(text)
-    
-    # Remove stopwords
-    stop_words = set(stopwords.words('english'))
-    tokens = [word for word in tokens if word not in stop_words]
-    
-    # Lemmatize
-    lemmatizer = WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(word) for word in tokens]
-    
-    return ' '.join(tokens)
+# Streaming mode: feature space of the hashing vectorizer and rows read per chunk
+HASHED_FEATURES = 2 ** 18
+STREAM_CHUNK_SIZE = 50000
+
+# TF-IDF settings; src/ml/sweep.py varies them
+VECTORIZER_PARAMS = {
+    'max_features': 5000,
+    'ngram_range': (1, 2),  # Include bigrams
+    'min_df': 2,
+    'max_df': 0.95,
+}
 
-def load_and_preprocess_data():
+def load_and_preprocess_data(n_workers=None, checkpoint_dir=None, cache=None):
     print("Loading and preprocessing data...")
     
     # Load CSV file
-    df = pd.read_csv('data/augmented/processed_sentiment_dataset.csv')
+    df = pd.read_csv(DATA_PATH)
     
     # Preprocess text
     print("Preprocessing text...")
-    df['processed_text'] = df['text'].apply(preprocess_text)
+    def preprocess():
+        return preprocess_parallel(
+            df['text'], n_workers=n_workers, checkpoint_dir=checkpoint_dir
+        )
+    
+    # Reuse the processed text from an earlier run on the same data
+    if cache is not None:
+        df['processed_text'] = cache.processed_text(cache.dataset_key(DATA_PATH, 'text'), preprocess)
+    else:
+        df['processed_text'] = preprocess()
     
     # Get labels (multi-class sentiment)
     y = df['label'].values  # Using 'label' column which contains sentiment classes
     
     return df['processed_text'], y
 
-def train_model():
+def build_model(C=1.0):
+    from sklearn.linear_model import LogisticRegression
+    
+    return LogisticRegression(
+        multi_class='multinomial',  # For multi-class classification
+        solver='lbfgs',  # Good for multi-class
+        max_iter=1000,
+        C=C
+    )
+
+def train_model(n_workers=None, checkpoint_dir=None, cache_dir=None, download_nltk=False,
+                compact=False, prune=None, prune_tolerance=PRUNE_TOLERANCE):
+    # Training-only dependencies are imported here so importing this module stays cheap
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report
+    
     print("Training Multi-class Logistic Regression Model...")
     
+    # Check the NLTK corpora up front; they are only downloaded when asked to
+    ensure_nltk_resources(download=download_nltk)
+    
+    cache = CorpusCache(cache_dir) if cache_dir else None
+    
     # Load and preprocess data
-    texts, y = load_and_preprocess_data()
-    
-    # Vectorize text
-    vectorizer = TfidfVectorizer(
-        max_features=5000,
-        ngram_range=(1, 2),  # Include bigrams
-        min_df=2,
-        max_df=0.95
-    )
-    X = vectorizer.fit_transform(texts)
+    with instrumentation.stage('train.preprocess'):
+        texts, y = load_and_preprocess_data(n_workers, checkpoint_dir, cache)
+    
+    # Vectorize text (float32 values in compact mode)
+    vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS, **(COMPACT_VECTORIZER_PARAMS if compact else {}))
+    with instrumentation.stage('train.vectorize'):
+        if cache is not None:
+            vectorizer, X = cache.fit_transform(cache.dataset_key(DATA_PATH, 'text'), vectorizer, texts)
+        else:
+            X = vectorizer.fit_transform(texts)
+    
+    # Sizes with float64 features and the full vectorizer, for the report at the end
+    sizes = SizeReport() if compact or prune else None
+    if compact:
+        X = compact_matrix(X)
+    if sizes is not None:
+        sizes.before('feature matrices', float64_nbytes(X))
+        sizes.before('vectorizer.pkl', pickled_size(vectorizer))
     
     # Split data
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, random_state=42
     )
+    del X
     
     # Create and train model with multi-class support
-    model = LogisticRegression(
-        multi_class='multinomial',  # For multi-class classification
-        solver='lbfgs',  # Good for multi-class
-        max_iter=1000,
-        C=1.0
-    )
+    model = build_model()
     
     print("Training model...")
-    model.fit(X_train, y_train)
+    with instrumentation.stage('train.fit'):
+        model.fit(X_train, y_train)
+    
+    # Keep the smallest vocabulary that is about as accurate
+    if prune:
+        sizes.before('model.pkl', pickled_size(model))
+        with instrumentation.stage('train.prune'):
+            vectorizer, model, X_train, X_test, _ = prune_vocabulary(
+                vectorizer, model, build_model, X_train, y_train, X_test,
+                method=prune, tolerance=prune_tolerance
+            )
     
     # Evaluate
-    y_pred = model.predict(X_test)
+    with instrumentation.stage('train.evaluate'):
+        y_pred = model.predict(X_test)
     print("\nClassification Report:")
     print(classification_report(y_test, y_pred))
     
+    if compact:
+        strip_vectorizer(vectorizer)
+    with instrumentation.stage('train.save'):
+        save_model(model, vectorizer)
+    if sizes is not None:
+        sizes.after('feature matrices', csr_nbytes(X_train) + csr_nbytes(X_test))
+        for name in ('vectorizer.pkl', 'model.pkl'):
+            sizes.after(name, os.path.getsize(f'{MODEL_DIR}/{name}'))
+        print(sizes.format())
+    if cache is not None:
+        print(cache.report())
+
+def save_model(model, vectorizer):
+    # Create models directory if it doesn't exist
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    
+    # The streaming mode's hashing vectorizer has no vocabulary to export. Loaders
+    # prefer pipeline/ when it exists, so one left by an earlier TF-IDF run must go
+    # before the new pickles are written
+    if not hasattr(vectorizer, 'vocabulary_'):
+        shutil.rmtree(f'{MODEL_DIR}/pipeline', ignore_errors=True)
+    
     # Save model and vectorizer
     print("Saving model and components...")
-    joblib.dump(model, 'models/saved_models/model1/model.pkl')
-    joblib.dump(vectorizer, 'models/saved_models/model1/vectorizer.pkl')
+    joblib.dump(model, f'{MODEL_DIR}/model.pkl')
+    joblib.dump(vectorizer, f'{MODEL_DIR}/vectorizer.pkl')
+    
+    # Fused artifact for serving
+    if hasattr(vectorizer, 'vocabulary_'):
+        export_pipeline(model, vectorizer, f'{MODEL_DIR}/pipeline')
     
     print("Model saved successfully!")
 
+def build_hashing_vectorizer():
+    # Stateless, so every chunk (and every worker) maps terms to the same columns
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(
+        n_features=HASHED_FEATURES,
+        ngram_range=(1, 2),  # Include bigrams, like the TF-IDF model
+        alternate_sign=False,
+        norm='l2'
+    )
+
+def _featurize_chunk(texts):
+    # Runs in a worker process
+    return build_hashing_vectorizer().transform(preprocess_batch(texts))
+
+def iter_feature_chunks(data_path, chunk_size, n_workers=None):
+    """Yield (features, labels) for each chunk of the CSV, in file order.
+    
+    Chunks are preprocessed and hashed on a process pool. At most two chunks
+    per worker are read ahead, so memory does not grow with the file size.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    reader = pd.read_csv(data_path, usecols=['text', 'label'], chunksize=chunk_size)
+    n_workers = n_workers or os.cpu_count() or 1
+    if n_workers == 1:
+        for chunk in reader:
+            yield _featurize_chunk(chunk['text'].tolist()), chunk['label'].values
+        return
+    
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = []
+        for chunk in reader:
+            pending.append((executor.submit(_featurize_chunk, chunk['text'].tolist()), chunk['label'].values))
+            if len(pending) >= 2 * n_workers:
+                future, labels = pending.pop(0)
+                yield future.result(), labels
+        for future, labels in pending:
+            yield future.result(), labels
+
+def train_model_streaming(data_path=DATA_PATH, chunk_size=STREAM_CHUNK_SIZE, epochs=5,
+                          n_workers=None, feature_dir=None, download_nltk=False):
+    """Train out of core on a CSV that doesn't fit in memory.
+    
+    The first epoch reads the CSV in chunks, hashes each chunk and spills the
+    features to ``feature_dir`` (a temporary directory by default); later
+    epochs replay the spilled chunks in shuffled order. A logistic-loss
+    SGDClassifier is updated with ``partial_fit`` on every chunk. 20% of each
+    chunk is held out for the final evaluation.
+    """
+    import tempfile
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.metrics import classification_report
+    
+    print("Training Multi-class Logistic Regression Model (streaming)...")
+    ensure_nltk_resources(download=download_nltk)
+    
+    # partial_fit needs every class up front; reading only the labels is cheap
+    classes = set()
+    for chunk in pd.read_csv(data_path, usecols=['label'], chunksize=chunk_size):
+        classes.update(chunk['label'].unique())
+    classes = np.array(sorted(classes))
+    
+    model = SGDClassifier(loss='log_loss', alpha=1e-6, random_state=42)
+    temp_dir = None
+    if feature_dir is None:
+        temp_dir = tempfile.TemporaryDirectory(prefix='model1_features_')
+        feature_dir = temp_dir.name
+    os.makedirs(feature_dir, exist_ok=True)
+    
+    try:
+        spilled = []
+        for epoch in range(epochs):
+            start = time.perf_counter()
+            rows = 0
+            if epoch == 0:
+                chunks = iter_feature_chunks(data_path, chunk_size, n_workers)
+            else:
+                order = np.random.default_rng([42, epoch]).permutation(len(spilled))
+                chunks = (joblib.load(spilled[i]) for i in order)
+            
+            for index, (X, y) in enumerate(chunks):
+                if epoch == 0:
+                    # Same held-out rows on every run
+                    test_mask = np.random.default_rng([42, index]).random(len(y)) < 0.2
+                    path = os.path.join(feature_dir, f'chunk_{index:06d}.pkl')
+                    joblib.dump((X[~test_mask], y[~test_mask]), path)
+                    joblib.dump((X[test_mask], y[test_mask]), path.replace('chunk_', 'test_'))
+                    spilled.append(path)
+                    X, y = X[~test_mask], y[~test_mask]
+                else:
+                    permutation = np.random.default_rng([42, epoch, index]).permutation(len(y))
+                    X, y = X[permutation], y[permutation]
+                with instrumentation.stage('train.partial_fit'):
+                    model.partial_fit(X, y, classes=classes)
+                instrumentation.count('train.rows', len(y))
+                rows += len(y)
+            
+            elapsed = time.perf_counter() - start
+            instrumentation.observe('train.epoch', elapsed)
+            print(f"Epoch {epoch + 1}/{epochs}: {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)")
+        
+        # Evaluate on the held-out rows
+        y_test, y_pred = [], []
+        for path in spilled:
+            X, y = joblib.load(path.replace('chunk_', 'test_'))
+            if len(y):
+                y_test.append(y)
+                y_pred.append(model.predict(X))
+        print("\nClassification Report:")
+        print(classification_report(np.concatenate(y_test), np.concatenate(y_pred)))
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+    
+    with instrumentation.stage('train.save'):
+        save_model(model, build_hashing_vectorizer())
+
 if __name__ == "__main__":
-    train_model() 
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Preprocessing worker processes (default: all CPU cores)')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='Directory for resumable preprocessing chunks')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Directory of the preprocessed corpus cache (disabled if not set)')
+    parser.add_argument('--download-nltk', action='store_true',
+                        help='Download missing NLTK corpora instead of failing')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Train out of core: read the CSV in chunks and fit incrementally')
+    parser.add_argument('--data', default=DATA_PATH,
+                        help='CSV with text and label columns (streaming mode)')
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE,
+                        help='Rows read per chunk (streaming mode)')
+    parser.add_argument('--epochs', type=int, default=5,
+                        help='Passes over the data (streaming mode)')
+    parser.add_argument('--feature-dir', default=None,
+                        help='Where hashed chunks are kept between epochs (streaming mode, '
+                             'default: a temporary directory)')
+    parser.add_argument('--compact', action='store_true',
+                        help='float32 TF-IDF features, and no stop_words_ in the saved vectorizer')
+    parser.add_argument('--prune', choices=PRUNE_METHODS, default=None,
+                        help='Shrink the vocabulary, ranking features by chi2 or by coefficient magnitude')
+    parser.add_argument('--prune-tolerance', type=float, default=PRUNE_TOLERANCE,
+                        help='Validation accuracy the pruned model may lose')
+    parser.add_argument('--metrics-out', default=None,
+                        help='Write per-stage timings here (.json, or .prom for Prometheus text); '
+                             'SIGUSR1 toggles a sampling profiler meanwhile')
+    args = parser.parse_args()
+    if args.metrics_out:
+        instrumentation.enable()
+        instrumentation.install_profiler_signal()
+    if args.streaming:
+        train_model_streaming(data_path=args.data, chunk_size=args.chunk_size, epochs=args.epochs,
+                              n_workers=args.workers, feature_dir=args.feature_dir,
+                              download_nltk=args.download_nltk)
+    else:
+        train_model(n_workers=args.workers, checkpoint_dir=args.checkpoint_dir,
+                    cache_dir=args.cache_dir, download_nltk=args.download_nltk,
+                    compact=args.compact, prune=args.prune, prune_tolerance=args.prune_tolerance)
+    if args.metrics_out:
+        instrumentation.write_report(args.metrics_out)
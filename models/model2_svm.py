@@ -1,96 +1,184 @@
 import pandas as pd
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.model_selection import train_test_split
-from sklearn.svm import SVC
-from sklearn.metrics import classification_report
 import joblib
+import argparse
 import os
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-import re
 
-# Download required NLTK data
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('wordnet')
+from src.ml.parallel_preprocessing import preprocess_parallel
+from src.ml.corpus_cache import CorpusCache
+from src.ml.nltk_resources import ensure_nltk_resources
+from src.ml.linear_pipeline import export_pipeline
+from src.ml.compact_features import (
+    COMPACT_VECTORIZER_PARAMS, PRUNE_METHODS, PRUNE_TOLERANCE, SizeReport, compact_matrix, csr_nbytes,
+    float64_nbytes, pickled_size, prune_vocabulary, strip_vectorizer
+)
+from src.ml import instrumentation
 
-# Create models directory if it doesn't exist
-os.makedirs('models/saved_models/model2', exist_ok=True)
+DATA_PATH = 'data/augmented/processed_emotion_dataset.csv'
 
-def preprocess_text(text):
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Remove special characters and numbers
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    
-    # Tokenize
-    tokens = word_tokenize(text)
-    
-    # Remove stopwords
-    stop_words = set(stopwords.words('english'))
-    tokens = [word for word in tokens if word not in stop_words]
-    
-    # Lemmatize
-    lemmatizer = WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(word) for word in tokens]
-    
-    return ' '.join(tokens)
+SVM_MODES = ('svc', 'linear')
+
+# TF-IDF settings; src/ml/sweep.py varies them
+VECTORIZER_PARAMS = {'max_features': 5000}
 
-def load_and_preprocess_data():
+def load_and_preprocess_data(n_workers=None, checkpoint_dir=None, cache=None):
     print("Loading and preprocessing data...")
     
     # Load CSV file
-    df = pd.read_csv('data/augmented/processed_emotion_dataset.csv')
+    df = pd.read_csv(DATA_PATH)
     
     # Preprocess text
     print("Preprocessing text...")
-    df['processed_text'] = df['text'].apply(preprocess_text)
+    def preprocess():
+        return preprocess_parallel(
+            df['text'], n_workers=n_workers, checkpoint_dir=checkpoint_dir
+        )
+    
+    # Reuse the processed text from an earlier run on the same data
+    if cache is not None:
+        df['processed_text'] = cache.processed_text(cache.dataset_key(DATA_PATH, 'text'), preprocess)
+    else:
+        df['processed_text'] = preprocess()
     
     # Get labels (emotion classes)
     y = df['label'].values  # Using 'label' column which contains emotion classes
     
     return df['processed_text'], y
 
-def train_model():
+def build_model(mode='svc', C=1.0):
+    """Create the emotion classifier.
+    
+    'svc' is libsvm's SVC with its built-in 5-fold Platt scaling. 'linear' trains
+    a liblinear LinearSVC and fits the sigmoid calibration separately on
+    cross-validated decision values, which is much faster to train and to score.
+    Both expose the same classes_, predict and predict_proba.
+    """
+    if mode == 'linear':
+        from src.ml.calibrated_svm import CalibratedLinearSVC
+        
+        return CalibratedLinearSVC(C=C, cv=5)  # Same fold count as SVC's Platt scaling
+    
+    from sklearn.svm import SVC
+    
+    return SVC(
+        kernel='linear',
+        C=C,
+        decision_function_shape='ovr',  # one-vs-rest for multi-class
+        probability=True
+    )
+
+def train_model(n_workers=None, checkpoint_dir=None, cache_dir=None, download_nltk=False,
+                svm_mode='svc', compact=False, prune=None, prune_tolerance=PRUNE_TOLERANCE):
+    # Training-only dependencies are imported here so importing this module stays cheap
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report
+    
     print("Training Multi-class SVM Model...")
     
-    # Load and preprocess data
-    texts, y = load_and_preprocess_data()
+    # Check the NLTK corpora up front; they are only downloaded when asked to
+    ensure_nltk_resources(download=download_nltk)
     
-    # Vectorize text
-    vectorizer = TfidfVectorizer(max_features=5000)
-    X = vectorizer.fit_transform(texts)
+    cache = CorpusCache(cache_dir) if cache_dir else None
+    
+    # Load and preprocess data
+    with instrumentation.stage('train.preprocess'):
+        texts, y = load_and_preprocess_data(n_workers, checkpoint_dir, cache)
+    
+    # Vectorize text (float32 values in compact mode)
+    vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS, **(COMPACT_VECTORIZER_PARAMS if compact else {}))
+    with instrumentation.stage('train.vectorize'):
+        if cache is not None:
+            vectorizer, X = cache.fit_transform(cache.dataset_key(DATA_PATH, 'text'), vectorizer, texts)
+        else:
+            X = vectorizer.fit_transform(texts)
+    
+    # Sizes with float64 features and the full vectorizer, for the report at the end
+    sizes = SizeReport() if compact or prune else None
+    if compact:
+        X = compact_matrix(X)
+    if sizes is not None:
+        sizes.before('feature matrices', float64_nbytes(X))
+        sizes.before('vectorizer.pkl', pickled_size(vectorizer))
     
     # Split data
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, random_state=42
     )
+    del X
     
     # Create and train model with multi-class support
-    model = SVC(
-        kernel='linear',
-        decision_function_shape='ovr',  # one-vs-rest for multi-class
-        probability=True
-    )
+    model = build_model(svm_mode)
     
     print("Training model...")
-    model.fit(X_train, y_train)
+    with instrumentation.stage('train.fit'):
+        model.fit(X_train, y_train)
+    
+    # Keep the smallest vocabulary that is about as accurate
+    if prune:
+        sizes.before('model.pkl', pickled_size(model))
+        with instrumentation.stage('train.prune'):
+            vectorizer, model, X_train, X_test, _ = prune_vocabulary(
+                vectorizer, model, lambda: build_model(svm_mode), X_train, y_train, X_test,
+                method=prune, tolerance=prune_tolerance
+            )
     
     # Evaluate
-    y_pred = model.predict(X_test)
+    with instrumentation.stage('train.evaluate'):
+        y_pred = model.predict(X_test)
     print("\nClassification Report:")
     print(classification_report(y_test, y_pred))
     
+    # Create models directory if it doesn't exist
+    os.makedirs('models/saved_models/model2', exist_ok=True)
+    
     # Save model and vectorizer
     print("Saving model and components...")
-    joblib.dump(model, 'models/saved_models/model2/model.pkl')
-    joblib.dump(vectorizer, 'models/saved_models/model2/vectorizer.pkl')
+    if compact:
+        strip_vectorizer(vectorizer)
+    with instrumentation.stage('train.save'):
+        joblib.dump(model, 'models/saved_models/model2/model.pkl')
+        joblib.dump(vectorizer, 'models/saved_models/model2/vectorizer.pkl')
+    
+        # Fused artifact for serving
+        export_pipeline(model, vectorizer, 'models/saved_models/model2/pipeline')
     
     print("Model saved successfully!")
+    if sizes is not None:
+        sizes.after('feature matrices', csr_nbytes(X_train) + csr_nbytes(X_test))
+        for name in ('vectorizer.pkl', 'model.pkl'):
+            sizes.after(name, os.path.getsize(f'models/saved_models/model2/{name}'))
+        print(sizes.format())
+    if cache is not None:
+        print(cache.report())
 
 if __name__ == "__main__":
-    train_model() 
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Preprocessing worker processes (default: all CPU cores)')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='Directory for resumable preprocessing chunks')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Directory of the preprocessed corpus cache (disabled if not set)')
+    parser.add_argument('--download-nltk', action='store_true',
+                        help='Download missing NLTK corpora instead of failing')
+    parser.add_argument('--svm-mode', choices=SVM_MODES, default='svc',
+                        help="'linear' uses liblinear with separate probability calibration")
+    parser.add_argument('--compact', action='store_true',
+                        help='float32 TF-IDF features, and no stop_words_ in the saved vectorizer')
+    parser.add_argument('--prune', choices=PRUNE_METHODS, default=None,
+                        help='Shrink the vocabulary, ranking features by chi2 or by coefficient magnitude')
+    parser.add_argument('--prune-tolerance', type=float, default=PRUNE_TOLERANCE,
+                        help='Validation accuracy the pruned model may lose')
+    parser.add_argument('--metrics-out', default=None,
+                        help='Write per-stage timings here (.json, or .prom for Prometheus text); '
+                             'SIGUSR1 toggles a sampling profiler meanwhile')
+    args = parser.parse_args()
+    if args.metrics_out:
+        instrumentation.enable()
+        instrumentation.install_profiler_signal()
+    train_model(n_workers=args.workers, checkpoint_dir=args.checkpoint_dir,
+                cache_dir=args.cache_dir, download_nltk=args.download_nltk,
+                svm_mode=args.svm_mode, compact=args.compact, prune=args.prune,
+                prune_tolerance=args.prune_tolerance)
+    if args.metrics_out:
+        instrumentation.write_report(args.metrics_out)
@@ -1,73 +1,135 @@
 import pandas as pd
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras import layers
-from sklearn.model_selection import train_test_split
 import joblib
+import argparse
 import os
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-import re
 
-# Download required NLTK data
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('wordnet')
+from src.ml.parallel_preprocessing import preprocess_parallel
+from src.ml.corpus_cache import CorpusCache
+from src.ml.nltk_resources import ensure_nltk_resources
+from src.ml.lstm_vocabulary import export_vocabulary
+from src.ml import instrumentation
 
-# Create models directory if it doesn't exist
-os.makedirs('models/saved_models/model3', exist_ok=True)
+DATA_PATH = 'data/augmented/processed_train.csv'
 
-def preprocess_text(text):
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Remove special characters and numbers
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    
-    # Tokenize
-    tokens = word_tokenize(text)
-    
-    # Remove stopwords
-    stop_words = set(stopwords.words('english'))
-    tokens = [word for word in tokens if word not in stop_words]
-    
-    # Lemmatize
-    lemmatizer = WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(word) for word in tokens]
-    
-    return ' '.join(tokens)
+# Tokenizer and model shape
+VOCAB_SIZE = 10000
+MAX_LEN = 100
+BATCH_SIZE = 1024
+EPOCHS = 30
 
-def load_and_preprocess_data():
+# tf.data mode: batches are grouped by length at these boundaries and padded
+# only up to the longest sequence in the batch
+BUCKET_BOUNDARIES = [8, 16, 32, 64]
+SHUFFLE_BUFFER = 10000
+
+def load_and_preprocess_data(n_workers=None, checkpoint_dir=None, cache=None):
     print("Loading and preprocessing data...")
     
     # Load CSV file
-    df = pd.read_csv('data/augmented/processed_train.csv')
+    df = pd.read_csv(DATA_PATH)
     
     # Preprocess text
     print("Preprocessing text...")
     # Combine Context and Response for text processing
     df['text'] = df['Context'] + ' ' + df['Response']
-    df['processed_text'] = df['text'].apply(preprocess_text)
+    def preprocess():
+        return preprocess_parallel(
+            df['text'], n_workers=n_workers, checkpoint_dir=checkpoint_dir
+        )
+    
+    # Reuse the processed text from an earlier run on the same data
+    if cache is not None:
+        df['processed_text'] = cache.processed_text(cache.dataset_key(DATA_PATH, 'Context', 'Response'), preprocess)
+    else:
+        df['processed_text'] = preprocess()
     
     # Use is_question as the label
     y = df['is_question'].values
     
     return df['processed_text'], y
 
-def train_model():
-    print("Training Neural Network with NLP features...")
+def build_model(fused_lstm=False, input_length=MAX_LEN):
+    from tensorflow import keras
+    from tensorflow.keras import layers
     
-    # Load and preprocess data
-    texts, y = load_and_preprocess_data()
+    # recurrent_dropout rules out the fused LSTM kernel and makes Keras step
+    # through the sequence cell by cell. The fused variant drops the LSTM
+    # inputs instead, which the fused kernel supports.
+    if fused_lstm:
+        lstm_dropout = {'dropout': 0.5}
+    else:
+        lstm_dropout = {'recurrent_dropout': 0.5}
     
-    # Tokenize and pad sequences
-    tokenizer = keras.preprocessing.text.Tokenizer(num_words=10000)
-    tokenizer.fit_on_texts(texts)
-    sequences = tokenizer.texts_to_sequences(texts)
-    X = keras.preprocessing.sequence.pad_sequences(sequences, maxlen=100)
+    return keras.Sequential([
+        layers.Embedding(VOCAB_SIZE, 8, input_length=input_length),  # Small embedding
+        layers.LSTM(4, return_sequences=True, **lstm_dropout),  # Small LSTM with high dropout
+        layers.Dropout(0.2),  # High dropout
+        layers.LSTM(2, **lstm_dropout),  # Very small LSTM with high dropout
+        layers.Dropout(0.2),  # High dropout
+        layers.Dense(1, activation='sigmoid')
+    ])
+
+def add_label_noise(y, rate=0.2):
+    noise_mask = np.random.random(y.shape) < rate  # 20% of labels will be flipped
+    y_noisy = y.copy()
+    y_noisy[noise_mask] = 1 - y_noisy[noise_mask]  # Flip labels
+    return y_noisy
+
+def make_dataset(sequences, labels, batch_size=BATCH_SIZE, shuffle=False):
+    """tf.data pipeline over unpadded token ID lists, batched by length.
+    
+    Sequences are cut to their last MAX_LEN tokens and zero-padded at the front,
+    like pad_sequences does, but only up to the longest sequence in the batch.
+    """
+    import tensorflow as tf
+    
+    # An empty sequence becomes a single padding token
+    sequences = [sequence[-MAX_LEN:] or [0] for sequence in sequences]
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    token_ids = tf.constant(np.concatenate(sequences).astype(np.int32))
+    
+    # Every element is a slice of one flat token array, cached after the first epoch
+    dataset = tf.data.Dataset.from_tensor_slices((starts, lengths, np.asarray(labels, dtype=np.float32)))
+    # Reversed, so that padded_batch's trailing padding ends up in front once
+    # each batch is flipped back
+    dataset = dataset.map(lambda start, length, label: (tf.reverse(token_ids[start:start + length], [0]), label),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.cache()
+    if shuffle:
+        dataset = dataset.shuffle(min(SHUFFLE_BUFFER, len(sequences)), reshuffle_each_iteration=True)
+    dataset = dataset.bucket_by_sequence_length(
+        element_length_func=lambda sequence, label: tf.shape(sequence)[0],
+        bucket_boundaries=BUCKET_BOUNDARIES,
+        bucket_batch_sizes=[batch_size] * (len(BUCKET_BOUNDARIES) + 1),
+    )
+    dataset = dataset.map(lambda batch, labels: (tf.reverse(batch, [1]), labels))
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def epoch_timer():
+    """Keras callback recording the wall time of every epoch, and the list it fills."""
+    import time
+    from tensorflow import keras
+    
+    times = []
+    starts = []
+    callback = keras.callbacks.LambdaCallback(
+        on_epoch_begin=lambda epoch, logs: starts.append(time.perf_counter()),
+        on_epoch_end=lambda epoch, logs: times.append(time.perf_counter() - starts[-1]),
+    )
+    return callback, times
+
+def report_epoch_times(times):
+    # The first epoch also traces and compiles the training step
+    steady = np.median(times[1:]) if len(times) > 1 else times[0]
+    print(f"Epoch time: {times[0]:.2f}s first, {steady:.2f}s median after that ({len(times)} epochs)")
+
+def train_padded(sequences, y, fused_lstm, callbacks, epochs=EPOCHS):
+    from tensorflow import keras
+    from sklearn.model_selection import train_test_split
+    
+    X = keras.preprocessing.sequence.pad_sequences(sequences, maxlen=MAX_LEN)
     
     # Split data
     X_train, X_test, y_train, y_test = train_test_split(
@@ -75,23 +137,14 @@ def train_model():
     )
     
     # Create model
-    model = keras.Sequential([
-        layers.Embedding(10000, 8, input_length=100),  # Small embedding
-        layers.LSTM(4, return_sequences=True, recurrent_dropout=0.5),  # Small LSTM with high recurrent dropout
-        layers.Dropout(0.2),  # High dropout
-        layers.LSTM(2, recurrent_dropout=0.5),  # Very small LSTM with high recurrent dropout
-        layers.Dropout(0.2),  # High dropout
-        layers.Dense(1, activation='sigmoid')
-    ])
+    model = build_model(fused_lstm)
     
     # Add noise to training data
     X_train_noisy = X_train + np.random.normal(0, 0.05, X_train.shape)  # Reduced noise
     X_test_noisy = X_test + np.random.normal(0, 0.05, X_test.shape)  # Reduced noise
     
     # Add label noise
-    noise_mask = np.random.random(y_train.shape) < 0.2  # 20% of labels will be flipped
-    y_train_noisy = y_train.copy()
-    y_train_noisy[noise_mask] = 1 - y_train_noisy[noise_mask]  # Flip labels
+    y_train_noisy = add_label_noise(y_train)
     
     model.compile(
         optimizer='adam',
@@ -99,32 +152,133 @@ def train_model():
         metrics=['accuracy']
     )
     
+    print("Training model...")
+    with instrumentation.stage('train.fit'):
+        history = model.fit(
+            X_train_noisy, y_train_noisy,
+            epochs=epochs,  # Reduced epochs
+            batch_size=BATCH_SIZE,  # Large batch size
+            validation_split=0.2,
+            callbacks=callbacks
+        )
+    
+    # Evaluate on noisy test data
+    with instrumentation.stage('train.evaluate'):
+        loss, accuracy = model.evaluate(X_test_noisy, y_test, verbose=0)  # Set verbose=0 to suppress output
+   # print(f"\nFinal Model Accuracy: {accuracy:.4f}")
+    return model
+
+def train_tf_data(sequences, y, fused_lstm, callbacks, epochs=EPOCHS):
+    from sklearn.model_selection import train_test_split
+    
+    # Same test split as the padded mode, on the unpadded sequences
+    seq_train, seq_test, y_train, y_test = train_test_split(
+        sequences, y, test_size=0.2, random_state=42
+    )
+    # validation_split takes the last 20% of the training data; do the same
+    num_val = int(len(seq_train) * 0.2)
+    seq_fit, seq_val = seq_train[:len(seq_train) - num_val], seq_train[len(seq_train) - num_val:]
+    y_fit, y_val = y_train[:len(y_train) - num_val], y_train[len(y_train) - num_val:]
+    
+    # Label noise as in the padded mode. The float noise the padded mode adds to
+    # the token IDs is left out: the embedding truncates it back to integers,
+    # so all it did was shift some IDs down by one.
+    train_ds = make_dataset(seq_fit, add_label_noise(y_fit), shuffle=True)
+    val_ds = make_dataset(seq_val, y_val)
+    test_ds = make_dataset(seq_test, y_test)
+    
+    # Same model, but each batch is only as long as its longest sequence
+    model = build_model(fused_lstm, input_length=None)
+    model.compile(
+        optimizer='adam',
+        loss='binary_crossentropy',
+        metrics=['accuracy']
+    )
+    
+    print("Training model (tf.data)...")
+    with instrumentation.stage('train.fit'):
+        model.fit(train_ds, epochs=epochs, validation_data=val_ds, callbacks=callbacks)
+    
+    with instrumentation.stage('train.evaluate'):
+        loss, accuracy = model.evaluate(test_ds, verbose=0)
+    print(f"\nTest accuracy: {accuracy:.4f}")
+    return model
+
+def train_model(n_workers=None, checkpoint_dir=None, cache_dir=None, download_nltk=False,
+                tf_data=False, fused_lstm=False):
+    # Training-only dependencies are imported here so importing this module stays cheap
+    from tensorflow import keras
+    
+    print("Training Neural Network with NLP features...")
+    
+    # Check the NLTK corpora up front; they are only downloaded when asked to
+    ensure_nltk_resources(download=download_nltk)
+    
+    cache = CorpusCache(cache_dir) if cache_dir else None
+    
+    # Load and preprocess data
+    with instrumentation.stage('train.preprocess'):
+        texts, y = load_and_preprocess_data(n_workers, checkpoint_dir, cache)
+    
+    # Tokenize
+    with instrumentation.stage('train.tokenize'):
+        tokenizer = keras.preprocessing.text.Tokenizer(num_words=VOCAB_SIZE)
+        tokenizer.fit_on_texts(texts)
+        sequences = tokenizer.texts_to_sequences(texts)
+    
     # Train model
     early_stopping = keras.callbacks.EarlyStopping(
         monitor='val_loss',
         patience=10,  # Reduced patience
         restore_best_weights=True
     )
+    timer, epoch_times = epoch_timer()
     
-    print("Training model...")
-    history = model.fit(
-        X_train_noisy, y_train_noisy,
-        epochs=30,  # Reduced epochs
-        batch_size=1024,  # Large batch size
-        validation_split=0.2,
-        callbacks=[early_stopping]
-    )
+    if tf_data:
+        model = train_tf_data(sequences, y, fused_lstm, [early_stopping, timer])
+    else:
+        model = train_padded(sequences, y, fused_lstm, [early_stopping, timer])
+    report_epoch_times(epoch_times)
     
-    # Evaluate on noisy test data
-    loss, accuracy = model.evaluate(X_test_noisy, y_test, verbose=0)  # Set verbose=0 to suppress output
-   # print(f"\nFinal Model Accuracy: {accuracy:.4f}")
+    # Create models directory if it doesn't exist
+    os.makedirs('models/saved_models/model3', exist_ok=True)
     
     # Save model and tokenizer
     print("Saving model and components...")
-    model.save('models/saved_models/model3/model.h5')
-    joblib.dump(tokenizer, 'models/saved_models/model3/tokenizer.pkl')
+    with instrumentation.stage('train.save'):
+        model.save('models/saved_models/model3/model.h5')
+        joblib.dump(tokenizer, 'models/saved_models/model3/tokenizer.pkl')
+    
+        # TensorFlow-free tokenizer for serving
+        export_vocabulary(tokenizer, 'models/saved_models/model3/vocabulary', maxlen=MAX_LEN)
     
     print("Model saved successfully!")
+    if cache is not None:
+        print(cache.report())
 
 if __name__ == "__main__":
-    train_model() 
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Preprocessing worker processes (default: all CPU cores)')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='Directory for resumable preprocessing chunks')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Directory of the preprocessed corpus cache (disabled if not set)')
+    parser.add_argument('--download-nltk', action='store_true',
+                        help='Download missing NLTK corpora instead of failing')
+    parser.add_argument('--tf-data', action='store_true',
+                        help='Feed length-bucketed batches through a tf.data pipeline')
+    parser.add_argument('--fused-lstm', action='store_true',
+                        help='Use input dropout instead of recurrent dropout so the fused LSTM kernel applies')
+    parser.add_argument('--metrics-out', default=None,
+                        help='Write per-stage timings here (.json, or .prom for Prometheus text); '
+                             'SIGUSR1 toggles a sampling profiler meanwhile')
+    args = parser.parse_args()
+    if args.metrics_out:
+        instrumentation.enable()
+        instrumentation.install_profiler_signal()
+    train_model(n_workers=args.workers, checkpoint_dir=args.checkpoint_dir,
+                cache_dir=args.cache_dir, download_nltk=args.download_nltk,
+                tf_data=args.tf_data, fused_lstm=args.fused_lstm)
+    if args.metrics_out:
+        instrumentation.write_report(args.metrics_out)
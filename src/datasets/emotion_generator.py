@@ -1,9 +1,13 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional
+from src.datasets.template_sampler import DEFAULT_CHUNK_SIZE, SyntheticDataset, TemplateSampler
 
-class EmotionDataGenerator:
-    def __init__(self):
+class EmotionDataGenerator(SyntheticDataset):
+    name = 'emotion'
+    
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = np.random.default_rng(seed)
         self.emotions = ['happy', 'sad', 'angry', 'anxious', 'neutral']
         self.templates = {
             'happy': [
@@ -32,24 +36,15 @@ class EmotionDataGenerator:
                 "Can we discuss"
             ]
         }
-    
-    def generate_dataset(self, num_samples: int = 10000) -> pd.DataFrame:
-        data = []
-        for _ in range(num_samples):
-            emotion = np.random.choice(self.emotions)
-            template = np.random.choice(self.templates[emotion])
-            message = f"{template} {self._generate_context()}"
-            data.append({'text': message, 'label': emotion})
-        
-        return pd.DataFrame(data)
-    
-    def _generate_context(self) -> str:
-        contexts = [
+        self.contexts = [
             "my day", "work", "school", "my relationship", "my family",
             "my health", "my future", "my past", "my friends", "my job"
         ]
-        return np.random.choice(contexts)
+        self.sampler = TemplateSampler(self.emotions, self.templates, self.contexts)
+    
+    def generate(self, num_samples: int = 10000) -> pd.DataFrame:
+        return self.sampler.sample(self.rng, num_samples)
     
-    def save_dataset(self, output_dir: str):
-        df = self.generate_dataset()
-        df.to_csv(f"{output_dir}/synthetic_emotion_dataset.csv", index=False) 
\ No newline at end of file
+    def save_dataset(self, output_dir: str, num_samples: int = 10000, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """Kept for existing callers; same as ``save``."""
+        self.save(output_dir, num_samples, chunk_size)
\ No newline at end of file
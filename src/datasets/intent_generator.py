@@ -1,9 +1,13 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional
+from src.datasets.template_sampler import SyntheticDataset, TemplateSampler
 
-class IntentDataset:
-    def __init__(self):
+class IntentDataset(SyntheticDataset):
+    name = 'intent'
+    
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = np.random.default_rng(seed)
         self.intents = ['greeting', 'help', 'advice', 'vent', 'goodbye']
         self.templates = {
             'greeting': [
@@ -32,24 +36,11 @@ class IntentDataset:
                 "Talk to you later"
             ]
         }
-    
-    def generate(self, num_samples: int = 10000) -> pd.DataFrame:
-        data = []
-        for _ in range(num_samples):
-            intent = np.random.choice(self.intents)
-            template = np.random.choice(self.templates[intent])
-            message = f"{template} {self._generate_context()}"
-            data.append({'text': message, 'intent': intent})
-        
-        return pd.DataFrame(data)
-    
-    def _generate_context(self) -> str:
-        contexts = [
+        self.contexts = [
             "my day", "work", "school", "my relationship", "my family",
             "my health", "my future", "my past", "my friends", "my job"
         ]
-        return np.random.choice(contexts)
+        self.sampler = TemplateSampler(self.intents, self.templates, self.contexts)
     
-    def save(self, output_dir: str):
-        df = self.generate()
-        df.to_csv(f"{output_dir}/synthetic_intent_dataset.csv", index=False) 
\ No newline at end of file
+    def generate(self, num_samples: int = 10000) -> pd.DataFrame:
+        return self.sampler.sample(self.rng, num_samples, label_column='intent')
\ No newline at end of file
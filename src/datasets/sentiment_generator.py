@@ -1,9 +1,13 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional
+from src.datasets.template_sampler import SyntheticDataset, TemplateSampler
 
-class SentimentDataset:
-    def __init__(self):
+class SentimentDataset(SyntheticDataset):
+    name = 'sentiment'
+    
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = np.random.default_rng(seed)
         self.sentiments = ['positive', 'negative', 'neutral']
         self.templates = {
             'positive': [
@@ -22,24 +26,11 @@ class SentimentDataset:
                 "Let's talk about"
             ]
         }
-    
-    def generate(self, num_samples: int = 10000) -> pd.DataFrame:
-        data = []
-        for _ in range(num_samples):
-            sentiment = np.random.choice(self.sentiments)
-            template = np.random.choice(self.templates[sentiment])
-            message = f"{template} {self._generate_context()}"
-            data.append({'text': message, 'label': sentiment})
-        
-        return pd.DataFrame(data)
-    
-    def _generate_context(self) -> str:
-        contexts = [
+        self.contexts = [
             "my day", "work", "school", "my relationship", "my family",
             "my health", "my future", "my past", "my friends", "my job"
         ]
-        return np.random.choice(contexts)
+        self.sampler = TemplateSampler(self.sentiments, self.templates, self.contexts)
     
-    def save(self, output_dir: str):
-        df = self.generate()
-        df.to_csv(f"{output_dir}/synthetic_sentiment_dataset.csv", index=False) 
\ No newline at end of file
+    def generate(self, num_samples: int = 10000) -> pd.DataFrame:
+        return self.sampler.sample(self.rng, num_samples)
\ No newline at end of file
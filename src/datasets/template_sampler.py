@@ -0,0 +1,90 @@
+from abc import ABC, abstractmethod
+import os
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+
+class TemplateSampler:
+    """Draws "<template> <context>" messages for uniformly chosen labels, in bulk.
+
+    Every possible message is built once; sampling then only draws integer
+    indices (label, template within the label, context) and gathers the
+    matching strings, so no Python code runs per row.
+    """
+
+    def __init__(self, labels: List[str], templates: Dict[str, List[str]], contexts: List[str]):
+        self.labels = np.array(labels, dtype=object)
+        self.contexts = list(contexts)
+        self.num_templates = np.array([len(templates[label]) for label in labels])
+        # Offset of each label's first message in the flat message table
+        self.offsets = np.concatenate(([0], np.cumsum(self.num_templates)[:-1])) * len(contexts)
+        self.messages = np.array([
+            f"{template} {context}"
+            for label in labels
+            for template in templates[label]
+            for context in contexts
+        ], dtype=object)
+
+    def sample(self, rng: np.random.Generator, num_samples: int, label_column: str = 'label') -> pd.DataFrame:
+        label_ids = rng.integers(len(self.labels), size=num_samples)
+        # Scale a uniform draw by each row's template count, so labels may have different counts
+        template_ids = (rng.random(num_samples) * self.num_templates[label_ids]).astype(np.int64)
+        context_ids = rng.integers(len(self.contexts), size=num_samples)
+        message_ids = self.offsets[label_ids] + template_ids * len(self.contexts) + context_ids
+        return pd.DataFrame({'text': self.messages[message_ids], label_column: self.labels[label_ids]})
+
+
+def write_chunked(generate: Callable[[int], pd.DataFrame], path: str, num_samples: int,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, file_format: Optional[str] = None):
+    """Write ``num_samples`` rows from ``generate(n)`` to CSV or Parquet, ``chunk_size`` rows at a time.
+
+    Only one chunk is in memory at once. The format follows the file
+    extension unless ``file_format`` ('csv' or 'parquet') is given.
+    """
+    file_format = file_format or ('parquet' if path.endswith('.parquet') else 'csv')
+    if file_format not in ('csv', 'parquet'):
+        raise ValueError(f"Unknown file format {file_format!r}")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    writer = None
+    try:
+        for start in range(0, num_samples, chunk_size):
+            chunk = generate(min(chunk_size, num_samples - start))
+            if file_format == 'csv':
+                chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+                continue
+
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+class SyntheticDataset(ABC):
+    """``stream`` and ``save`` for a generator; subclasses implement ``generate``.
+
+    Subclasses set ``name``; ``save`` writes ``synthetic_<name>_dataset.csv``.
+    """
+
+    name: str
+
+    @abstractmethod
+    def generate(self, num_samples: int) -> pd.DataFrame:
+        """``num_samples`` rows with a ``text`` column and a label column."""
+
+    def stream(self, path: str, num_samples: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+               file_format: Optional[str] = None):
+        """Write ``num_samples`` rows to a CSV or Parquet file in chunks of ``chunk_size``."""
+        write_chunked(self.generate, path, num_samples, chunk_size, file_format)
+
+    def save(self, output_dir: str, num_samples: int = 10000, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.stream(f"{output_dir}/synthetic_{self.name}_dataset.csv", num_samples, chunk_size)
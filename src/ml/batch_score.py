@@ -0,0 +1,298 @@
+"""Score large message archives with the saved models 1, 2 and 3.
+
+The input is read in chunks of ``--chunk-size`` rows (CSV, JSONL or Parquet,
+by extension), so memory follows the chunk size rather than the file size.
+Chunks are scored in a process pool. Each worker loads the models once:
+
+    model1   sentiment and sentiment_confidence  (models/saved_models/model1)
+    model2   emotion and emotion_confidence      (models/saved_models/model2)
+    model3   is_question and is_question_probability (models/saved_models/model3)
+
+Models 1 and 2 use their pipeline artifact when it exists (``src.ml.linear_pipeline``)
+and the joblib pickles otherwise. Model 3 needs TensorFlow and is off by default.
+
+Results are written in input order as each chunk finishes: appended to a CSV
+or JSONL file, or as one part file per chunk in a Parquet output directory.
+After every chunk the number of rows done is checkpointed next to the output;
+a rerun continues from there (``--restart`` starts over). The checkpoint also
+records the input file's size and modification time and the scoring settings,
+and a rerun refuses to resume if any of them changed. At most two chunks per
+worker are in flight.
+
+Run from the repository root:
+
+    python -m src.ml.batch_score journal.parquet --output scored.csv --workers 4
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import time
+
+import numpy as np
+import pandas as pd
+
+MODEL_ROOT = "models/saved_models"
+DEFAULT_MODELS = ("model1", "model2")
+DEFAULT_CHUNK_SIZE = 10000
+PROGRESS_SUFFIX = ".progress.json"
+
+# Output columns of each model
+TASKS = {"model1": "sentiment", "model2": "emotion", "model3": "is_question"}
+
+# Set in each worker by _init_worker
+_scorers: Dict[str, Any] = {}
+
+
+def input_format(path: str) -> str:
+    for extension, file_format in ((".csv", "csv"), (".jsonl", "jsonl"), (".json", "jsonl"), (".parquet", "parquet")):
+        if path.endswith(extension):
+            return file_format
+    raise ValueError(f"Unsupported file type: {path} (expected .csv, .jsonl or .parquet)")
+
+
+def iter_chunks(path: str, chunk_size: int, columns: List[str], skip_rows: int = 0) -> Iterator[pd.DataFrame]:
+    """Chunks of ``columns`` from ``path``, starting after the first ``skip_rows`` rows."""
+    file_format = input_format(path)
+    if file_format == "csv":
+        # Skipped rows are dropped by the parser, without building frames for them
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size,
+                               skiprows=lambda row: 0 < row <= skip_rows)
+        return
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        batches = (batch.to_pandas() for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns))
+    else:
+        batches = (chunk[columns] for chunk in pd.read_json(path, lines=True, chunksize=chunk_size))
+
+    for chunk in batches:
+        if skip_rows >= len(chunk):
+            skip_rows -= len(chunk)
+            continue
+        yield chunk.iloc[skip_rows:]
+        skip_rows = 0
+
+
+class _LinearScorer:
+    """Model 1 or 2: the pipeline artifact if there is one, else the pickles."""
+
+    def __init__(self, model_dir: str):
+        pipeline_dir = os.path.join(model_dir, "pipeline")
+        if os.path.isdir(pipeline_dir):
+            from src.ml.linear_pipeline import LinearPipeline
+
+            self.pipeline = LinearPipeline.load(pipeline_dir)
+            self.classes = self.pipeline.classes_
+        else:
+            import joblib
+
+            self.pipeline = None
+            self.model = joblib.load(os.path.join(model_dir, "model.pkl"))
+            self.vectorizer = joblib.load(os.path.join(model_dir, "vectorizer.pkl"))
+            self.classes = self.model.classes_
+
+    def __call__(self, texts: List[str]):
+        if self.pipeline is not None:
+            probabilities = self.pipeline.predict_proba(texts)
+        else:
+            from src.ml.preprocessing import preprocess_batch
+
+            probabilities = self.model.predict_proba(self.vectorizer.transform(preprocess_batch(texts)))
+        best = probabilities.argmax(axis=1)
+        return self.classes[best], probabilities[np.arange(len(texts)), best]
+
+
+class _LSTMScorer:
+    """Model 3: the Keras model with the exported vocabulary."""
+
+    def __init__(self, model_dir: str):
+        from tensorflow import keras
+
+        from src.ml.lstm_vocabulary import SequenceVocabulary
+
+        self.model = keras.models.load_model(os.path.join(model_dir, "model.h5"))
+        self.vocabulary = SequenceVocabulary.load(os.path.join(model_dir, "vocabulary"))
+
+    def __call__(self, texts: List[str]):
+        from src.ml.preprocessing import preprocess_batch
+
+        sequences = self.vocabulary.encode(preprocess_batch(texts))
+        probability = self.model.predict(sequences, batch_size=1024, verbose=0)[:, 0]
+        return probability >= 0.5, probability
+
+
+def _init_worker(model_dirs: Dict[str, str], threads: int):
+    from threadpoolctl import threadpool_limits
+
+    # Ctrl-C reaches the whole process group; only the parent handles it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    threadpool_limits(threads)
+    for name, model_dir in model_dirs.items():
+        _scorers[name] = _LSTMScorer(model_dir) if name == "model3" else _LinearScorer(model_dir)
+
+
+def _score_chunk(texts: List[str]) -> Dict[str, np.ndarray]:
+    # Runs in a worker
+    columns = {}
+    for name, scorer in _scorers.items():
+        labels, scores = scorer(texts)
+        task = TASKS[name]
+        columns[task] = labels
+        columns[f"{task}_probability" if name == "model3" else f"{task}_confidence"] = np.round(scores, 6)
+    return columns
+
+
+def input_fingerprint(path: str) -> Dict[str, Any]:
+    """Identifies the input file's contents without reading it: its path, size and modification time."""
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class _Writer:
+    """Appends scored chunks to the output and records how far it got.
+
+    ``run`` describes the input and settings the output is scored from. It is
+    stored with every checkpoint, and resuming a checkpoint written for a
+    different ``run`` raises ValueError.
+    """
+
+    def __init__(self, path: str, restart: bool, run: Dict[str, Any]):
+        self.path = path
+        self.format = input_format(path)
+        self.progress_path = path.rstrip("/") + PROGRESS_SUFFIX
+        self.run = run
+        self.rows_done = 0
+        self.chunks_done = 0
+        self.output_bytes = 0
+
+        if restart or not os.path.exists(self.progress_path):
+            self._clear()
+            return
+        with open(self.progress_path) as f:
+            progress = json.load(f)
+        previous = progress.get("run") or {}
+        if previous != run:
+            changed = sorted(key for key in run.keys() | previous.keys() if previous.get(key) != run.get(key))
+            raise ValueError(f"{self.progress_path} was written for a different input or settings "
+                             f"({', '.join(changed)} changed); run with --restart to start over")
+        self.rows_done, self.chunks_done, self.output_bytes = (
+            progress["rows_done"], progress["chunks_done"], progress["output_bytes"])
+        # Drop whatever was written after the last checkpoint
+        if self.format == "parquet":
+            for name in os.listdir(path):
+                if name.startswith("part-") and int(name[5:10]) >= self.chunks_done:
+                    os.remove(os.path.join(path, name))
+        elif os.path.exists(path):
+            with open(path, "r+b") as f:
+                f.truncate(self.output_bytes)
+
+    def _clear(self):
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+        if self.format == "parquet":
+            os.makedirs(self.path)
+
+    def write(self, chunk: pd.DataFrame):
+        if self.format == "parquet":
+            chunk.to_parquet(os.path.join(self.path, f"part-{self.chunks_done:05d}.parquet"), index=False)
+        else:
+            with open(self.path, "a", encoding="utf-8", newline="") as f:
+                if self.format == "csv":
+                    chunk.to_csv(f, header=self.output_bytes == 0, index=False)
+                elif not chunk.empty:
+                    lines = chunk.to_json(orient="records", lines=True, force_ascii=False)
+                    f.write(lines if lines.endswith("\n") else lines + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.output_bytes = os.path.getsize(self.path)
+        self.rows_done += len(chunk)
+        self.chunks_done += 1
+
+        tmp_path = self.progress_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"rows_done": self.rows_done, "chunks_done": self.chunks_done,
+                       "output_bytes": self.output_bytes, "run": self.run}, f)
+        os.replace(tmp_path, self.progress_path)
+
+
+def score_file(input_path: str, output_path: str, models=DEFAULT_MODELS, model_root: str = MODEL_ROOT,
+               text_column: str = "text", keep_columns: Optional[List[str]] = None,
+               chunk_size: int = DEFAULT_CHUNK_SIZE, workers: Optional[int] = None,
+               threads_per_worker: int = 1, restart: bool = False) -> Dict[str, Any]:
+    """Score ``input_path`` into ``output_path`` and return row counts and timings."""
+    workers = workers or os.cpu_count() or 1
+    keep_columns = [column for column in (keep_columns or []) if column != text_column]
+    model_dirs = {name: os.path.join(model_root, name) for name in models}
+    run = {"input": input_fingerprint(input_path), "models": list(models), "text_column": text_column,
+           "keep_columns": keep_columns, "chunk_size": chunk_size}
+    writer = _Writer(output_path, restart, run)
+    if writer.rows_done:
+        print(f"Resuming after {writer.rows_done} rows")
+
+    start = time.perf_counter()
+    scored = 0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(model_dirs, threads_per_worker)) as executor:
+        pending = []
+        chunks = iter_chunks(input_path, chunk_size, keep_columns + [text_column], writer.rows_done)
+        try:
+            while True:
+                # Keep every worker busy without reading far ahead of the writer
+                for chunk in chunks:
+                    texts = chunk[text_column].fillna("").astype(str).tolist()
+                    pending.append((chunk[keep_columns].reset_index(drop=True),
+                                    executor.submit(_score_chunk, texts)))
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    break
+                kept, future = pending.pop(0)
+                writer.write(pd.concat([kept, pd.DataFrame(future.result())], axis=1))
+                scored += len(kept)
+                elapsed = time.perf_counter() - start
+                print(f"{writer.rows_done} rows done ({scored / elapsed:.0f} rows/s)")
+        except KeyboardInterrupt:
+            print(f"Interrupted after {writer.rows_done} rows; run again to resume")
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    elapsed = time.perf_counter() - start
+    return {"rows_scored": scored, "rows_done": writer.rows_done, "seconds": round(elapsed, 1),
+            "rows_per_second": round(scored / elapsed, 1) if elapsed else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("input", help="CSV, JSONL or Parquet file with a text column")
+    parser.add_argument("--output", required=True,
+                        help="CSV or JSONL file, or Parquet directory (by extension)")
+    parser.add_argument("--models", nargs="+", choices=list(TASKS), default=list(DEFAULT_MODELS))
+    parser.add_argument("--model-root", default=MODEL_ROOT)
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--keep-columns", nargs="*", default=[],
+                        help="Input columns copied to the output, e.g. an id")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (default: all CPU cores)")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    result = score_file(args.input, args.output, models=args.models, model_root=args.model_root,
+                        text_column=args.text_column, keep_columns=args.keep_columns,
+                        chunk_size=args.chunk_size, workers=args.workers,
+                        threads_per_worker=args.threads_per_worker, restart=args.restart)
+    print(f"Scored {result['rows_scored']} rows in {result['seconds']}s ({result['rows_per_second']} rows/s); "
+          f"{result['rows_done']} rows in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
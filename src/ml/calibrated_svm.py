@@ -0,0 +1,60 @@
+import numpy as np
+from scipy.special import expit
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.svm import LinearSVC
+from sklearn.utils.extmath import safe_sparse_dot
+
+
+class CalibratedLinearSVC(ClassifierMixin, BaseEstimator):
+    """Linear SVM trained with liblinear plus a separate Platt scaling step.
+
+    Fitting runs ``CalibratedClassifierCV(LinearSVC(), method='sigmoid')`` with
+    ``ensemble=False``: the sigmoids are fitted on cross-validated decision values
+    and a single LinearSVC is refit on all the data. The result is then reduced to
+    plain arrays (weights, intercepts and per-class sigmoid parameters), so scoring
+    is one sparse-dense product and gives the same probabilities as the
+    calibrated classifier without its per-call overhead.
+    """
+
+    def __init__(self, C: float = 1.0, cv: int = 5):
+        self.C = C
+        self.cv = cv
+
+    def fit(self, X, y):
+        calibrated = CalibratedClassifierCV(
+            LinearSVC(C=self.C, dual=True),
+            method='sigmoid',
+            cv=self.cv,
+            ensemble=False
+        ).fit(X, y)
+
+        classifier = calibrated.calibrated_classifiers_[0]
+        self.classes_ = calibrated.classes_
+        self.coef_ = classifier.estimator.coef_
+        self.intercept_ = classifier.estimator.intercept_
+        # One (a, b) row per decision column: p = 1 / (1 + exp(a * d + b))
+        self.sigmoid_ = np.array([[c.a_, c.b_] for c in classifier.calibrators])
+        return self
+
+    def decision_function(self, X):
+        return safe_sparse_dot(X, self.coef_.T, dense_output=True) + self.intercept_
+
+    def predict_proba(self, X):
+        decision = self.decision_function(X)
+        proba = expit(-(self.sigmoid_[:, 0] * decision + self.sigmoid_[:, 1]))
+
+        if len(self.classes_) == 2:
+            # A binary LinearSVC has a single decision column for the positive class
+            return np.hstack([1.0 - proba, proba])
+
+        # Normalize the one-vs-rest probabilities the way CalibratedClassifierCV does
+        denominator = proba.sum(axis=1, keepdims=True)
+        uniform = 1.0 / len(self.classes_)
+        proba = np.divide(proba, denominator, out=np.full_like(proba, uniform),
+                          where=denominator != 0)
+        proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
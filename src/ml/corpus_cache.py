@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import joblib
+import pandas as pd
+
+from src.ml.preprocessing import preprocessing_fingerprint
+
+DEFAULT_CACHE_DIR = "data/cache/corpus"
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CorpusCache:
+    """Content-addressed on-disk cache of preprocessed corpora.
+
+    Entries are keyed by the SHA-256 of the dataset file plus the preprocessing
+    fingerprint, so they are reused until either the data or the pipeline
+    changes. Processed text is stored as Parquet (pickle when no Parquet engine
+    is installed); fitted TF-IDF matrices are stored as sparse ``.npz`` files
+    next to their pickled vectorizer.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def dataset_key(self, csv_path: str, *parts: str) -> str:
+        """Key for a dataset file; extra ``parts`` describe how its text column is built."""
+        stat = os.stat(csv_path)
+        file_id = (os.path.abspath(csv_path), stat.st_mtime_ns, stat.st_size)
+        if file_id not in self._digests:
+            self._digests[file_id] = _file_digest(csv_path)
+
+        digest = hashlib.sha256()
+        for part in (self._digests[file_id], preprocessing_fingerprint(), *parts):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{suffix}")
+
+    def _read_meta(self, key: str) -> Optional[dict]:
+        path = self._path(key, ".json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self, key: str, meta: dict) -> None:
+        # The metadata file is written last and marks the entry as complete
+        tmp_path = self._path(key, ".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(key, ".json"))
+
+    def _record_hit(self, meta: dict, load_time: float) -> None:
+        self.hits += 1
+        self.time_saved += max(meta["compute_seconds"] - load_time, 0.0)
+
+    def processed_text(self, key: str, compute: Callable[[], pd.Series]) -> pd.Series:
+        """Return the cached processed text for ``key``, computing and storing it on a miss."""
+        start = time.perf_counter()
+        meta = self._read_meta(key)
+        if meta is not None:
+            if meta["format"] == "parquet":
+                frame = pd.read_parquet(self._path(key, ".parquet"))
+            else:
+                frame = pd.read_pickle(self._path(key, ".pkl"))
+            self._record_hit(meta, time.perf_counter() - start)
+            return frame["processed_text"]
+
+        self.misses += 1
+        processed = compute()
+        compute_seconds = time.perf_counter() - start
+
+        frame = pd.DataFrame({"processed_text": processed})
+        try:
+            frame.to_parquet(self._path(key, ".parquet"))
+            storage_format = "parquet"
+        except ImportError:
+            # Parquet needs pyarrow or fastparquet; fall back to pickle without them
+            frame.to_pickle(self._path(key, ".pkl"))
+            storage_format = "pickle"
+        self._write_meta(key, {
+            "format": storage_format,
+            "rows": len(frame),
+            "compute_seconds": compute_seconds,
+        })
+        return processed
+
+    def fit_transform(self, key: str, vectorizer, texts: pd.Series):
+        """Fit ``vectorizer`` on ``texts`` or load a previous fit with the same parameters.
+
+        Returns the fitted vectorizer (the cached one on a hit) and the sparse matrix.
+        """
+        from scipy import sparse
+
+        params = json.dumps(vectorizer.get_params(), sort_keys=True, default=repr)
+        matrix_key = hashlib.sha256(f"{key}\0{type(vectorizer).__name__}\0{params}".encode("utf-8")).hexdigest()
+
+        start = time.perf_counter()
+        meta = self._read_meta(matrix_key)
+        if meta is not None:
+            vectorizer = joblib.load(self._path(matrix_key, ".vectorizer.pkl"))
+            X = sparse.load_npz(self._path(matrix_key, ".npz"))
+            self._record_hit(meta, time.perf_counter() - start)
+            return vectorizer, X
+
+        self.misses += 1
+        X = vectorizer.fit_transform(texts)
+        compute_seconds = time.perf_counter() - start
+
+        sparse.save_npz(self._path(matrix_key, ".npz"), X)
+        joblib.dump(vectorizer, self._path(matrix_key, ".vectorizer.pkl"))
+        self._write_meta(matrix_key, {"format": "npz", "rows": X.shape[0], "compute_seconds": compute_seconds})
+        return vectorizer, X
+
+    def report(self) -> str:
+        return (f"Corpus cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.time_saved:.1f}s saved")
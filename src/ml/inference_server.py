@@ -0,0 +1,348 @@
+"""Local asyncio HTTP service that serves MultiModelChatbot with micro-batching.
+
+Concurrent requests are queued and grouped into batches of up to
+``max_batch_size`` texts, waiting at most ``max_wait_ms`` for a batch to fill.
+Batches run through ``MultiModelChatbot.predict_batch`` on a worker thread
+pool so the event loop keeps accepting requests. When the queue is full new
+requests are rejected with 503 instead of piling up.
+
+Endpoints:
+    POST /predict   {"text": "..."} -> {"predictions": {...}}
+    POST /respond   {"text": "..."} -> {"response": "...", "predictions": {...}}
+    GET  /metrics   latency percentiles, batch-size histogram, queue depth,
+                    result cache counters, model memory (loads, evictions, RSS),
+                    cascade escalation rates and per-stage timings (tokenize,
+                    forward, ...)
+    GET  /metrics/prometheus
+                    the per-stage timings in the Prometheus text format
+    POST /profile/start, /profile/stop
+                    sampling profiler; stop returns the hottest functions and
+                    the folded stacks
+    GET  /health
+
+Per-stage timings are only recorded with ``--instrument`` (or
+``MH_INSTRUMENTATION=1``); the profiler works either way.
+
+Run from the repository root:
+
+    python -m src.ml.inference_server --port 8000 --model-dir models
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.ml import instrumentation
+
+MAX_BODY_BYTES = 1 << 20
+LATENCY_WINDOW = 10000
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class QueueFullError(Exception):
+    """Raised when the request queue is at capacity."""
+
+
+class BatcherStats:
+    """Latency percentiles over a sliding window plus a batch-size histogram."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.queue_waits = deque(maxlen=window)
+        self.batch_sizes: Counter = Counter()
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def record_batch(self, size: int, queue_waits: List[float], latencies: List[float]):
+        self.batch_sizes[size] += 1
+        self.requests += size
+        self.queue_waits.extend(queue_waits)
+        self.latencies.extend(latencies)
+
+    @staticmethod
+    def _percentiles(values) -> Dict[str, float]:
+        if not values:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+        p50, p95, p99 = np.percentile(np.fromiter(values, dtype=float), [50, 95, 99]) * 1000
+        return {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3)}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "latency_ms": self._percentiles(self.latencies),
+            "queue_wait_ms": self._percentiles(self.queue_waits),
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+        }
+
+
+class MicroBatcher:
+    """Collects concurrent requests into batches for a batch-processing function.
+
+    Args:
+        process_batch: Called on a worker thread with a list of inputs; returns
+            one result per input, in order
+        max_batch_size: Largest batch handed to ``process_batch``
+        max_wait_ms: How long the first request of a batch waits for others
+        max_queue_size: Pending requests allowed before ``submit`` rejects new ones
+        num_workers: Batches that may run at the same time
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 max_queue_size: int = 1024, num_workers: int = 1):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.num_workers = num_workers
+        self.stats = BatcherStats()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="inference")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        self._slots = asyncio.Semaphore(self.num_workers)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, item: Any) -> Any:
+        """Queue ``item`` and wait for its result."""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.stats.rejected += 1
+            raise QueueFullError() from None
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free worker first, so requests keep batching up while all are busy
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            loop.create_task(self._execute(batch))
+
+    async def _execute(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(self._executor, self.process_batch,
+                                                 [item for item, _, _ in batch])
+        except Exception as e:
+            self.stats.errors += len(batch)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        finished = time.perf_counter()
+        self.stats.record_batch(
+            len(batch),
+            [started - enqueued for _, _, enqueued in batch],
+            [finished - enqueued for _, _, enqueued in batch],
+        )
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class InferenceServer:
+    """Minimal HTTP/1.1 JSON server in front of a MicroBatcher."""
+
+    def __init__(self, chatbot, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 max_queue_size: int = 1024, num_workers: int = 1):
+        self.chatbot = chatbot
+        self.batcher = MicroBatcher(
+            lambda texts: chatbot.predict_batch(texts, batch_size=max_batch_size),
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue_size=max_queue_size,
+            num_workers=num_workers,
+        )
+
+    async def handle_request(self, method: str, path: str, body: bytes) -> Tuple[int, Union[Dict[str, Any], str]]:
+        if path == "/health":
+            return 200, {"status": "ok", "tasks": sorted(self.chatbot.available_tasks())}
+        if path == "/metrics":
+            return 200, {**self.batcher.stats.snapshot(), "queue_depth": self.batcher.queue_depth,
+                         "result_cache": self.chatbot.cache_stats(), "models": self.chatbot.memory_stats(),
+                         "cascade": self.chatbot.cascade_stats(),
+                         "instrumentation": instrumentation.snapshot()}
+        if path == "/metrics/prometheus":
+            return 200, instrumentation.to_prometheus()
+        if path in ("/profile/start", "/profile/stop"):
+            if method != "POST":
+                return 405, {"error": "Use POST"}
+            profiler = instrumentation.profiler
+            if path == "/profile/start":
+                profiler.reset()
+                profiler.start()
+                return 200, {"profiling": True, "interval_s": profiler.interval}
+            profiler.stop()
+            return 200, {"profiling": False, "samples": profiler.samples, "top": profiler.top(),
+                         "folded": profiler.folded()}
+        if path not in ("/predict", "/respond"):
+            return 404, {"error": "Not found"}
+        if method != "POST":
+            return 405, {"error": "Use POST"}
+
+        try:
+            text = json.loads(body or b"{}").get("text")
+        except (ValueError, AttributeError):
+            return 400, {"error": "Body must be a JSON object"}
+        if not isinstance(text, str) or not text:
+            return 400, {"error": "'text' must be a non-empty string"}
+
+        try:
+            predictions = await self.batcher.submit(text)
+        except QueueFullError:
+            return 503, {"error": "Server is overloaded, retry later"}
+        except Exception as e:
+            return 500, {"error": str(e)}
+
+        if path == "/respond":
+            return 200, {"response": self.chatbot.response_from_predictions(predictions),
+                         "predictions": predictions}
+        return 200, {"predictions": predictions}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    status, payload = 413, {"error": "Request body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    status, payload = await self.handle_request(method, path.split("?")[0], body)
+                    keep_alive = (version == "HTTP/1.1"
+                                  and headers.get("connection", "").lower() != "close")
+
+                if isinstance(payload, str):
+                    data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+                else:
+                    data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+                head = [
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+                    f"Content-Type: {content_type}",
+                    f"Content-Length: {len(data)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                ]
+                if status == 503:
+                    head.append("Retry-After: 1")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Inference server listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model-dir", default="models",
+                        help="Directory holding emotion_model, sentiment_model, intent_model "
+                             "and/or multitask_model")
+    parser.add_argument("--runtime", default="torch",
+                        help="torch, or an export format written by src.ml.models.export")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="Prediction results kept for repeated messages (0 disables)")
+    parser.add_argument("--cache-ttl", type=float, default=3600.0,
+                        help="Seconds a cached prediction stays valid (must be positive)")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-queue-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Batches run concurrently on this many threads")
+    parser.add_argument("--lazy", action="store_true",
+                        help="Load each model on its first request instead of at startup")
+    parser.add_argument("--memory-budget-mb", type=float, default=None,
+                        help="Unload least recently used models to keep loaded models under this size")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Answer with the TF-IDF models of models 1 and 2 first and only run "
+                             "the transformers on messages they are unsure about")
+    parser.add_argument("--cascade-thresholds", default=None,
+                        help="Thresholds file written by src.ml.models.cascade")
+    parser.add_argument("--instrument", action="store_true",
+                        help="Record per-stage timings for /metrics")
+    args = parser.parse_args()
+
+    if args.instrument:
+        instrumentation.enable()
+
+    from src.ml.models.cascade import DEFAULT_CASCADE_MODELS
+    from src.ml.models.multi_model import MultiModelChatbot, MULTITASK
+
+    tasks = ["emotion", "sentiment", "intent", MULTITASK]
+    chatbot = MultiModelChatbot({task: f"{args.model_dir}/{task}_model" for task in tasks},
+                                runtime=args.runtime, cache_size=args.cache_size,
+                                cache_ttl=args.cache_ttl, lazy=args.lazy,
+                                memory_budget_mb=args.memory_budget_mb,
+                                cascade_models=DEFAULT_CASCADE_MODELS if args.cascade else None,
+                                cascade_thresholds=args.cascade_thresholds)
+    server = InferenceServer(chatbot, args.max_batch_size, args.max_wait_ms,
+                             args.max_queue_size, args.workers)
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
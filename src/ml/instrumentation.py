@@ -0,0 +1,374 @@
+"""Per-stage timers, counters and an on-demand sampling profiler.
+
+Code marks the stages it wants measured:
+
+    from src.ml.instrumentation import stage, count
+
+    with stage("vectorize"):
+        X = vectorizer.transform(texts)
+    count("texts", len(texts))
+
+Each stage feeds a histogram with fixed, log-spaced buckets kept per thread,
+so recording a duration is a bisect and three lock-free additions (about a
+microsecond). Stages wrap whole batches, requests or training steps, which
+keeps the overhead below 1%.
+While instrumentation is disabled (the default) ``stage`` returns a shared
+no-op context manager and ``count`` returns immediately.
+
+Enable it with ``MH_INSTRUMENTATION=1`` or ``enable()``. ``snapshot()`` returns
+the measurements as a dict and ``to_prometheus()`` in the Prometheus text
+format; ``write_report`` writes either, depending on the file extension.
+
+``profiler`` is a sampling profiler that can be started and stopped while the
+process runs (``install_profiler_signal`` toggles it on SIGUSR1). A background
+thread records the Python stacks of the other threads every ``interval``
+seconds; ``folded()`` returns them in the collapsed format flame graph tools
+read.
+"""
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+ENV_VAR = "MH_INSTRUMENTATION"
+METRIC_PREFIX = "mental_health"
+
+# Upper bounds in seconds, 10 us to 60 s, roughly 2.5 buckets per decade
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+DEFAULT_PROFILE_INTERVAL = 0.01
+
+_perf_counter = time.perf_counter
+_bisect_left = bisect.bisect_left
+_get_ident = threading.get_ident
+
+
+class Histogram:
+    """Count, sum and bucket counts of observed durations.
+
+    Every thread records into its own shard, so recording takes no lock;
+    reads add the shards up.
+    """
+
+    __slots__ = ("bounds", "_shards", "_lock")
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        # Thread id -> [count, sum, bucket counts...], with one more bucket for
+        # values above the largest bound
+        self._shards: Dict[int, List] = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> List:
+        shard = self._shards.get(_get_ident())
+        if shard is None:
+            with self._lock:
+                shard = self._shards[_get_ident()] = [0, 0.0] + [0] * (len(self.bounds) + 1)
+        return shard
+
+    def observe(self, value: float):
+        shard = self._shard()
+        shard[0] += 1
+        shard[1] += value
+        shard[2 + _bisect_left(self.bounds, value)] += 1
+
+    def totals(self) -> Tuple[int, float, List[int]]:
+        """Count, sum and per-bucket counts over all threads."""
+        with self._lock:
+            shards = list(self._shards.values())
+        count, total = sum(shard[0] for shard in shards), sum(shard[1] for shard in shards)
+        buckets = [sum(column) for column in zip(*(shard[2:] for shard in shards))]
+        return count, total, buckets or [0] * (len(self.bounds) + 1)
+
+    @property
+    def count(self) -> int:
+        return self.totals()[0]
+
+    def quantile(self, q: float, totals: Optional[Tuple[int, float, List[int]]] = None) -> float:
+        """Estimate of the ``q`` quantile, interpolated within its bucket."""
+        count, _, buckets = totals or self.totals()
+        if not count:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for index, bucket in enumerate(buckets):
+            if bucket and cumulative + bucket >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - cumulative) / bucket
+            cumulative += bucket
+        return self.bounds[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        totals = self.totals()
+        count, total, _ = totals
+        return {
+            "count": count,
+            "total_s": round(total, 6),
+            "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+            "p50_ms": round(self.quantile(0.5, totals) * 1000, 3),
+            "p95_ms": round(self.quantile(0.95, totals) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99, totals) * 1000, 3),
+        }
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.start = _perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(_perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Registry:
+    """Stage histograms and counters of one process."""
+
+    def __init__(self, enabled: bool = False, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _histogram(self, name: str) -> Histogram:
+        histogram = self.stages.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(name, Histogram(self.buckets))
+        return histogram
+
+    def stage(self, name: str):
+        """Context manager timing one run of stage ``name``."""
+        if not self.enabled:
+            return _NULL_TIMER
+        histogram = self.stages.get(name)
+        if histogram is None:
+            histogram = self._histogram(name)
+        return _Timer(histogram)
+
+    def observe(self, name: str, seconds: float):
+        """Record a duration measured elsewhere."""
+        if self.enabled:
+            self._histogram(name).observe(seconds)
+
+    def count(self, name: str, value: int = 1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += value
+
+    def timed(self, name: str) -> Callable:
+        """Decorator timing every call of a function as stage ``name``."""
+        def decorator(function):
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            wrapper.__name__ = function.__name__
+            wrapper.__doc__ = function.__doc__
+            wrapper.__wrapped__ = function
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = Counter()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-stage count, total and latency quantiles, and the counters."""
+        return {
+            "enabled": self.enabled,
+            "stages": {name: histogram.snapshot() for name, histogram in sorted(self.stages.items())},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def to_prometheus(self) -> str:
+        """All measurements in the Prometheus text exposition format."""
+        seconds = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [f"# HELP {seconds} Time spent per run of each stage.", f"# TYPE {seconds} histogram"]
+        for name, histogram in sorted(self.stages.items()):
+            observed, total, buckets = histogram.totals()
+            label = _escape_label(name)
+            cumulative = 0
+            for bound, bucket in zip(histogram.bounds, buckets):
+                cumulative += bucket
+                lines.append(f'{seconds}_bucket{{stage="{label}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{seconds}_bucket{{stage="{label}",le="+Inf"}} {observed}')
+            lines.append(f'{seconds}_sum{{stage="{label}"}} {total!r}')
+            lines.append(f'{seconds}_count{{stage="{label}"}} {observed}')
+
+        events = f"{METRIC_PREFIX}_events_total"
+        lines += [f"# HELP {events} Counted events.", f"# TYPE {events} counter"]
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{events}{{name="{_escape_label(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of all other threads from a background thread.
+
+    Overhead is proportional to the sampling rate: walking the stacks takes
+    tens of microseconds, so the default 10 ms interval costs well under 1%.
+    """
+
+    def __init__(self, interval: float = DEFAULT_PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Held while the sampler thread adds a sample and while readers copy the stacks
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: Optional[float] = None):
+        """Start sampling, keeping the stacks recorded by earlier runs."""
+        if self.running:
+            return
+        if interval is not None:
+            self.interval = interval
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self.stacks = Counter()
+            self.samples = 0
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            sampled = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                sampled.append(";".join(reversed(stack)))
+            with self._lock:
+                self.stacks.update(sampled)
+                self.samples += 1
+
+    def _snapshot(self) -> Counter:
+        """A copy of the stacks that the sampler thread does not change while it is read."""
+        with self._lock:
+            return Counter(self.stacks)
+
+    def folded(self) -> str:
+        """One ``frame;frame;... count`` line per distinct stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self._snapshot().most_common())
+
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Functions most often on top of a stack, with their share of the samples."""
+        leaves: Counter = Counter()
+        for stack, count in self._snapshot().items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"function": function, "samples": count, "share": round(count / total, 4)}
+                for function, count in leaves.most_common(limit)]
+
+
+registry = Registry(enabled=os.environ.get(ENV_VAR, "") not in ("", "0"))
+profiler = SamplingProfiler()
+
+stage = registry.stage
+count = registry.count
+observe = registry.observe
+timed = registry.timed
+snapshot = registry.snapshot
+to_prometheus = registry.to_prometheus
+
+
+def enable():
+    registry.enabled = True
+
+
+def disable():
+    registry.enabled = False
+
+
+def write_report(path: str):
+    """Write the measurements to ``path``: Prometheus text for ``.prom``/``.txt``, JSON otherwise.
+
+    Stacks the profiler recorded go to ``<path>.folded``.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        if path.endswith((".prom", ".txt")):
+            f.write(to_prometheus())
+        else:
+            json.dump(snapshot(), f, indent=2)
+    if profiler.samples:
+        with open(f"{path}.folded", "w") as f:
+            f.write(profiler.folded())
+
+
+def install_profiler_signal(output: Optional[str] = None, signum: Optional[int] = None):
+    """Toggle the profiler whenever the process receives ``signum`` (SIGUSR1 by default).
+
+    On each stop the folded stacks are written to ``output`` if given. Must be
+    called from the main thread; does nothing where SIGUSR1 doesn't exist.
+    """
+    import signal
+
+    if signum is None:
+        if not hasattr(signal, "SIGUSR1"):
+            return
+        signum = signal.SIGUSR1
+
+    def toggle(*_):
+        if profiler.running:
+            profiler.stop()
+            if output:
+                with open(output, "w") as f:
+                    f.write(profiler.folded())
+            print(f"Profiler stopped after {profiler.samples} samples", file=sys.stderr)
+        else:
+            profiler.start()
+            print("Profiler started", file=sys.stderr)
+
+    signal.signal(signum, toggle)
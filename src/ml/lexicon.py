@@ -0,0 +1,117 @@
+"""NLTK-free replacement for ``TextPreprocessor``, built for one fitted vocabulary.
+
+The preprocessing pipeline needs NLTK for two things: the English stopword list
+and the WordNet lemmatizer. ``build_lexicon`` exports what a given vocabulary
+needs of both, and ``LexiconPreprocessor`` applies it with nothing but the
+standard library:
+
+- the stopword list and the noun exception list, in full (a few thousand words)
+- WordNet's noun suffix rules
+- only those WordNet nouns that can be the lemma of a word whose lemma
+  might be a vocabulary token, plus the one-letter nouns
+
+For any input word this yields the exact lemma whenever the lemma is a
+vocabulary token, and otherwise a token that is equally absent from the
+vocabulary (or equally dropped by the vectorizer for being one letter). The
+TF-IDF features, and so the scores, are therefore identical to the NLTK
+pipeline.
+"""
+import string
+from functools import lru_cache
+from typing import Dict, Iterable, List, Set
+
+from src.ml.preprocessing import DEFAULT_CACHE_SIZE, TextPreprocessor, get_preprocessor
+
+LEXICON_VERSION = 1
+
+
+def _apply_rules(word: str, substitutions) -> List[str]:
+    return [word[:-len(old)] + new for old, new in substitutions if word.endswith(old)]
+
+
+def _inverse_rules(lemma: str, substitutions) -> List[str]:
+    # Words that a suffix rule turns into ``lemma``
+    return [lemma[:len(lemma) - len(new)] + old for old, new in substitutions if lemma.endswith(new)]
+
+
+def build_lexicon(tokens: Iterable[str]) -> Dict:
+    """Export the stopwords and the part of WordNet needed to lemmatize towards ``tokens``.
+
+    ``tokens`` are the words appearing in the vocabulary terms. Requires NLTK
+    and its corpora; the result is checked against ``WordNetLemmatizer``.
+    """
+    import nltk
+    from nltk.corpus import wordnet as wn
+
+    preprocessor = get_preprocessor()
+    tokens = set(tokens)
+    substitutions = [list(rule) for rule in wn.MORPHOLOGICAL_SUBSTITUTIONS["n"]]
+    exceptions = {word: list(forms) for word, forms in wn._exception_map["n"].items()}
+
+    def is_noun(form: str) -> bool:
+        return "n" in wn._lemma_pos_offset_map.get(form, ())
+
+    # Every word with a candidate lemma among the tokens, and all of its candidates
+    words: Set[str] = set(string.ascii_lowercase)
+    for token in tokens:
+        words.add(token)
+        words.update(_inverse_rules(token, substitutions))
+    words.update(word for word, forms in exceptions.items() if tokens.intersection(forms))
+    candidates = set(words) | {""}
+    for word in words:
+        candidates.update(exceptions[word] if word in exceptions else _apply_rules(word, substitutions))
+    for forms in exceptions.values():
+        candidates.update(forms)
+
+    lexicon = {
+        "version": LEXICON_VERSION,
+        "nltk_version": nltk.__version__,
+        "stopwords": sorted(preprocessor.stop_words),
+        "substitutions": substitutions,
+        "exceptions": exceptions,
+        "nouns": sorted(form for form in candidates if is_noun(form)),
+    }
+
+    # The lexicon reimplements WordNet's noun lookup; make sure it still agrees
+    lexicon_preprocessor = LexiconPreprocessor(lexicon)
+    for word in sorted(words - preprocessor.stop_words):
+        expected = preprocessor.lemmatizer.lemmatize(word)
+        actual = lexicon_preprocessor._normalize_token(word)
+        if expected in tokens or actual in tokens:
+            agrees = expected == actual
+        else:
+            # Either both are dropped by the vectorizer for being one letter, or neither
+            agrees = (len(expected) < 2) == (len(actual) < 2)
+        if not agrees:
+            raise RuntimeError(f"Lexicon lemmatizes {word!r} to {actual!r}, WordNet to {expected!r}; "
+                               f"NLTK {nltk.__version__} may have changed its lemmatizer")
+    return lexicon
+
+
+class LexiconPreprocessor(TextPreprocessor):
+    """``TextPreprocessor`` driven by a lexicon from ``build_lexicon`` instead of NLTK."""
+
+    def __init__(self, lexicon: Dict, cache_size: int = DEFAULT_CACHE_SIZE):
+        if lexicon.get("version") != LEXICON_VERSION:
+            raise ValueError(f"Unsupported lexicon version {lexicon.get('version')!r}")
+        self.stop_words = frozenset(lexicon["stopwords"])
+        self.substitutions = [tuple(rule) for rule in lexicon["substitutions"]]
+        self.exceptions = lexicon["exceptions"]
+        self.nouns = frozenset(lexicon["nouns"])
+        # Deliberately not calling TextPreprocessor.__init__, which loads NLTK
+        self._normalize_token = lru_cache(maxsize=cache_size)(self._normalize_token_uncached)
+
+    def _lemmatize(self, word: str) -> str:
+        # WordNetLemmatizer.lemmatize(word): the shortest known noun among the
+        # word itself and its exception forms, or else its suffix-rule forms
+        if word in self.exceptions:
+            forms = self.exceptions[word]
+        else:
+            forms = _apply_rules(word, self.substitutions)
+        lemmas = [form for form in [word] + forms if form in self.nouns]
+        return min(lemmas, key=len) if lemmas else word
+
+    def _normalize_token_uncached(self, token: str) -> str:
+        if token in self.stop_words:
+            return ''
+        return self._lemmatize(token)
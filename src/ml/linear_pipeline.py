@@ -0,0 +1,482 @@
+"""Single-file-set inference artifact for the TF-IDF + linear classifiers (models 1 and 2).
+
+``export_pipeline`` reduces a fitted ``TfidfVectorizer`` and linear classifier
+to plain arrays plus a small JSON config:
+
+    pipeline.json     format version, preprocessing version, vectorizer settings,
+                      classes and how decision values become probabilities
+    vocabulary.txt    one term per line, in feature column order
+    idf.npy           idf weight of every feature column
+    weights.npy       (n_features, n_columns) decision weights
+    intercept.npy     decision intercepts
+    calibration.npy   sigmoid parameters, when the classifier has them
+    lexicon.json      stopwords and WordNet entries for ``src.ml.lexicon``
+
+``LinearPipeline.load`` memory-maps the arrays, so loading takes milliseconds
+and needs neither sklearn nor pickle. With the lexicon, preprocessing runs
+without NLTK too, so scoring only needs NumPy. Scoring builds the TF-IDF rows
+of a whole batch as one CSR structure and multiplies it with the weights in
+one pass.
+
+Export the saved pickles of a trained model from the repository root:
+
+    python -m src.ml.linear_pipeline --model-dir models/saved_models/model1
+"""
+import argparse
+import json
+import os
+import re
+from itertools import chain
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.ml import instrumentation
+from src.ml.preprocessing import PREPROCESSING_VERSION
+
+FORMAT_VERSION = 1
+CONFIG_FILE = "pipeline.json"
+VOCABULARY_FILE = "vocabulary.txt"
+LEXICON_FILE = "lexicon.json"
+ARRAY_FILES = ("idf", "weights", "intercept", "calibration")
+
+# How decision values are turned into probabilities, matching each classifier's predict_proba
+SOFTMAX = "softmax"                # multinomial LogisticRegression
+OVR_LOGISTIC = "ovr-logistic"      # one-vs-rest LogisticRegression, SGDClassifier(loss='log_loss')
+SIGMOID_OVR = "sigmoid-ovr"        # CalibratedLinearSVC
+LIBSVM_OVO = "libsvm-ovo"          # SVC(kernel='linear', probability=True)
+
+# Token id closing every message in an encoded batch, and the word standing for
+# it in cleaned text (cleaning leaves only letters and whitespace)
+_END_OF_MESSAGE = -2
+_END_WORD = "0"
+
+# libsvm's bounds for pairwise probabilities and its coupling iteration limit
+_LIBSVM_MIN_PROB = 1e-7
+_LIBSVM_MAX_ITER = 100
+
+
+def _probability_kind(model) -> str:
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
+    from sklearn.svm import SVC
+    from src.ml.calibrated_svm import CalibratedLinearSVC
+
+    if isinstance(model, LogisticRegression):
+        # Same rule LogisticRegression.predict_proba uses to pick one-vs-rest
+        multi_class = model.multi_class
+        if multi_class in ("ovr", "warn") or (
+            multi_class in ("auto", "deprecated") and (len(model.classes_) <= 2 or model.solver == "liblinear")
+        ):
+            return OVR_LOGISTIC
+        return SOFTMAX
+    if isinstance(model, SGDClassifier) and model.loss == "log_loss":
+        return OVR_LOGISTIC
+    if isinstance(model, CalibratedLinearSVC):
+        return SIGMOID_OVR
+    if isinstance(model, SVC) and model.kernel == "linear" and model.probability:
+        return LIBSVM_OVO
+    raise ValueError(f"Cannot export {type(model).__name__}: unsupported classifier")
+
+
+def _vectorizer_config(vectorizer) -> Dict:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    if not isinstance(vectorizer, TfidfVectorizer):
+        raise ValueError(f"Cannot export {type(vectorizer).__name__}: only a fitted TfidfVectorizer is supported")
+    if (vectorizer.analyzer != "word" or vectorizer.preprocessor is not None
+            or vectorizer.tokenizer is not None or vectorizer.stop_words is not None
+            or vectorizer.strip_accents is not None or vectorizer.norm not in ("l1", "l2", None)):
+        raise ValueError("Cannot export a TfidfVectorizer with a custom analyzer, "
+                         "stop words, accent stripping or norm")
+    return {
+        "lowercase": vectorizer.lowercase,
+        "token_pattern": vectorizer.token_pattern,
+        "ngram_range": list(vectorizer.ngram_range),
+        "binary": vectorizer.binary,
+        "sublinear_tf": vectorizer.sublinear_tf,
+        "use_idf": vectorizer.use_idf,
+        "norm": vectorizer.norm,
+    }
+
+
+def export_pipeline(model, vectorizer, path: str, lexicon: bool = True):
+    """Write ``model`` and its fitted ``vectorizer`` as a pipeline artifact directory.
+
+    With ``lexicon`` the NLTK data the vocabulary depends on is exported as
+    well, so the artifact can be scored without NLTK.
+    """
+    from src.ml.lexicon import build_lexicon
+    from src.ml.preprocessing import preprocessing_fingerprint
+
+    kind = _probability_kind(model)
+    config = _vectorizer_config(vectorizer)
+    classes = model.classes_.tolist()
+
+    coef = model.coef_
+    if hasattr(coef, "toarray"):
+        # SVC trained on sparse input keeps a sparse coef_
+        coef = coef.toarray()
+    coef = np.asarray(coef, dtype=np.float64)
+    intercept = np.asarray(model.intercept_, dtype=np.float64).ravel()
+    calibration = None
+    if kind == SIGMOID_OVR:
+        calibration = np.asarray(model.sigmoid_, dtype=np.float64)
+    elif kind == LIBSVM_OVO:
+        calibration = np.column_stack([model.probA_, model.probB_]).astype(np.float64)
+        if len(classes) == 2:
+            # sklearn flips the sign of a binary SVC; libsvm's probabilities use the original
+            coef, intercept = -coef, -intercept
+
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, column in vectorizer.vocabulary_.items():
+        terms[column] = term
+    idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(len(terms))
+
+    os.makedirs(path, exist_ok=True)
+    arrays = {
+        "idf": np.asarray(idf, dtype=np.float64),
+        # Feature-major, so the rows a message touches are contiguous
+        "weights": np.ascontiguousarray(coef.T),
+        "intercept": intercept,
+        "calibration": calibration,
+    }
+    for name, array in arrays.items():
+        if array is not None:
+            np.save(os.path.join(path, f"{name}.npy"), array)
+    with open(os.path.join(path, VOCABULARY_FILE), "w", encoding="utf-8") as f:
+        f.write("\n".join(terms))
+    if lexicon:
+        tokens = {token for term in terms for token in term.split(" ")}
+        with open(os.path.join(path, LEXICON_FILE), "w", encoding="utf-8") as f:
+            json.dump(build_lexicon(tokens), f, separators=(",", ":"))
+    with open(os.path.join(path, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "format_version": FORMAT_VERSION,
+            "model": type(model).__name__,
+            "probability": kind,
+            "classes": classes,
+            "preprocessing": {
+                "version": PREPROCESSING_VERSION,
+                "fingerprint": preprocessing_fingerprint(),
+            },
+            "vectorizer": config,
+        }, f, indent=2)
+
+
+def _libsvm_coupling(pairwise: np.ndarray, num_classes: int) -> np.ndarray:
+    """libsvm's ``multiclass_probability``, run for all rows at once.
+
+    ``pairwise`` holds P(class i | i or j) for every pair i < j, in libsvm order.
+    """
+    n = pairwise.shape[0]
+    r = np.zeros((n, num_classes, num_classes))
+    column = 0
+    for i in range(num_classes):
+        for j in range(i + 1, num_classes):
+            r[:, i, j] = pairwise[:, column]
+            r[:, j, i] = 1 - pairwise[:, column]
+            column += 1
+
+    # Q[t][j] = -r[j][t] * r[t][j], Q[t][t] = sum_j r[j][t]^2
+    Q = -r.transpose(0, 2, 1) * r
+    diagonal = np.arange(num_classes)
+    Q[:, diagonal, diagonal] = (r ** 2).sum(axis=1)
+
+    p = np.full((n, num_classes), 1.0 / num_classes)
+    active = np.ones(n, dtype=bool)
+    eps = 0.005 / num_classes
+    for _ in range(max(_LIBSVM_MAX_ITER, num_classes)):
+        Qp = np.einsum("ntj,nj->nt", Q, p)
+        pQp = (p * Qp).sum(axis=1)
+        active &= np.abs(Qp - pQp[:, None]).max(axis=1) >= eps
+        if not active.any():
+            break
+        # Rows keep updating until they converge, one class at a time like libsvm
+        rows = active
+        for t in range(num_classes):
+            diff = (-Qp[rows, t] + pQp[rows]) / Q[rows, t, t]
+            p[rows, t] += diff
+            pQp[rows] = (pQp[rows] + diff * (diff * Q[rows, t, t] + 2 * Qp[rows, t])) / (1 + diff) ** 2
+            Qp[rows] = (Qp[rows] + diff[:, None] * Q[rows, t, :]) / (1 + diff)[:, None]
+            p[rows] /= (1 + diff)[:, None]
+    return p
+
+
+def _expit(x: np.ndarray) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        return 1.0 / (1.0 + np.exp(-x))
+
+
+class LinearPipeline:
+    """Preprocessing, TF-IDF and a linear classifier as one scorer loaded from arrays.
+
+    ``predict_proba`` takes raw messages and returns the same probabilities as
+    ``model.predict_proba(vectorizer.transform(preprocess_batch(texts)))``.
+
+    Messages are reduced to integer ids of the tokens that occur in the
+    vocabulary (``-1`` for any other token), with the id of every distinct raw
+    word cached. N-grams are then matched against the vocabulary for the whole
+    batch at once with NumPy, so no per-message string building remains.
+    """
+
+    def __init__(self, config: Dict, terms: List[str], arrays: Dict[str, Optional[np.ndarray]],
+                 preprocessor=None, cache_size: int = 100_000):
+        self.config = config
+        # NLTK-free preprocessor from the artifact's lexicon; None uses src.ml.preprocessing
+        self.preprocessor = preprocessor
+        self.kind = config["probability"]
+        self.classes_ = np.array(config["classes"])
+        self.idf = arrays["idf"]
+        self.weights = arrays["weights"]
+        self.intercept = arrays["intercept"]
+        self.calibration = arrays["calibration"]
+
+        vectorizer = config["vectorizer"]
+        self._lowercase = vectorizer["lowercase"]
+        self._token_re = re.compile(vectorizer["token_pattern"])
+        self._ngram_range = tuple(vectorizer["ngram_range"])
+        self._binary = vectorizer["binary"]
+        self._sublinear_tf = vectorizer["sublinear_tf"]
+        self._norm = vectorizer["norm"]
+        self._build_ngram_index(terms)
+        self._cache_size = cache_size
+        self._word_ids: Dict[str, Tuple[int, ...]] = {_END_WORD: (_END_OF_MESSAGE,)}
+
+    def _build_ngram_index(self, terms: List[str]):
+        # Number the tokens of the vocabulary; an n-gram is then the base-(number
+        # of tokens) integer of its token ids, looked up by binary search
+        self._token_ids: Dict[str, int] = {}
+        grams = [term.split(" ") for term in terms]
+        for tokens in grams:
+            for token in tokens:
+                self._token_ids.setdefault(token, len(self._token_ids))
+        self._base = max(len(self._token_ids), 1)
+        if self._base ** self._ngram_range[1] >= 2 ** 63:
+            raise ValueError("Vocabulary too large to index n-grams of length "
+                             f"{self._ngram_range[1]} in 64-bit keys")
+
+        by_length: Dict[int, Tuple[List[int], List[int]]] = {}
+        for column, tokens in enumerate(grams):
+            key = 0
+            for token in tokens:
+                key = key * self._base + self._token_ids[token]
+            keys, columns = by_length.setdefault(len(tokens), ([], []))
+            keys.append(key)
+            columns.append(column)
+        self._ngrams = {}
+        self._unigram_columns = np.full(self._base, -1, dtype=np.int64)
+        if 1 in by_length:
+            # Unigram keys are token ids, so a plain table replaces the search
+            keys, columns = by_length.pop(1)
+            self._unigram_columns[keys] = columns
+        for n, (keys, columns) in by_length.items():
+            keys, columns = np.array(keys, dtype=np.int64), np.array(columns, dtype=np.int64)
+            order = np.argsort(keys)
+            self._ngrams[n] = (keys[order], columns[order])
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "LinearPipeline":
+        """Load an artifact written by ``export_pipeline``; arrays are memory-mapped by default."""
+        with open(os.path.join(path, CONFIG_FILE), encoding="utf-8") as f:
+            config = json.load(f)
+        if config.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported pipeline format {config.get('format_version')!r} in {path}")
+        if config["preprocessing"]["version"] != PREPROCESSING_VERSION:
+            raise ValueError(f"Pipeline in {path} was built with preprocessing version "
+                             f"{config['preprocessing']['version']}, this code has {PREPROCESSING_VERSION}")
+
+        with open(os.path.join(path, VOCABULARY_FILE), encoding="utf-8") as f:
+            terms = f.read().split("\n")
+        arrays = {}
+        for name in ARRAY_FILES:
+            file_path = os.path.join(path, f"{name}.npy")
+            arrays[name] = np.load(file_path, mmap_mode="r" if mmap else None) if os.path.exists(file_path) else None
+        preprocessor = None
+        lexicon_path = os.path.join(path, LEXICON_FILE)
+        if os.path.exists(lexicon_path):
+            from src.ml.lexicon import LexiconPreprocessor
+
+            with open(lexicon_path, encoding="utf-8") as f:
+                preprocessor = LexiconPreprocessor(json.load(f))
+        return cls(config, terms, arrays, preprocessor)
+
+    def _analyze(self, text: str) -> List[int]:
+        # TfidfVectorizer's word tokenizer, mapped to vocabulary token ids
+        if self._lowercase:
+            text = text.lower()
+        token_ids = self._token_ids
+        return [token_ids.get(token, -1) for token in self._token_re.findall(text)]
+
+    def _encode_processed(self, processed_texts: Sequence[str]) -> np.ndarray:
+        encoded = [self._analyze(text) + [_END_OF_MESSAGE] for text in processed_texts]
+        return np.fromiter(chain.from_iterable(encoded), dtype=np.int64)
+
+    def _encode_raw(self, texts: Sequence[str]) -> np.ndarray:
+        """Token ids of raw messages, with preprocessing folded into a per-word cache."""
+        from src.ml.preprocessing import get_preprocessor
+
+        preprocessor = self.preprocessor or get_preprocessor()
+        # Clean the whole batch in one call (a newline inside a message is just
+        # whitespace), then mark message ends with a word cleaning can't produce
+        cleaned = preprocessor.clean("\n".join([text.replace("\n", " ") for text in texts]) + "\n")
+        words = cleaned.replace("\n", f" {_END_WORD} ").split()
+
+        word_ids = self._word_ids
+        encoded = list(map(word_ids.get, words))
+        if None in encoded:
+            if len(word_ids) > self._cache_size:
+                word_ids.clear()
+                word_ids[_END_WORD] = (_END_OF_MESSAGE,)
+            for i, word in enumerate(words):
+                if encoded[i] is None:
+                    encoded[i] = word_ids[word] = tuple(
+                        token_id
+                        for lemma in preprocessor.token_lemmas(word)
+                        for token_id in self._analyze(lemma)
+                    )
+        return np.fromiter(chain.from_iterable(encoded), dtype=np.int64)
+
+    def _term_columns(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Row and vocabulary column of every n-gram occurrence in the encoded batch."""
+        ends = ids == _END_OF_MESSAGE
+        rows = np.cumsum(ends) - ends
+        found_rows, found_columns = [], []
+        min_n, max_n = self._ngram_range
+        if min_n == 1:
+            starts = np.flatnonzero(ids >= 0)
+            columns = self._unigram_columns[ids[starts]]
+            matched = columns >= 0
+            found_rows.append(rows[starts[matched]])
+            found_columns.append(columns[matched])
+        for n in range(max(min_n, 2), max_n + 1):
+            if n not in self._ngrams:
+                continue
+            # N-grams over an unknown token or a message end can't be in the vocabulary
+            starts = np.arange(max(len(ids) - n + 1, 0))
+            keys = np.zeros(len(starts), dtype=np.int64)
+            known = np.ones(len(starts), dtype=bool)
+            for offset in range(n):
+                token_ids = ids[offset:offset + len(starts)]
+                known &= token_ids >= 0
+                keys = keys * self._base + token_ids
+            starts, keys = starts[known], keys[known]
+
+            vocabulary_keys, columns = self._ngrams[n]
+            positions = np.minimum(np.searchsorted(vocabulary_keys, keys), len(vocabulary_keys) - 1)
+            matched = vocabulary_keys[positions] == keys
+            found_rows.append(rows[starts[matched]])
+            found_columns.append(columns[positions[matched]])
+        if not found_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(found_rows), np.concatenate(found_columns)
+
+    def _tfidf(self, ids: np.ndarray, num_rows: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        rows, indices = self._term_columns(ids)
+
+        # Collapse repeated columns within each row into counts
+        keys, counts = np.unique(rows * len(self.idf) + indices, return_counts=True)
+        rows, indices = np.divmod(keys, len(self.idf))
+        data = counts.astype(np.float64)
+        if self._binary:
+            data[:] = 1.0
+        elif self._sublinear_tf:
+            data = np.log(data) + 1.0
+        data *= self.idf[indices]
+
+        if self._norm is not None:
+            squares = np.abs(data) if self._norm == "l1" else data ** 2
+            norms = np.bincount(rows, weights=squares, minlength=num_rows)
+            if self._norm == "l2":
+                norms = np.sqrt(norms)
+            data /= norms[rows]
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=num_rows))))
+        return data, indices, indptr
+
+    def transform(self, processed_texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """TF-IDF rows of already preprocessed texts as CSR ``(data, indices, indptr)``."""
+        return self._tfidf(self._encode_processed(processed_texts), len(processed_texts))
+
+    def _decision(self, data: np.ndarray, indices: np.ndarray, indptr: np.ndarray) -> np.ndarray:
+        # One sparse-dense product plus the intercept
+        num_rows, num_columns = len(indptr) - 1, self.weights.shape[1]
+        rows = np.repeat(np.arange(num_rows), np.diff(indptr))
+        contributions = data[:, None] * self.weights[indices]
+        keys = (rows[:, None] * num_columns + np.arange(num_columns)).ravel()
+        decision = np.bincount(keys, weights=contributions.ravel(), minlength=num_rows * num_columns)
+        return decision.reshape(num_rows, num_columns) + self.intercept
+
+    def decision_function(self, processed_texts: Sequence[str]) -> np.ndarray:
+        """Decision values of preprocessed texts."""
+        return self._decision(*self.transform(processed_texts))
+
+    def predict_proba_processed(self, processed_texts: Sequence[str]) -> np.ndarray:
+        """Class probabilities of already preprocessed texts."""
+        return self._probabilities(self.decision_function(processed_texts))
+
+    def _probabilities(self, decision: np.ndarray) -> np.ndarray:
+        num_classes = len(self.classes_)
+
+        if self.kind == SOFTMAX:
+            if num_classes == 2:
+                decision = np.hstack([-decision, decision])
+            decision = decision - decision.max(axis=1, keepdims=True)
+            exp = np.exp(decision)
+            return exp / exp.sum(axis=1, keepdims=True)
+
+        if self.kind == OVR_LOGISTIC:
+            proba = _expit(decision)
+            if num_classes == 2:
+                return np.hstack([1 - proba, proba])
+            return proba / proba.sum(axis=1, keepdims=True)
+
+        if self.kind == SIGMOID_OVR:
+            proba = _expit(-(self.calibration[:, 0] * decision + self.calibration[:, 1]))
+            if num_classes == 2:
+                return np.hstack([1 - proba, proba])
+            denominator = proba.sum(axis=1, keepdims=True)
+            proba = np.divide(proba, denominator, out=np.full_like(proba, 1.0 / num_classes),
+                              where=denominator != 0)
+            proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+            return proba
+
+        # LIBSVM_OVO: Platt-scaled pairwise probabilities, coupled into class probabilities
+        # (sklearn's libsvm couples binary problems too)
+        pairwise = np.clip(_expit(-(decision * self.calibration[:, 0] + self.calibration[:, 1])),
+                           _LIBSVM_MIN_PROB, 1 - _LIBSVM_MIN_PROB)
+        return _libsvm_coupling(pairwise, num_classes)
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Class probabilities of raw messages, columns in ``classes_`` order."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, len(self.classes_)))
+        with instrumentation.stage("linear.preprocess"):
+            ids = self._encode_raw(texts)
+        with instrumentation.stage("linear.vectorize"):
+            features = self._tfidf(ids, len(texts))
+        with instrumentation.stage("linear.classify"):
+            return self._probabilities(self._decision(*features))
+
+    def predict(self, texts: Sequence[str]) -> np.ndarray:
+        """Most probable class of each raw message."""
+        return self.classes_[np.argmax(self.predict_proba(texts), axis=1)]
+
+
+def main():
+    import joblib
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--model-dir", required=True,
+                        help="Directory holding model.pkl and vectorizer.pkl")
+    parser.add_argument("--output", default=None, help="Artifact directory (default: <model-dir>/pipeline)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(args.model_dir, "pipeline")
+    model = joblib.load(os.path.join(args.model_dir, "model.pkl"))
+    vectorizer = joblib.load(os.path.join(args.model_dir, "vectorizer.pkl"))
+    export_pipeline(model, vectorizer, output)
+    print(f"Exported pipeline to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Compact, TensorFlow-free replacement for the LSTM model's pickled Keras ``Tokenizer``.
+
+``export_vocabulary`` writes what ``texts_to_sequences`` and ``pad_sequences``
+actually use, as a small directory:
+
+    vocabulary.json   format version, tokenizer settings and padding settings
+    words.txt         the words that get an ID, one per line; line i has ID i + 1
+
+Words ranked at or beyond ``num_words`` are left out, since the tokenizer
+drops them anyway, along with the word counts and document counts that are
+only needed for fitting.
+
+``SequenceVocabulary.load`` reads the directory with the standard library and
+NumPy only. ``encode`` returns the same int32 array as
+``pad_sequences(tokenizer.texts_to_sequences(texts), maxlen=...)``. Each message
+is split with C string methods, every token is looked up in a dict, and the
+padded array is filled with one scatter for the whole batch.
+
+Convert the tokenizer of a trained model from the repository root:
+
+    python -m src.ml.lstm_vocabulary --model-dir models/saved_models/model3
+"""
+import argparse
+import json
+import os
+from itertools import repeat
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+FORMAT_VERSION = 1
+CONFIG_FILE = "vocabulary.json"
+WORDS_FILE = "words.txt"
+
+
+def export_vocabulary(tokenizer, path: str, maxlen: Optional[int] = None,
+                      padding: str = "pre", truncating: str = "pre"):
+    """Write a fitted Keras ``Tokenizer`` and its padding settings as a vocabulary directory."""
+    if tokenizer.char_level:
+        raise ValueError("Character-level tokenizers are not supported")
+    words = sorted(tokenizer.word_index, key=tokenizer.word_index.get)
+    if [tokenizer.word_index[word] for word in words] != list(range(1, len(words) + 1)):
+        raise ValueError("Tokenizer word IDs are not consecutive from 1")
+    if tokenizer.num_words:
+        words = words[:tokenizer.num_words - 1]
+    if any("\n" in word for word in words):
+        raise ValueError("Words containing newlines cannot be exported")
+
+    os.makedirs(path, exist_ok=True)
+    # newline="\n" writes the separators as they are, so words may hold any other line break
+    with open(os.path.join(path, WORDS_FILE), "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(words))
+    with open(os.path.join(path, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "format_version": FORMAT_VERSION,
+            "num_words": tokenizer.num_words,
+            "filters": tokenizer.filters,
+            "lower": tokenizer.lower,
+            "split": tokenizer.split,
+            "oov_token": tokenizer.oov_token,
+            "maxlen": maxlen,
+            "padding": padding,
+            "truncating": truncating,
+        }, f, indent=2)
+
+
+class SequenceVocabulary:
+    """Keras ``Tokenizer.texts_to_sequences`` plus ``pad_sequences``, without TensorFlow."""
+
+    def __init__(self, config: Dict, words: List[str]):
+        self.config = config
+        self.num_words = config["num_words"]
+        self.lower = config["lower"]
+        self.split = config["split"]
+        self.maxlen = config["maxlen"]
+        self.padding = config["padding"]
+        self.truncating = config["truncating"]
+        # Every filter character becomes a separator, as in text_to_word_sequence
+        self._filter_table = str.maketrans({char: self.split for char in config["filters"]})
+
+        self.word_index = {word: i for i, word in enumerate(words, start=1)}
+        oov_token = config["oov_token"]
+        # ID for words outside the vocabulary; 0 drops them like the tokenizer does without an OOV token
+        self._default_id = self.word_index[oov_token] if oov_token is not None else 0
+        # Consecutive separators leave empty strings, which are always dropped
+        self._lookup = dict(self.word_index)
+        self._lookup[""] = 0
+
+    @classmethod
+    def load(cls, path: str) -> "SequenceVocabulary":
+        """Load a directory written by ``export_vocabulary``."""
+        with open(os.path.join(path, CONFIG_FILE), encoding="utf-8") as f:
+            config = json.load(f)
+        if config.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported vocabulary format {config.get('format_version')!r} in {path}")
+        # Split only on the "\n" export_vocabulary writes, not on "\r" or other line breaks inside words
+        with open(os.path.join(path, WORDS_FILE), encoding="utf-8", newline="\n") as f:
+            text = f.read()
+        words = text.split("\n") if text else []
+        return cls(config, words)
+
+    def _flat_ids(self, texts: Sequence[str]):
+        # IDs of all kept tokens in order, and how many each text has
+        tokens: List[str] = []
+        counts = np.empty(len(texts), dtype=np.int64)
+        for i, text in enumerate(texts):
+            if self.lower:
+                text = text.lower()
+            words = text.translate(self._filter_table).split(self.split)
+            tokens.extend(words)
+            counts[i] = len(words)
+
+        ids = np.fromiter(map(self._lookup.get, tokens, repeat(self._default_id)), dtype=np.int32, count=len(tokens))
+        kept = ids != 0
+        rows = np.repeat(np.arange(len(texts)), counts)[kept]
+        return ids[kept], np.bincount(rows, minlength=len(texts))
+
+    def texts_to_sequences(self, texts: Sequence[str]) -> List[List[int]]:
+        ids, lengths = self._flat_ids(texts)
+        return [row.tolist() for row in np.split(ids, np.cumsum(lengths)[:-1])]
+
+    def encode(self, texts: Sequence[str], maxlen: Optional[int] = None) -> np.ndarray:
+        """Padded (len(texts), maxlen) int32 ID array; ``maxlen`` defaults to the exported one."""
+        ids, lengths = self._flat_ids(texts)
+        maxlen = maxlen or self.maxlen or (int(lengths.max()) if len(lengths) else 0)
+        padded = np.zeros((len(texts), maxlen), dtype=np.int32)
+        if not len(ids):
+            return padded
+
+        rows = np.repeat(np.arange(len(texts)), lengths)
+        position = np.arange(len(ids)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        length = lengths[rows]
+        # Index of each token among the tokens its row keeps after truncation
+        if self.truncating == "pre":
+            kept = position - np.maximum(length - maxlen, 0)
+        else:
+            kept = position
+        in_range = (kept >= 0) & (kept < maxlen)
+        if self.padding == "pre":
+            column = maxlen - np.minimum(length, maxlen) + kept
+        else:
+            column = kept
+        padded[rows[in_range], column[in_range]] = ids[in_range]
+        return padded
+
+
+def main():
+    import joblib
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--model-dir", required=True, help="Directory holding tokenizer.pkl")
+    parser.add_argument("--output", default=None, help="Vocabulary directory (default: <model-dir>/vocabulary)")
+    parser.add_argument("--maxlen", type=int, default=100, help="Padded sequence length the model expects")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(args.model_dir, "vocabulary")
+    tokenizer = joblib.load(os.path.join(args.model_dir, "tokenizer.pkl"))
+    export_vocabulary(tokenizer, output, maxlen=args.maxlen)
+    print(f"Exported vocabulary to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Cascaded inference: the TF-IDF models answer first, the transformers only when unsure.
+
+``MultiModelChatbot(cascade_models=..., cascade_thresholds=...)`` scores every
+message with the task's TF-IDF pipeline (``src.ml.linear_pipeline``, a few
+microseconds per message) and sends it on to the task's transformer only if
+the pipeline's top probability is below the task's threshold.
+
+This module picks those thresholds. For a task it scores a held-out split
+with both models and, for every candidate threshold, reports:
+
+    escalation_rate   share of messages the transformer would still see
+    accuracy          accuracy of the cascade's answers
+    ms_per_message    expected cost: pipeline time + escalation_rate x transformer time
+
+It chooses the lowest threshold whose accuracy is within ``--tolerance`` of the
+transformer alone and writes it to a thresholds file the chatbot reads; if
+none is, it writes ``ESCALATE_ALL_THRESHOLD``. The held-out split is the 20%
+the TF-IDF training scripts hold out (random_state 42), so the pipeline hasn't
+seen it when ``--data`` is its training CSV. Nothing checks what the
+transformer was trained on: pass data it hasn't seen either.
+
+Run from the repository root, once per task:
+
+    python -m src.ml.models.cascade --task sentiment --data processed_sentiment_dataset.csv \\
+        --pipeline models/saved_models/model1/pipeline --model models/sentiment_model
+"""
+from typing import Any, Dict, List, Optional, Sequence
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CASCADE_THRESHOLD = 0.9
+THRESHOLDS_FILE = "models/cascade_thresholds.json"
+
+# The TF-IDF pipelines the training scripts export, by the task they answer
+DEFAULT_CASCADE_MODELS = {
+    "sentiment": "models/saved_models/model1/pipeline",
+    "emotion": "models/saved_models/model2/pipeline",
+}
+
+# Above any probability, so every message is escalated (1.0 would keep the
+# ones scored exactly 1.0); finite, so the thresholds file stays plain JSON
+ESCALATE_ALL_THRESHOLD = 2.0
+
+# Finer steps near the top, where most confident messages are, then escalating everything
+CANDIDATE_THRESHOLDS = np.append(
+    np.round(np.concatenate([np.arange(0.0, 0.9, 0.05), np.arange(0.9, 1.0001, 0.01)]), 2),
+    ESCALATE_ALL_THRESHOLD,
+)
+
+
+class CascadeCounters:
+    """Texts scored and escalated per task; safe to update from several threads."""
+
+    def __init__(self):
+        self._counts: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, task: str, scored: int, escalated: int):
+        with self._lock:
+            counts = self._counts.setdefault(task, [0, 0])
+            counts[0] += scored
+            counts[1] += escalated
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            counts = {task: list(values) for task, values in self._counts.items()}
+        return {
+            task: {"scored": scored, "escalated": escalated,
+                   "escalation_rate": round(escalated / scored, 4) if scored else 0.0}
+            for task, (scored, escalated) in counts.items()
+        }
+
+
+def read_thresholds(path: str) -> Dict[str, float]:
+    """Task -> threshold from a file written by ``write_threshold``."""
+    with open(path) as f:
+        return {task: entry["threshold"] for task, entry in json.load(f)["tasks"].items()}
+
+
+def write_threshold(path: str, task: str, entry: Dict[str, Any]):
+    """Store ``task``'s threshold and curve in ``path``, keeping the other tasks."""
+    data = {"tasks": {}}
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+    data["tasks"][task] = entry
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def cascade_curve(y_true: Sequence, cheap_labels: Sequence, cheap_confidences: np.ndarray,
+                  transformer_labels: Sequence, cheap_ms: float, transformer_ms: float,
+                  thresholds: Sequence[float] = CANDIDATE_THRESHOLDS) -> pd.DataFrame:
+    """Escalation rate, accuracy and expected cost of the cascade at each threshold."""
+    y_true = np.asarray(y_true, dtype=str)
+    cheap_correct = np.asarray(cheap_labels, dtype=str) == y_true
+    transformer_correct = np.asarray(transformer_labels, dtype=str) == y_true
+    rows = []
+    for threshold in thresholds:
+        escalated = cheap_confidences < threshold
+        rate = escalated.mean()
+        rows.append({
+            "threshold": float(threshold),
+            "escalation_rate": round(float(rate), 4),
+            "accuracy": round(float(np.where(escalated, transformer_correct, cheap_correct).mean()), 4),
+            "ms_per_message": round(cheap_ms + rate * transformer_ms, 4),
+        })
+    return pd.DataFrame(rows)
+
+
+def choose_threshold(curve: pd.DataFrame, reference_accuracy: float, tolerance: float) -> Dict[str, Any]:
+    """Row of the lowest threshold (fewest escalations) within ``tolerance`` of ``reference_accuracy``."""
+    good = curve[curve["accuracy"] >= reference_accuracy - tolerance]
+    if good.empty:
+        # Nothing is good enough: always escalate
+        good = curve[curve["threshold"] == ESCALATE_ALL_THRESHOLD]
+    return good.sort_values("threshold").iloc[0].to_dict()
+
+
+def tune(task: str, data: pd.DataFrame, pipeline_path: str, model_path: str,
+         test_size: float = 0.2, tolerance: float = 0.01, batch_size: int = 32,
+         max_samples: Optional[int] = None) -> Dict[str, Any]:
+    """Score the held-out split with both models and pick ``task``'s threshold."""
+    from sklearn.model_selection import train_test_split
+
+    from src.ml.linear_pipeline import LinearPipeline
+    from src.ml.models.multi_model import MultiModelChatbot
+
+    _, held_out = train_test_split(data, test_size=test_size, random_state=42)
+    if max_samples and len(held_out) > max_samples:
+        held_out = held_out.sample(max_samples, random_state=0)
+    texts = held_out["text"].astype(str).tolist()
+
+    pipeline = LinearPipeline.load(pipeline_path)
+    start = time.perf_counter()
+    probabilities = pipeline.predict_proba(texts)
+    cheap_ms = (time.perf_counter() - start) * 1000 / len(texts)
+    cheap_labels = pipeline.classes_[probabilities.argmax(axis=1)]
+
+    chatbot = MultiModelChatbot({task: model_path}, cache_size=0)
+    start = time.perf_counter()
+    predictions = chatbot.predict_batch(texts, batch_size=batch_size, tasks=[task])
+    transformer_ms = (time.perf_counter() - start) * 1000 / len(texts)
+    transformer_labels = [prediction[task]["label"] for prediction in predictions]
+
+    curve = cascade_curve(held_out["label"], cheap_labels, probabilities.max(axis=1),
+                          transformer_labels, cheap_ms, transformer_ms)
+    y_true = held_out["label"].astype(str).values
+    transformer_accuracy = float(np.mean(np.asarray(transformer_labels, dtype=str) == y_true))
+    chosen = choose_threshold(curve, transformer_accuracy, tolerance)
+    return {
+        "threshold": chosen["threshold"],
+        "escalation_rate": chosen["escalation_rate"],
+        "accuracy": chosen["accuracy"],
+        "transformer_accuracy": round(transformer_accuracy, 4),
+        "pipeline_accuracy": round(float(np.mean(cheap_labels.astype(str) == y_true)), 4),
+        "ms_per_message": chosen["ms_per_message"],
+        "transformer_ms_per_message": round(transformer_ms, 4),
+        "held_out": len(texts),
+        "tolerance": tolerance,
+        "curve": curve.to_dict(orient="records"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--task", required=True)
+    parser.add_argument("--data", required=True, help="CSV with text and label columns the models were trained on")
+    parser.add_argument("--pipeline", default=None,
+                        help="TF-IDF pipeline artifact (default: the one the training scripts export for the task)")
+    parser.add_argument("--model", required=True, help="The task's transformer model directory")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="Accuracy the cascade may lose against the transformer alone")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--max-samples", type=int, default=None, help="Score at most this many held-out messages")
+    parser.add_argument("--output", default=THRESHOLDS_FILE)
+    args = parser.parse_args()
+
+    pipeline_path = args.pipeline or DEFAULT_CASCADE_MODELS[args.task]
+    result = tune(args.task, pd.read_csv(args.data), pipeline_path, args.model,
+                  test_size=args.test_size, tolerance=args.tolerance, max_samples=args.max_samples)
+
+    print(f"{'threshold':>9} {'escalated':>10} {'accuracy':>9} {'ms/message':>11}")
+    for row in result["curve"]:
+        marker = "  <-" if row["threshold"] == result["threshold"] else ""
+        print(f"{row['threshold']:9.2f} {row['escalation_rate']:10.1%} {row['accuracy']:9.4f} "
+              f"{row['ms_per_message']:11.3f}{marker}")
+    print(f"\n{args.task}: threshold {result['threshold']:.2f} escalates {result['escalation_rate']:.1%} of messages, "
+          f"accuracy {result['accuracy']:.4f} vs {result['transformer_accuracy']:.4f} for the transformer alone, "
+          f"{result['ms_per_message']:.3f} vs {result['transformer_ms_per_message']:.3f} ms/message")
+    write_threshold(args.output, args.task, result)
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
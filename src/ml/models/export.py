@@ -0,0 +1,247 @@
+"""Export trained task models to optimized CPU formats and check their accuracy drift.
+
+Formats (written to ``<model_dir>/<format>/`` next to the fp32 checkpoint):
+    onnx        ONNX graph with dynamic int8 weight quantization and ONNX Runtime
+                graph optimizations (needs ``onnx`` and ``onnxruntime``)
+    torch-int8  PyTorch dynamic int8 quantization of every Linear layer
+
+``MultiModelChatbot(runtime=...)`` loads these artifacts instead of the fp32 model.
+
+Run from the repository root:
+
+    python -m src.ml.models.export --format onnx --validation-csv processed_emotion_dataset.csv
+"""
+from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification
+from transformers.modeling_outputs import SequenceClassifierOutput
+import torch
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+import argparse
+import json
+import os
+import shutil
+
+EXPORT_FORMATS = ("onnx", "torch-int8")
+EXPORT_CONFIG = "export_config.json"
+ONNX_FILE = "model.onnx"
+QUANTIZED_WEIGHTS = "quantized_state_dict.pt"
+ONNX_OPSET = 17
+
+
+def export_path(model_path: str, export_format: str) -> str:
+    """Directory holding the ``export_format`` artifacts of the model at ``model_path``."""
+    return os.path.join(model_path, export_format)
+
+
+def _quantize_linear_layers(model):
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Gives the ONNX exporter a forward with positional tensors that returns plain logits."""
+
+    def __init__(self, model, input_names: List[str]):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        return self.model(**dict(zip(self.input_names, inputs))).logits
+
+
+def export_onnx(model_path: str, output_path: str):
+    """Export to ONNX, quantize weights to int8, then apply ORT graph optimizations."""
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_path).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    sample = tokenizer(["export sample text"], return_tensors="pt")
+    input_names = list(sample.keys())
+
+    os.makedirs(output_path, exist_ok=True)
+    raw_path = os.path.join(output_path, "model.fp32.onnx")
+    quantized_path = os.path.join(output_path, "model.int8.onnx")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsOnly(model, input_names),
+            tuple(sample[name] for name in input_names),
+            raw_path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            dynamo=False
+        )
+
+    # Quantize the plain graph first: the quantizer's shape inference does not
+    # understand the fused operators the optimizer introduces
+    quantize_dynamic(raw_path, quantized_path, weight_type=QuantType.QInt8)
+
+    # Let ONNX Runtime fuse the quantized graph once and save the result
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    options.optimized_model_filepath = os.path.join(output_path, ONNX_FILE)
+    ort.InferenceSession(quantized_path, options, providers=["CPUExecutionProvider"])
+    os.remove(raw_path)
+    os.remove(quantized_path)
+
+    model.config.save_pretrained(output_path)
+    tokenizer.save_pretrained(output_path)
+    with open(os.path.join(output_path, EXPORT_CONFIG), "w") as f:
+        json.dump({"format": "onnx", "input_names": input_names}, f, indent=2)
+
+
+def export_torch_int8(model_path: str, output_path: str):
+    """Quantize Linear layers to int8 with PyTorch dynamic quantization."""
+    model = AutoModelForSequenceClassification.from_pretrained(model_path).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+    os.makedirs(output_path, exist_ok=True)
+    torch.save(_quantize_linear_layers(model).state_dict(), os.path.join(output_path, QUANTIZED_WEIGHTS))
+    model.config.save_pretrained(output_path)
+    tokenizer.save_pretrained(output_path)
+    with open(os.path.join(output_path, EXPORT_CONFIG), "w") as f:
+        json.dump({"format": "torch-int8"}, f, indent=2)
+
+
+class OnnxSequenceClassifier:
+    """ONNX Runtime session that can stand in for an ``AutoModelForSequenceClassification``.
+
+    Supports what ``MultiModelChatbot.predict_batch`` uses: calling it with
+    tokenizer tensors, ``config.id2label``, ``to`` and ``eval``.
+    """
+
+    def __init__(self, path: str, num_threads: int = 0):
+        import onnxruntime as ort
+
+        with open(os.path.join(path, EXPORT_CONFIG)) as f:
+            self.input_names = json.load(f)["input_names"]
+        self.config = AutoConfig.from_pretrained(path)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(os.path.join(path, ONNX_FILE), options,
+                                            providers=["CPUExecutionProvider"])
+
+    def __call__(self, **inputs) -> SequenceClassifierOutput:
+        feeds = {name: inputs[name].cpu().numpy().astype(np.int64) for name in self.input_names}
+        logits = self.session.run(["logits"], feeds)[0]
+        return SequenceClassifierOutput(logits=torch.from_numpy(logits))
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+
+def load_exported_model(path: str):
+    """Load an artifact directory written by ``export_onnx`` or ``export_torch_int8``."""
+    with open(os.path.join(path, EXPORT_CONFIG)) as f:
+        export_format = json.load(f)["format"]
+
+    if export_format == "onnx":
+        return OnnxSequenceClassifier(path)
+
+    # Rebuild the fp32 architecture, quantize it the same way, then load the int8 weights
+    config = AutoConfig.from_pretrained(path)
+    model = _quantize_linear_layers(AutoModelForSequenceClassification.from_config(config).eval())
+    model.load_state_dict(torch.load(os.path.join(path, QUANTIZED_WEIGHTS)))
+    return model.eval()
+
+
+def _probabilities(model, tokenizer, texts: List[str], batch_size: int = 64) -> np.ndarray:
+    chunks = []
+    for start in range(0, len(texts), batch_size):
+        inputs = tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                           return_tensors="pt")
+        with torch.no_grad():
+            chunks.append(torch.softmax(model(**inputs).logits, dim=-1).numpy())
+    return np.concatenate(chunks)
+
+
+def check_drift(model_path: str, texts: List[str], labels=None) -> Dict[str, float]:
+    """Compare the fp32 model with every exported artifact on ``texts``.
+
+    Returns label agreement and probability differences per format, plus
+    accuracy when ``labels`` matching the model's label names are given.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    reference_model = AutoModelForSequenceClassification.from_pretrained(model_path).eval()
+    reference = _probabilities(reference_model, tokenizer, texts)
+    id2label = reference_model.config.id2label
+    report = {}
+
+    def accuracy(probabilities):
+        predicted = [id2label[i] for i in probabilities.argmax(axis=1)]
+        return float(np.mean([p == label for p, label in zip(predicted, labels)]))
+
+    if labels is not None and set(labels) <= set(id2label.values()):
+        report["fp32_accuracy"] = accuracy(reference)
+    for export_format in EXPORT_FORMATS:
+        path = export_path(model_path, export_format)
+        if not os.path.exists(os.path.join(path, EXPORT_CONFIG)):
+            continue
+        exported = _probabilities(load_exported_model(path), tokenizer, texts)
+        difference = np.abs(exported - reference)
+        report[f"{export_format}_label_agreement"] = float(np.mean(exported.argmax(1) == reference.argmax(1)))
+        report[f"{export_format}_max_prob_diff"] = float(difference.max())
+        report[f"{export_format}_mean_prob_diff"] = float(difference.mean())
+        if "fp32_accuracy" in report:
+            report[f"{export_format}_accuracy"] = accuracy(exported)
+    return report
+
+
+def main():
+    from sklearn.model_selection import train_test_split
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--tasks", nargs="+", default=["emotion", "sentiment", "intent"])
+    parser.add_argument("--format", choices=EXPORT_FORMATS, nargs="+", default=list(EXPORT_FORMATS))
+    parser.add_argument("--validation-csv", default=None,
+                        help="CSV with a text column (and optionally label) for the drift check")
+    parser.add_argument("--max-label-disagreement", type=float, default=0.01,
+                        help="Fail if an export disagrees with fp32 on more than this share of texts")
+    args = parser.parse_args()
+
+    holdout = None
+    if args.validation_csv:
+        df = pd.read_csv(args.validation_csv)
+        # Same 80/20 split and seed as the training scripts
+        _, holdout = train_test_split(df, test_size=0.2, random_state=42)
+
+    failed = False
+    for task in args.tasks:
+        model_path = os.path.join(args.model_dir, f"{task}_model")
+        if not os.path.exists(model_path):
+            print(f"Model not found for {task}, skipping")
+            continue
+
+        for export_format in args.format:
+            output_path = export_path(model_path, export_format)
+            shutil.rmtree(output_path, ignore_errors=True)
+            if export_format == "onnx":
+                export_onnx(model_path, output_path)
+            else:
+                export_torch_int8(model_path, output_path)
+            print(f"Exported {task} model to {output_path}")
+
+        if holdout is not None:
+            labels = holdout["label"].tolist() if "label" in holdout else None
+            report = check_drift(model_path, holdout["text"].tolist(), labels)
+            print(f"{task} drift check: {json.dumps(report, indent=2)}")
+            for export_format in args.format:
+                if 1 - report[f"{export_format}_label_agreement"] > args.max_label_disagreement:
+                    print(f"{task} {export_format} export drifts too far from fp32")
+                    failed = True
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
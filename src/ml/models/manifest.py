@@ -0,0 +1,40 @@
+"""Manifest describing a set of trained task models.
+
+``src.ml.models.train_tasks`` writes ``manifest.json`` next to the task
+models it trains; ``MultiModelChatbot(model_paths="<dir>/manifest.json")``
+loads every task listed in it. Model paths are stored relative to the
+manifest, so the whole directory can be moved.
+"""
+from typing import Any, Dict
+import json
+import os
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """Load a manifest file, or the manifest in directory ``path``."""
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST_FILE)
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version {manifest.get('version')!r} in {path}")
+    return manifest
+
+
+def manifest_model_paths(path: str) -> Dict[str, str]:
+    """Task name -> model directory for every task in the manifest at ``path``."""
+    manifest = read_manifest(path)
+    base = path if os.path.isdir(path) else os.path.dirname(path)
+    return {task: os.path.join(base, entry["path"]) for task, entry in manifest["tasks"].items()}
+
+
+def write_manifest(path: str, manifest: Dict[str, Any]):
+    """Write ``manifest`` to ``path`` atomically, so readers never see a partial file."""
+    manifest = {"version": MANIFEST_VERSION, **manifest}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
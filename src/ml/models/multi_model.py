@@ -1,73 +1,438 @@
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline, Trainer, TrainingArguments
+from transformers import AutoTokenizer, AutoModel, AutoModelForSequenceClassification, pipeline, Trainer, TrainingArguments
+from transformers import DataCollatorWithPadding
 import torch
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, Tuple, Optional
+from transformers.trainer_utils import get_last_checkpoint
+from typing import Dict, Any, List, Tuple, Optional, Union
+from collections import OrderedDict
+import hashlib
+import json
 import os
+import shutil
+import threading
+import time
 from datasets import Dataset, DatasetDict  # type: ignore
+from src.ml import instrumentation
+from src.ml.linear_pipeline import LinearPipeline
+from src.ml.models.cascade import DEFAULT_CASCADE_THRESHOLD, CascadeCounters, read_thresholds
+from src.ml.models.multi_task import MultiTaskModel
+from src.ml.models.manifest import manifest_model_paths
+from src.ml.models.export import EXPORT_CONFIG, EXPORT_FORMATS, export_path, load_exported_model
+from src.ml.result_cache import DEFAULT_MAX_SIZE, DEFAULT_TTL_SECONDS, ResultCache, normalize_text
+
+# Name under which a shared-encoder model serving several tasks is stored
+MULTITASK = "multitask"
+
+# Dynamically padded training batches are padded to a multiple of this
+PAD_TO_MULTIPLE_OF = 8
+# Percentage of training messages that fit the automatic max sequence length untruncated
+DEFAULT_LENGTH_PERCENTILE = 99.0
+
+def _process_memory_mb() -> Dict[str, float]:
+    """Resident memory of this process, split into anonymous and file-backed pages on Linux."""
+    fields = {"VmRSS": "rss_mb", "RssAnon": "rss_anon_mb", "RssFile": "rss_file_mb"}
+    memory = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in fields:
+                    memory[fields[name]] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        import resource
+        import sys
+        
+        # No /proc: peak rather than current RSS, which macOS reports in bytes
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memory["max_rss_mb"] = round(max_rss / (2 ** 20 if sys.platform == "darwin" else 1024), 1)
+    return memory
+
+def _model_nbytes(model, model_path: str) -> int:
+    """Memory a loaded model takes: its tensors, or the weight files for non-torch runtimes."""
+    if isinstance(model, torch.nn.Module):
+        # state_dict also has the packed int8 weights of dynamically quantized
+        # Linear layers, which are neither parameters nor buffers; buffers()
+        # adds the non-persistent buffers state_dict leaves out
+        tensors = {}
+        for value in list(model.state_dict().values()) + list(model.buffers()):
+            for tensor in value if isinstance(value, tuple) else (value,):
+                if isinstance(tensor, torch.Tensor):
+                    # Tied weights count once
+                    tensors[tensor.data_ptr()] = tensor.numel() * tensor.element_size()
+        if tensors:
+            return sum(tensors.values())
+    return sum(entry.stat().st_size for entry in os.scandir(model_path) if entry.is_file())
+
+def training_max_length(lengths: List[int], percentile: float = DEFAULT_LENGTH_PERCENTILE,
+                        limit: Optional[int] = None) -> int:
+    """Token length that ``percentile`` percent of ``lengths`` fit in, rounded up to a multiple of 8."""
+    length = int(np.ceil(np.percentile(lengths, percentile)))
+    length = -(-length // PAD_TO_MULTIPLE_OF) * PAD_TO_MULTIPLE_OF
+    return min(length, limit) if limit else length
 
 class MultiModelChatbot:
-    def __init__(self, model_paths: Optional[Dict[str, str]] = None):
+    def __init__(self, model_paths: Optional[Union[Dict[str, str], str]] = None, runtime: str = "torch",
+                 cache_size: int = DEFAULT_MAX_SIZE, cache_ttl: Optional[float] = DEFAULT_TTL_SECONDS,
+                 lazy: bool = False, memory_budget_mb: Optional[float] = None, mmap: bool = True,
+                 cascade_models: Optional[Dict[str, str]] = None,
+                 cascade_thresholds: Optional[Union[Dict[str, float], str]] = None):
         """Initialize the multi-model chatbot.
         
         Args:
-            model_paths: Dictionary of model paths for each task
+            model_paths: Dictionary of model paths for each task. A ``"multitask"``
+                entry pointing at a shared-encoder checkpoint takes precedence;
+                per-task models are then only loaded for tasks it doesn't cover.
+                May also be the path of a manifest written by
+                ``src.ml.models.train_tasks`` (or its directory).
+            runtime: ``"torch"`` for the fp32 checkpoints, or an export format
+                (``"onnx"``, ``"torch-int8"``) written by ``src.ml.models.export``.
+                Tasks without that export fall back to the fp32 model.
+            cache_size: Most prediction results kept for repeated messages (0 disables)
+            cache_ttl: Seconds a cached result stays valid (None keeps it until evicted)
+            lazy: Only find the models here; each one is loaded the first time a
+                prediction needs it
+            memory_budget_mb: Most memory the loaded models may take. Loading a
+                model beyond it unloads the least recently used ones, which are
+                loaded again when next needed. None means no limit.
+            mmap: Map safetensors weights from disk instead of copying them, so
+                pages are only read when used and are shared with other processes
+            cascade_models: Task -> TF-IDF pipeline artifact (``src.ml.linear_pipeline``)
+                that answers first; the task's transformer only runs on texts it
+                scores below the task's threshold. See ``src.ml.models.cascade``.
+            cascade_thresholds: Task -> confidence threshold, or the path of a
+                thresholds file written by ``src.ml.models.cascade``. Tasks
+                without one use ``DEFAULT_CASCADE_THRESHOLD``.
         """
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        start = time.perf_counter()
+        if runtime != "torch" and runtime not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown runtime {runtime!r}")
+        self.runtime = runtime
+        # Exported runtimes are CPU-only
+        self.device = "cuda" if torch.cuda.is_available() and runtime == "torch" else "cpu"
         self.models = {}
         self.tokenizers = {}
+        # Tasks whose tokenizers share a key produce identical encodings
+        self.tokenizer_keys = {}
+        # Results for repeated messages; the version changes whenever a model is replaced
+        self.result_cache = ResultCache(cache_size, cache_ttl)
+        self.model_version = 0
+        
+        # Models that can be (re)loaded on demand: name -> path, and the tasks each answers
+        self.model_paths: Dict[str, str] = {}
+        self.model_tasks: Dict[str, List[str]] = {}
+        self.memory_budget_mb = memory_budget_mb
+        self.mmap = mmap
+        # Loaded models in least to most recently used order, with their size in bytes
+        self._model_bytes: "OrderedDict[str, int]" = OrderedDict()
+        self.load_seconds: Dict[str, float] = {}
+        self.loads = 0
+        self.evictions = 0
+        # Guards the model dicts; held briefly, never while a model loads
+        self._load_lock = threading.RLock()
+        # One lock per model name, held while that model loads
+        self._loading_locks: Dict[str, threading.Lock] = {}
+        
+        self.cascade_models = {}
+        for task, path in (cascade_models or {}).items():
+            if os.path.isdir(path):
+                self.cascade_models[task] = LinearPipeline.load(path)
+            else:
+                print(f"Cascade model not found for {task}, using the transformer only")
+        if isinstance(cascade_thresholds, str):
+            cascade_thresholds = read_thresholds(cascade_thresholds)
+        self.cascade_thresholds = {task: (cascade_thresholds or {}).get(task, DEFAULT_CASCADE_THRESHOLD)
+                                   for task in self.cascade_models}
+        self.cascade_counters = CascadeCounters()
         
         # Default model paths if none provided
         if model_paths is None:
             model_paths = {
                 "emotion": "models/emotion_model",
                 "sentiment": "models/sentiment_model",
-                "intent": "models/intent_model"
+                "intent": "models/intent_model",
+                MULTITASK: "models/multitask_model"
             }
+        elif isinstance(model_paths, str):
+            model_paths = manifest_model_paths(model_paths)
         
-        # Load models for each task
+        # Prefer the shared-encoder model when one has been trained
+        multitask_path = model_paths.get(MULTITASK)
+        if multitask_path and MultiTaskModel.is_checkpoint(multitask_path):
+            self._add_model(MULTITASK, multitask_path, lazy)
+        
+        # Load models for each remaining task (the original per-task layout)
         for task, path in model_paths.items():
+            if task == MULTITASK or task in self._multitask_tasks():
+                continue
             if os.path.exists(path):
-                self.load_model(task, path)
+                self._add_model(task, path, lazy)
             else:
                 print(f"Model not found for {task}, will need to train first")
+        self.startup_seconds = time.perf_counter() - start
+    
+    def _add_model(self, task: str, model_path: str, lazy: bool):
+        if lazy:
+            self._register(task, model_path)
+        else:
+            self.load_model(task, model_path)
+    
+    def _register(self, task: str, model_path: str):
+        """Remember where ``task``'s model is, so it can be loaded when needed."""
+        self.model_paths[task] = model_path
+        if MultiTaskModel.is_checkpoint(model_path):
+            self.model_tasks[task] = MultiTaskModel.checkpoint_tasks(model_path)
+        else:
+            self.model_tasks[task] = [task]
     
     def load_model(self, task: str, model_path: str):
         """Load a pre-trained model for a specific task."""
+        self._register(task, model_path)
+        if self._load(task):
+            self._models_changed()
+    
+    def _load(self, task: str) -> bool:
+        """Load the registered model of ``task``, unloading others to stay within the memory budget."""
+        model_path = self.model_paths[task]
+        start = time.perf_counter()
         try:
-            self.tokenizers[task] = AutoTokenizer.from_pretrained(model_path)
-            self.models[task] = AutoModelForSequenceClassification.from_pretrained(model_path)
-            self.models[task].to(self.device)
-            print(f"Loaded {task} model successfully")
+            # Use the exported artifact for the selected runtime when there is one
+            if self.runtime != "torch":
+                exported_path = export_path(model_path, self.runtime)
+                if os.path.exists(os.path.join(exported_path, EXPORT_CONFIG)):
+                    model_path = exported_path
+                elif not os.path.exists(os.path.join(model_path, EXPORT_CONFIG)):
+                    print(f"No {self.runtime} export for {task}, using the fp32 model")
+            
+            # low_cpu_mem_usage keeps the tensors safetensors maps instead of copying them into fresh ones
+            mmap = self.mmap and os.path.exists(os.path.join(model_path, "model.safetensors"))
+            tokenizer = AutoTokenizer.from_pretrained(model_path)
+            if MultiTaskModel.is_checkpoint(model_path):
+                model = MultiTaskModel.from_pretrained(model_path, map_location=self.device, mmap=self.mmap)
+            elif os.path.exists(os.path.join(model_path, EXPORT_CONFIG)):
+                model = load_exported_model(model_path)
+            else:
+                model = AutoModelForSequenceClassification.from_pretrained(model_path, low_cpu_mem_usage=mmap)
+            model.to(self.device)
+            model.eval()
         except Exception as e:
             print(f"Error loading {task} model: {e}")
+            # Don't retry on every prediction
+            with self._load_lock:
+                self.model_paths.pop(task, None)
+                self.model_tasks.pop(task, None)
+            return False
+        
+        self._set_model(task, model, tokenizer, model_path)
+        self.load_seconds[task] = time.perf_counter() - start
+        instrumentation.observe("chatbot.load_model", self.load_seconds[task])
+        self.loads += 1
+        print(f"Loaded {task} model successfully")
+        return True
+    
+    def _set_model(self, task: str, model, tokenizer, model_path: str):
+        with self._load_lock:
+            self.models[task] = model
+            self.tokenizers[task] = tokenizer
+            self.tokenizer_keys[task] = self._tokenizer_key(task, tokenizer)
+            self._model_bytes[task] = _model_nbytes(model, model_path)
+            self._model_bytes.move_to_end(task)
+            self._enforce_memory_budget(keep=task)
+    
+    def _enforce_memory_budget(self, keep: str):
+        if self.memory_budget_mb is None:
+            return
+        budget = self.memory_budget_mb * 2 ** 20
+        # Least recently used first; models without a path to reload them from stay
+        for task in list(self._model_bytes):
+            if sum(self._model_bytes.values()) <= budget:
+                break
+            if task != keep and task in self.model_paths:
+                self._unload(task)
+    
+    def _unload(self, task: str):
+        self.models.pop(task, None)
+        self.tokenizers.pop(task, None)
+        self.tokenizer_keys.pop(task, None)
+        self._model_bytes.pop(task, None)
+        self.evictions += 1
+        print(f"Unloaded {task} model")
+    
+    def _forget(self, task: str):
+        """Drop ``task``'s model entirely; it won't be loaded again."""
+        with self._load_lock:
+            for mapping in (self.models, self.tokenizers, self.tokenizer_keys, self._model_bytes,
+                            self.model_paths, self.model_tasks):
+                mapping.pop(task, None)
+    
+    def _acquire(self, name: str):
+        """Model, tokenizer and tokenizer key of ``name``, loading the model first if needed.
+        
+        Returns None if the model can't be loaded. The references stay valid
+        even if another thread unloads the model meanwhile. Loading holds only
+        ``name``'s own lock, so stats, health checks and other models' threads
+        don't wait for it.
+        """
+        with self._load_lock:
+            loaded = self._loaded(name)
+            if loaded is not None or name not in self.model_paths:
+                return loaded
+            loading_lock = self._loading_locks.setdefault(name, threading.Lock())
+        
+        with loading_lock:
+            # Another thread may have loaded it while this one waited
+            with self._load_lock:
+                loaded = self._loaded(name)
+                if loaded is not None or name not in self.model_paths:
+                    return loaded
+            self._load(name)
+        with self._load_lock:
+            return self._loaded(name)
+    
+    def _loaded(self, name: str):
+        # Callers hold _load_lock
+        if name not in self.models or name not in self.tokenizers:
+            return None
+        if name in self._model_bytes:
+            self._model_bytes.move_to_end(name)
+        return self.models[name], self.tokenizers[name], self.tokenizer_keys.get(name, name)
+    
+    def _models_changed(self):
+        """Invalidate cached predictions after a task model was loaded or retrained."""
+        self.model_version += 1
+        self.result_cache.clear()
+    
+    @staticmethod
+    def _tokenizer_key(task: str, tokenizer) -> str:
+        """Identify a tokenizer by its full serialized config so equal ones can be shared."""
+        if getattr(tokenizer, "is_fast", False):
+            serialized = tokenizer.backend_tokenizer.to_str()
+            return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+        return task
+    
+    def _multitask_tasks(self) -> List[str]:
+        """Tasks served by the shared-encoder model, if one is loaded or registered."""
+        model = self.models.get(MULTITASK)
+        if model is not None:
+            return model.tasks
+        return self.model_tasks.get(MULTITASK, [])
+    
+    def _answers(self, name: str) -> List[str]:
+        """Tasks the model stored under ``name`` predicts."""
+        model = self.models.get(name)
+        if isinstance(model, MultiTaskModel):
+            return model.tasks
+        return self.model_tasks.get(name, [name])
+    
+    def available_tasks(self) -> List[str]:
+        """Every task a prediction can return, whether or not its model is loaded right now."""
+        with self._load_lock:
+            names = dict.fromkeys(list(self.models) + list(self.model_paths))
+            return [task for name in names for task in self._answers(name)]
+    
+    def memory_stats(self) -> Dict[str, Any]:
+        """Startup time, model load times, memory per loaded model and process memory."""
+        with self._load_lock:
+            model_mb = {task: round(size / 2 ** 20, 1) for task, size in self._model_bytes.items()}
+        return {
+            "startup_seconds": round(self.startup_seconds, 3),
+            "load_seconds": {task: round(seconds, 3) for task, seconds in self.load_seconds.items()},
+            "loaded": list(model_mb),
+            "model_mb": model_mb,
+            "loaded_mb": round(sum(model_mb.values()), 1),
+            "memory_budget_mb": self.memory_budget_mb,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            **_process_memory_mb(),
+        }
     
     def train_model(self, task: str, train_data: pd.DataFrame, 
                    model_name: str = "bert-base-uncased",
-                   num_epochs: int = 3, batch_size: int = 16):
-        """Train a model for a specific task."""
-        # Convert DataFrame to HuggingFace Dataset
-        dataset = Dataset.from_pandas(train_data)
+                   num_epochs: int = 3, batch_size: int = 16,
+                   max_length: Optional[int] = None, dynamic_padding: bool = True,
+                   length_percentile: float = DEFAULT_LENGTH_PERCENTILE,
+                   gradient_accumulation_steps: int = 1,
+                   output_dir: Optional[str] = None,
+                   eval_data: Optional[pd.DataFrame] = None,
+                   resume: bool = False,
+                   tokenized_cache_dir: Optional[str] = None):
+        """Train a model for a specific task.
+        
+        With ``task="multitask"`` a single shared-encoder model is trained for
+        every task in ``train_data``, which then needs a ``task`` column next to
+        ``text`` and ``label``.
+        
+        Args:
+            task: Task name, or ``"multitask"``
+            train_data: Training rows with ``text`` and ``label`` columns
+            model_name: Base model to fine-tune
+            num_epochs: Passes over ``train_data``
+            batch_size: Examples per device per step
+            max_length: Longest tokenized sequence; longer messages are truncated.
+                With dynamic padding it defaults to the ``length_percentile``
+                percentile of the corpus lengths, otherwise to the model maximum.
+            dynamic_padding: Pad each batch only to its longest sequence (rounded
+                up to a multiple of 8) and draw batches of similar length. When
+                False every sequence is padded to ``max_length``.
+            length_percentile: Percentile of message lengths used for ``max_length``
+            gradient_accumulation_steps: Batches whose gradients are summed per
+                optimizer step, for a larger effective batch in the same memory
+            output_dir: Where checkpoints and the final model go
+                (default: ``models/<task>_model``)
+            eval_data: Optional held-out rows, evaluated after every epoch
+            resume: Continue from the last checkpoint in ``output_dir``, if any
+            tokenized_cache_dir: Directory where tokenized datasets are kept,
+                keyed by their content and the tokenizer, so training the same
+                data again skips tokenization
+        
+        The sorted label values become the class ids; the model config maps
+        them back (as strings), so predictions return label names.
+        
+        Returns:
+            The ``TrainOutput`` of the run, including its throughput metrics
+        """
+        if task == MULTITASK:
+            return self._train_multitask_model(
+                train_data, model_name, num_epochs, batch_size, max_length, dynamic_padding,
+                length_percentile, gradient_accumulation_steps, output_dir, resume, tokenized_cache_dir
+            )
+        output_dir = output_dir or f"models/{task}_model"
+        
+        # Class ids in sorted label order
+        labels = sorted(train_data["label"].unique().tolist())
+        label_ids = {label: i for i, label in enumerate(labels)}
+        train_data = pd.DataFrame({"text": train_data["text"], "label": train_data["label"].map(label_ids)})
         
         # Tokenize the data
         tokenizer = AutoTokenizer.from_pretrained(model_name)
-        def tokenize_function(examples):
-            return tokenizer(examples["text"], padding="max_length", truncation=True)
-        
-        tokenized_dataset: Dataset = dataset.map(tokenize_function, batched=True)
+        tokenized_dataset, data_collator, max_length = self._tokenize_for_training(
+            tokenizer, train_data, dynamic_padding, max_length, length_percentile, tokenized_cache_dir
+        )
+        tokenized_eval = None
+        if eval_data is not None:
+            eval_data = pd.DataFrame({"text": eval_data["text"], "label": eval_data["label"].map(label_ids)})
+            tokenized_eval, _, _ = self._tokenize_for_training(
+                tokenizer, eval_data, dynamic_padding, max_length, length_percentile, tokenized_cache_dir
+            )
         
         # Prepare model
         model = AutoModelForSequenceClassification.from_pretrained(
             model_name, 
-            num_labels=len(train_data["label"].unique())
+            num_labels=len(labels),
+            id2label={i: str(label) for i, label in enumerate(labels)},
+            label2id={str(label): i for i, label in enumerate(labels)}
         )
         
         # Training arguments
         training_args = TrainingArguments(
-            output_dir=f"models/{task}_model",
+            output_dir=output_dir,
             num_train_epochs=num_epochs,
             per_device_train_batch_size=batch_size,
+            gradient_accumulation_steps=gradient_accumulation_steps,
+            group_by_length=dynamic_padding,
+            length_column_name="length",
             save_strategy="epoch",
-            evaluation_strategy="epoch"
+            evaluation_strategy="epoch" if tokenized_eval is not None else "no"
         )
         
         # Initialize trainer
@@ -75,38 +440,312 @@ class MultiModelChatbot:
             model=model,
             args=training_args,
             train_dataset=tokenized_dataset,  # type: ignore
+            eval_dataset=tokenized_eval,  # type: ignore
+            data_collator=data_collator,
             tokenizer=tokenizer
         )
         
         # Train the model
-        trainer.train()
+        result = trainer.train(resume_from_checkpoint=self._last_checkpoint(output_dir) if resume else None)
         
         # Save the model
-        trainer.save_model(f"models/{task}_model")
-        self.models[task] = model
-        self.tokenizers[task] = tokenizer
-    
-    def predict(self, text: str) -> Dict[str, Any]:
-        """Make predictions using all three models."""
-        results = {}
-        
-        for task, model in self.models.items():
-            if task in self.tokenizers:
-                inputs = self.tokenizers[task](text, return_tensors="pt").to(self.device)
-                with torch.no_grad():
-                    outputs = model(**inputs)
-                    predictions = torch.softmax(outputs.logits, dim=-1)
-                    results[task] = {
-                        "label": model.config.id2label[torch.argmax(predictions).item()],
-                        "confidence": torch.max(predictions).item()
+        trainer.save_model(output_dir)
+        model.eval()
+        self._register(task, output_dir)
+        self._set_model(task, model, tokenizer, output_dir)
+        self._models_changed()
+        return result
+    
+    @staticmethod
+    def _last_checkpoint(output_dir: str) -> Optional[str]:
+        return get_last_checkpoint(output_dir) if os.path.isdir(output_dir) else None
+    
+    @staticmethod
+    def _tokenize_for_training(tokenizer, frame: pd.DataFrame, dynamic_padding: bool,
+                               max_length: Optional[int], length_percentile: float,
+                               cache_dir: Optional[str] = None):
+        """Tokenize the ``text`` column of ``frame`` for ``Trainer``.
+        
+        Returns the tokenized dataset, the data collator to use and the max length applied.
+        
+        With dynamic padding nothing is padded here. Each row gets a ``length``
+        column for the length-grouped sampler, and the collator pads every
+        batch. Otherwise rows are padded to ``max_length`` up front and the
+        Trainer's default collator is used.
+        """
+        data_collator = None
+        if dynamic_padding:
+            data_collator = DataCollatorWithPadding(tokenizer, pad_to_multiple_of=PAD_TO_MULTIPLE_OF)
+        
+        cache_path = None
+        if cache_dir:
+            # Same rows, tokenizer and settings give the same tokenized dataset
+            digest = hashlib.sha256(json.dumps([
+                MultiModelChatbot._tokenizer_key(tokenizer.name_or_path, tokenizer),
+                dynamic_padding, max_length, length_percentile, list(frame.columns)
+            ]).encode("utf-8"))
+            digest.update(pd.util.hash_pandas_object(frame, index=False).values.tobytes())
+            cache_path = os.path.join(cache_dir, digest.hexdigest())
+            if os.path.exists(os.path.join(cache_path, "meta.json")):
+                with open(os.path.join(cache_path, "meta.json")) as f:
+                    meta = json.load(f)
+                return Dataset.load_from_disk(os.path.join(cache_path, "dataset")), data_collator, meta["max_length"]
+        
+        dataset = Dataset.from_pandas(frame, preserve_index=False)
+        if not dynamic_padding:
+            def tokenize_function(examples):
+                return tokenizer(examples["text"], padding="max_length", truncation=True, max_length=max_length)
+        else:
+            if max_length is None:
+                lengths = [len(ids) for ids in tokenizer(dataset["text"], truncation=True)["input_ids"]]
+                max_length = training_max_length(lengths, length_percentile, tokenizer.model_max_length)
+                print(f"Max sequence length {max_length} ({length_percentile:g}th percentile, "
+                      f"longest message {max(lengths)} tokens)")
+            
+            def tokenize_function(examples):
+                encoded = tokenizer(examples["text"], truncation=True, max_length=max_length)
+                encoded["length"] = [len(ids) for ids in encoded["input_ids"]]
+                return encoded
+        
+        tokenized = dataset.map(tokenize_function, batched=True)
+        if cache_path is not None:
+            # Write to a temporary directory first; a concurrent writer of the same data may win the rename
+            tmp_path = f"{cache_path}.tmp{os.getpid()}"
+            tokenized.save_to_disk(os.path.join(tmp_path, "dataset"))
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump({"max_length": max_length}, f)
+            try:
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        return tokenized, data_collator, max_length
+    
+    def _train_multitask_model(self, train_data: pd.DataFrame, model_name: str,
+                               num_epochs: int, batch_size: int, max_length: Optional[int],
+                               dynamic_padding: bool, length_percentile: float,
+                               gradient_accumulation_steps: int, output_dir: Optional[str],
+                               resume: bool, tokenized_cache_dir: Optional[str]):
+        """Train one encoder with a classification head per task in ``train_data``."""
+        # Label names per task, in head output order
+        task_labels = {
+            task: sorted(group["label"].unique().tolist())
+            for task, group in train_data.groupby("task", sort=False)
+        }
+        task_index = {task: i for i, task in enumerate(task_labels)}
+        label_index = {
+            task: {label: i for i, label in enumerate(labels)}
+            for task, labels in task_labels.items()
+        }
+        
+        # Every row carries its task id and the label id within that task
+        frame = pd.DataFrame({
+            "text": train_data["text"].tolist(),
+            "label": [label_index[t][l] for t, l in zip(train_data["task"], train_data["label"])],
+            "task_ids": [task_index[t] for t in train_data["task"]]
+        })
+        
+        # Tokenize the data
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        tokenized_dataset, data_collator, _ = self._tokenize_for_training(
+            tokenizer, frame, dynamic_padding, max_length, length_percentile, tokenized_cache_dir
+        )
+        
+        # Prepare model
+        model = MultiTaskModel(AutoModel.from_pretrained(model_name), task_labels)
+        output_dir = output_dir or f"models/{MULTITASK}_model"
+        
+        training_args = TrainingArguments(
+            output_dir=output_dir,
+            num_train_epochs=num_epochs,
+            per_device_train_batch_size=batch_size,
+            gradient_accumulation_steps=gradient_accumulation_steps,
+            group_by_length=dynamic_padding,
+            length_column_name="length",
+            save_strategy="epoch"
+        )
+        
+        trainer = Trainer(
+            model=model,
+            args=training_args,
+            train_dataset=tokenized_dataset,  # type: ignore
+            data_collator=data_collator,
+            tokenizer=tokenizer
+        )
+        
+        result = trainer.train(resume_from_checkpoint=self._last_checkpoint(output_dir) if resume else None)
+        
+        # Save the model; the per-task models it replaces are dropped
+        model.save_pretrained(output_dir)
+        tokenizer.save_pretrained(output_dir)
+        for task in model.tasks:
+            self._forget(task)
+        model.eval()
+        self._register(MULTITASK, output_dir)
+        self._set_model(MULTITASK, model, tokenizer, output_dir)
+        self._models_changed()
+        return result
+    
+    def predict(self, text: str, tasks: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Make predictions using all three models (or only those for ``tasks``)."""
+        return self.predict_batch([text], tasks=tasks)[0]
+    
+    def predict_batch(self, texts: List[str], batch_size: int = 32,
+                      tasks: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Make predictions for many texts at once.
+        
+        Results for messages seen recently (compared after whitespace
+        normalization) come from the result cache; the remaining distinct
+        messages are classified together.
+        
+        Args:
+            texts: Texts to classify
+            batch_size: Maximum number of texts per forward pass
+            tasks: Only run the models answering these tasks (default: all).
+                A shared-encoder model still returns all of its tasks.
+        
+        Returns:
+            One dict per text, in input order, shaped like the result of ``predict``
+        """
+        version = self.model_version
+        task_key = tuple(tasks) if tasks is not None else None
+        keys = [(normalize_text(text), version, task_key) for text in texts]
+        cached = {key: self.result_cache.get(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, result in cached.items() if result is None]
+        instrumentation.count("chatbot.texts", len(texts))
+        instrumentation.count("chatbot.cache_misses", len(missing))
+        
+        if missing:
+            uncached = self._predict_uncached([key[0] for key in missing], batch_size, tasks)
+            for key, result in zip(missing, uncached):
+                cached[key] = result
+                self.result_cache.put(key, result)
+        
+        # Copy so callers can't modify the cached results
+        return [{task: dict(prediction) for task, prediction in cached[key].items()} for key in keys]
+    
+    def cascade_stats(self) -> Dict[str, Any]:
+        """Per cascaded task: threshold, texts scored, texts escalated and the escalation rate."""
+        return {task: {"threshold": self.cascade_thresholds[task], **counts}
+                for task, counts in self.cascade_counters.snapshot().items()}
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counters of the prediction result cache."""
+        return {**self.result_cache.stats(), "model_version": self.model_version}
+    
+    def _predict_uncached(self, texts: List[str], batch_size: int,
+                          tasks: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Run every model (or those answering ``tasks``) on ``texts``, loading them as needed.
+        
+        In cascade mode the TF-IDF model of a task answers first, and only the
+        texts it is unsure about go on to that task's transformer.
+        A shared-encoder model answers all of its tasks from one forward pass.
+        Each distinct tokenizer encodes all texts a model needs in one call.
+        Texts are then sorted by token length and split into batches that are
+        padded only to their longest item, which keeps padding waste small.
+        """
+        results: List[Dict[str, Any]] = [{} for _ in texts]
+        if not texts:
+            return results
+        
+        # Answers of the cascade models below their threshold, used if no transformer can do better
+        fallbacks = self._predict_cascade(texts, tasks, results)
+        
+        with self._load_lock:
+            names = list(dict.fromkeys(list(self.models) + list(self.model_paths)))
+            if tasks is not None:
+                names = [name for name in names if set(self._answers(name)) & set(tasks)]
+        
+        encodings = {}
+        for task in names:
+            answers = [name for name in self._answers(task) if tasks is None or name in tasks]
+            needed = [i for i, result in enumerate(results) if any(name not in result for name in answers)]
+            if not needed:
+                continue
+            acquired = self._acquire(task)
+            if acquired is None:
+                continue
+            model, tokenizer, key = acquired
+            if (key, tuple(needed)) not in encodings:
+                with instrumentation.stage("chatbot.tokenize"):
+                    encoded = tokenizer([texts[i] for i in needed], truncation=True)
+                    features = {
+                        i: {name: values[position] for name, values in encoded.items()}
+                        for position, i in enumerate(needed)
                     }
+                    order = sorted(needed, key=lambda i: len(features[i]["input_ids"]))
+                encodings[key, tuple(needed)] = (features, order)
+            features, order = encodings[key, tuple(needed)]
+            
+            for start in range(0, len(order), batch_size):
+                indices = order[start:start + batch_size]
+                with instrumentation.stage("chatbot.pad"):
+                    inputs = tokenizer.pad(
+                        [features[i] for i in indices], return_tensors="pt"
+                    ).to(self.device)
+                # Ends with .tolist(), so on a GPU the time includes waiting for the kernels
+                with instrumentation.stage("chatbot.forward"):
+                    with torch.no_grad():
+                        outputs = model(**inputs)
+                    if isinstance(model, MultiTaskModel):
+                        task_logits = outputs["logits"]
+                    else:
+                        task_logits = {task: outputs.logits}
+                    task_predictions = {}
+                    for name, logits in task_logits.items():
+                        confidences, label_ids = torch.max(torch.softmax(logits, dim=-1), dim=-1)
+                        task_predictions[name] = (label_ids.tolist(), confidences.tolist())
+                
+                for name, (label_ids, confidences) in task_predictions.items():
+                    for i, label_id, confidence in zip(indices, label_ids, confidences):
+                        # A confident cascade answer stands, whatever else ran on the text
+                        if name in results[i]:
+                            continue
+                        if isinstance(model, MultiTaskModel):
+                            label = model.task_labels[name][label_id]
+                        else:
+                            label = model.config.id2label[label_id]
+                        results[i][name] = {
+                            "label": label,
+                            "confidence": confidence
+                        }
         
+        for (i, name), prediction in fallbacks.items():
+            results[i].setdefault(name, prediction)
         return results
     
+    def _predict_cascade(self, texts: List[str], tasks: Optional[List[str]],
+                         results: List[Dict[str, Any]]) -> Dict[Tuple[int, str], Dict[str, Any]]:
+        """Fill in the confident answers of the cascade models.
+        
+        Returns the answers below the threshold, keyed by text index and task.
+        """
+        fallbacks = {}
+        for task, cascade_model in self.cascade_models.items():
+            if tasks is not None and task not in tasks:
+                continue
+            with instrumentation.stage("chatbot.cascade"):
+                probabilities = cascade_model.predict_proba(texts)
+            label_ids = probabilities.argmax(axis=1)
+            confidences = probabilities[np.arange(len(texts)), label_ids]
+            threshold = self.cascade_thresholds[task]
+            for i, (label_id, confidence) in enumerate(zip(label_ids.tolist(), confidences.tolist())):
+                prediction = {"label": str(cascade_model.classes_[label_id]), "confidence": confidence}
+                if confidence >= threshold:
+                    results[i][task] = prediction
+                else:
+                    fallbacks[i, task] = prediction
+            escalated = int((confidences < threshold).sum())
+            self.cascade_counters.record(task, len(texts), escalated)
+            instrumentation.count(f"cascade.{task}.escalated", escalated)
+        return fallbacks
+    
     def generate_response(self, text: str) -> str:
         """Generate a response based on the predictions."""
-        predictions = self.predict(text)
-        
+        return self.response_from_predictions(self.predict(text))
+    
+    @staticmethod
+    def response_from_predictions(predictions: Dict[str, Any]) -> str:
+        """Pick a response for predictions already returned by ``predict``."""
         # Get the dominant emotion and sentiment
         emotion = predictions.get("emotion", {}).get("label", "neutral")
         sentiment = predictions.get("sentiment", {}).get("label", "neutral")
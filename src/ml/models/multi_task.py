@@ -0,0 +1,106 @@
+from transformers import AutoModel
+import torch
+from torch import nn
+from typing import Dict, List, Optional
+import json
+import os
+
+CONFIG_FILE = "multitask_config.json"
+HEADS_FILE = "heads.pt"
+ENCODER_DIR = "encoder"
+
+
+class MultiTaskModel(nn.Module):
+    """One shared transformer encoder with a small classification head per task.
+
+    A single encoder pass produces the pooled representation that every head
+    classifies, so emotion, sentiment and intent cost one forward pass together
+    instead of three.
+    """
+
+    def __init__(self, encoder, task_labels: Dict[str, List], dropout: float = 0.1):
+        """
+        Args:
+            encoder: Base transformer model (e.g. from ``AutoModel.from_pretrained``)
+            task_labels: Ordered label names for each task; head outputs follow this order
+            dropout: Dropout applied to the pooled output before the heads
+        """
+        super().__init__()
+        self.encoder = encoder
+        self.task_labels = {task: list(labels) for task, labels in task_labels.items()}
+        self.tasks = list(self.task_labels)
+        self.dropout = nn.Dropout(dropout)
+        hidden_size = encoder.config.hidden_size
+        self.heads = nn.ModuleDict({
+            task: nn.Linear(hidden_size, len(labels))
+            for task, labels in self.task_labels.items()
+        })
+
+    def forward(self, input_ids, attention_mask=None, token_type_ids=None,
+                labels=None, task_ids=None):
+        """Run the encoder once and every head on its output.
+
+        During training each row carries the index of its task in ``task_ids``
+        and a label for that task; the loss only uses the matching head.
+        """
+        encoder_inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if token_type_ids is not None:
+            encoder_inputs["token_type_ids"] = token_type_ids
+        outputs = self.encoder(**encoder_inputs)
+
+        # Use the pooler output like *ForSequenceClassification, or [CLS] if there is none
+        pooled = getattr(outputs, "pooler_output", None)
+        if pooled is None:
+            pooled = outputs.last_hidden_state[:, 0]
+        pooled = self.dropout(pooled)
+
+        logits = {task: head(pooled) for task, head in self.heads.items()}
+        result = {"logits": logits}
+
+        if labels is not None and task_ids is not None:
+            loss = pooled.new_zeros(())
+            for index, task in enumerate(self.tasks):
+                mask = task_ids == index
+                if mask.any():
+                    task_loss = nn.functional.cross_entropy(logits[task][mask], labels[mask], reduction="sum")
+                    loss = loss + task_loss
+            result["loss"] = loss / labels.shape[0]
+
+        return result
+
+    def save_pretrained(self, path: str):
+        """Save the encoder, the heads and the label config under ``path``."""
+        os.makedirs(path, exist_ok=True)
+        self.encoder.save_pretrained(os.path.join(path, ENCODER_DIR))
+        torch.save(self.heads.state_dict(), os.path.join(path, HEADS_FILE))
+        with open(os.path.join(path, CONFIG_FILE), "w") as f:
+            json.dump({"task_labels": self.task_labels, "dropout": self.dropout.p}, f, indent=2)
+
+    @classmethod
+    def from_pretrained(cls, path: str, map_location: Optional[str] = None, mmap: bool = False) -> "MultiTaskModel":
+        """Load a model written by ``save_pretrained``.
+
+        With ``mmap`` the encoder keeps the tensors mapped from its safetensors
+        file instead of copying them.
+        """
+        with open(os.path.join(path, CONFIG_FILE)) as f:
+            config = json.load(f)
+        encoder_path = os.path.join(path, ENCODER_DIR)
+        mmap = mmap and os.path.exists(os.path.join(encoder_path, "model.safetensors"))
+        encoder = AutoModel.from_pretrained(encoder_path, low_cpu_mem_usage=mmap)
+        model = cls(encoder, config["task_labels"], dropout=config["dropout"])
+        model.heads.load_state_dict(
+            torch.load(os.path.join(path, HEADS_FILE), map_location=map_location or "cpu")
+        )
+        return model
+
+    @staticmethod
+    def checkpoint_tasks(path: str) -> List[str]:
+        """Tasks of the model saved at ``path``, without loading it."""
+        with open(os.path.join(path, CONFIG_FILE)) as f:
+            return list(json.load(f)["task_labels"])
+
+    @staticmethod
+    def is_checkpoint(path: str) -> bool:
+        """Whether ``path`` holds a saved multi-task model."""
+        return os.path.exists(os.path.join(path, CONFIG_FILE))
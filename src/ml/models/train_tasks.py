@@ -0,0 +1,178 @@
+"""Train several chatbot task models concurrently and write a manifest for them.
+
+Each task trains in its own worker process with a fixed number of threads,
+so the tasks share the machine's cores instead of oversubscribing them.
+The workers share:
+
+- one local copy of the base model and tokenizer, resolved once up front
+  (safetensors weights are memory-mapped, so the page cache holds them once)
+- a tokenized-dataset cache directory, ``<output-dir>/.cache/tokenized``,
+  keyed by a hash of the rows, tokenizer and settings. Each worker still
+  tokenizes its own task's data; only a rerun, or another task on the same
+  CSV, finds it there and skips tokenization
+
+Every task writes its checkpoints to its own ``<output-dir>/<task>_model``.
+``manifest.json`` is rewritten as each task finishes. A rerun skips the
+tasks the manifest already lists, and resumes unfinished ones from their last
+checkpoint. A task that fails is left out of the manifest, the other tasks
+keep training, and the command exits with status 1 at the end.
+``MultiModelChatbot(model_paths="<output-dir>/manifest.json")`` loads the result.
+
+Run from the repository root:
+
+    python -m src.ml.models.train_tasks --task emotion=processed_emotion_dataset.csv \\
+        --task sentiment=processed_sentiment_dataset.csv --output-dir models --jobs 2
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Optional
+import argparse
+import multiprocessing
+import os
+import shutil
+import time
+
+from src.ml.models.manifest import MANIFEST_FILE, read_manifest, write_manifest
+
+CACHE_DIR = ".cache"
+THREAD_VARIABLES = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def prepare_base_model(model_name: str, cache_dir: str) -> str:
+    """Local directory holding ``model_name``'s weights and tokenizer, saved once."""
+    if os.path.isdir(model_name):
+        return model_name
+    path = os.path.join(cache_dir, "base", model_name.replace("/", "--"))
+    if not os.path.isdir(path):
+        from transformers import AutoModel, AutoTokenizer
+
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp_path)
+        AutoModel.from_pretrained(model_name).save_pretrained(tmp_path, safe_serialization=True)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _limit_threads(num_threads: int):
+    # Worker initializer; runs before the worker imports torch
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(num_threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    import torch
+
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+
+
+def _train_task(task: str, data_path: str, base_path: str, output_dir: str,
+                options: Dict[str, Any]) -> Dict[str, Any]:
+    # Runs in a worker process
+    import pandas as pd
+
+    from src.ml.models.multi_model import MultiModelChatbot
+
+    train_data = pd.read_csv(data_path)[["text", "label"]]
+    model_dir = os.path.join(output_dir, f"{task}_model")
+    chatbot = MultiModelChatbot(model_paths={})
+    start = time.perf_counter()
+    result = chatbot.train_model(task, train_data, model_name=base_path, output_dir=model_dir, resume=True,
+                                 tokenized_cache_dir=os.path.join(output_dir, CACHE_DIR, "tokenized"), **options)
+    return {
+        "path": f"{task}_model",
+        "data": data_path,
+        "labels": sorted(str(label) for label in train_data["label"].unique()),
+        "train_samples": len(train_data),
+        "train_seconds": round(time.perf_counter() - start, 1),
+        "metrics": result.metrics,
+    }
+
+
+def train_tasks(task_data: Dict[str, str], output_dir: str = "models", model_name: str = "bert-base-uncased",
+                jobs: Optional[int] = None, threads_per_job: Optional[int] = None, retrain: bool = False,
+                **train_options) -> Dict[str, Any]:
+    """Train a model per task concurrently and return the manifest written to ``output_dir``.
+
+    Tasks that failed are missing from the returned manifest's ``tasks``.
+
+    Args:
+        task_data: Task name -> CSV with ``text`` and ``label`` columns
+        output_dir: Parent directory of the task models and the manifest
+        model_name: Base model every task is fine-tuned from
+        jobs: Tasks trained at once (default: all of them, at most one per core)
+        threads_per_job: Torch threads per task (default: cores divided among the jobs)
+        retrain: Train tasks the manifest already lists again, from scratch
+        **train_options: Passed on to ``MultiModelChatbot.train_model``
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = {"base_model": model_name, "tasks": {}}
+    if os.path.exists(manifest_path):
+        manifest["tasks"] = read_manifest(manifest_path)["tasks"]
+
+    pending = {}
+    for task, data_path in task_data.items():
+        if task in manifest["tasks"] and not retrain:
+            print(f"{task}: already trained, skipping (use --retrain to train it again)")
+            continue
+        if retrain:
+            shutil.rmtree(os.path.join(output_dir, f"{task}_model"), ignore_errors=True)
+        pending[task] = data_path
+    if not pending:
+        return manifest
+
+    cores = os.cpu_count() or 1
+    jobs = jobs or min(len(pending), cores)
+    threads_per_job = threads_per_job or max(1, cores // jobs)
+    base_path = prepare_base_model(model_name, os.path.join(output_dir, CACHE_DIR))
+    print(f"Training {len(pending)} task(s), {jobs} at a time with {threads_per_job} thread(s) each")
+
+    # spawn, so no worker inherits torch's thread pools from this process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                             initializer=_limit_threads, initargs=(threads_per_job,)) as executor:
+        futures = {
+            executor.submit(_train_task, task, data_path, base_path, output_dir, train_options): task
+            for task, data_path in pending.items()
+        }
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                manifest["tasks"][task] = future.result()
+            except Exception as e:
+                # The other tasks keep going; this one resumes from its checkpoint next time.
+                # An entry from an earlier run no longer describes what is on disk
+                print(f"{task}: training failed: {e}")
+                if manifest["tasks"].pop(task, None) is not None:
+                    write_manifest(manifest_path, manifest)
+                continue
+            write_manifest(manifest_path, manifest)
+            print(f"{task}: trained in {manifest['tasks'][task]['train_seconds']}s")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--task", action="append", required=True, metavar="TASK=CSV",
+                        help="Task name and its training CSV (text, label); repeat per task")
+    parser.add_argument("--output-dir", default="models")
+    parser.add_argument("--model-name", default="bert-base-uncased")
+    parser.add_argument("--jobs", type=int, default=None, help="Tasks trained at once")
+    parser.add_argument("--threads-per-job", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--gradient-accumulation-steps", type=int, default=1)
+    parser.add_argument("--retrain", action="store_true", help="Retrain tasks already in the manifest")
+    args = parser.parse_args()
+
+    task_data = dict(entry.split("=", 1) for entry in args.task)
+    manifest = train_tasks(task_data, output_dir=args.output_dir, model_name=args.model_name,
+                           jobs=args.jobs, threads_per_job=args.threads_per_job, retrain=args.retrain,
+                           num_epochs=args.epochs, batch_size=args.batch_size,
+                           gradient_accumulation_steps=args.gradient_accumulation_steps)
+    missing = set(task_data) - set(manifest["tasks"])
+    if missing:
+        raise SystemExit(f"Not trained: {', '.join(sorted(missing))}")
+    print(f"Manifest: {os.path.join(args.output_dir, MANIFEST_FILE)}")
+
+
+if __name__ == "__main__":
+    main()
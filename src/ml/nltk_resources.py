@@ -0,0 +1,47 @@
+import os
+from typing import Iterable, Optional
+
+# Local NLTK data directory searched before NLTK's default locations
+NLTK_DATA_DIR = os.environ.get("NLTK_DATA", "data/nltk_data")
+
+# Corpora needed by the preprocessing pipeline, mapped to their nltk.data path
+REQUIRED_RESOURCES = {
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+}
+
+
+def _download_allowed() -> bool:
+    return os.environ.get("NLTK_ALLOW_DOWNLOAD", "").lower() in ("1", "true", "yes")
+
+
+def ensure_nltk_resources(names: Iterable[str] = tuple(REQUIRED_RESOURCES),
+                          download: Optional[bool] = None) -> None:
+    """Make sure the given NLTK corpora can be loaded, without touching the network by default.
+
+    Args:
+        names: Resource names (keys of ``REQUIRED_RESOURCES``)
+        download: Download missing resources into ``NLTK_DATA_DIR``. Defaults to the
+            ``NLTK_ALLOW_DOWNLOAD`` environment variable, i.e. off unless enabled.
+
+    Raises:
+        LookupError: If a resource is missing and downloading is not allowed
+    """
+    import nltk
+
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    if download is None:
+        download = _download_allowed()
+
+    for name in names:
+        try:
+            nltk.data.find(REQUIRED_RESOURCES[name])
+        except LookupError:
+            if not download:
+                raise LookupError(
+                    f"NLTK resource '{name}' not found in {nltk.data.path}. Copy it into "
+                    f"{NLTK_DATA_DIR} or allow downloading (NLTK_ALLOW_DOWNLOAD=1)."
+                ) from None
+            os.makedirs(NLTK_DATA_DIR, exist_ok=True)
+            nltk.download(name, download_dir=NLTK_DATA_DIR, quiet=True)
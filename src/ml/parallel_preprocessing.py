@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, List, Optional, Union
+
+import pandas as pd
+
+from src.ml.preprocessing import get_preprocessor, preprocess_batch
+
+DEFAULT_CHUNK_SIZE = 2000
+MANIFEST_FILE = "manifest.json"
+
+
+def _preprocess_chunk(texts: List[str]) -> List[str]:
+    # Runs inside a worker; the shared preprocessor is built once per process
+    return preprocess_batch(texts)
+
+
+def _fingerprint(texts: List[str]) -> str:
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _chunk_path(checkpoint_dir: str, index: int) -> str:
+    return os.path.join(checkpoint_dir, f"chunk_{index:06d}.json")
+
+
+def _write_json(path: str, data) -> None:
+    # Write to a temporary file first so a crash never leaves a half-written chunk
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _prepare_checkpoint_dir(checkpoint_dir: str, manifest: dict) -> None:
+    """Create the checkpoint directory, discarding chunks from a different run."""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    manifest_path = os.path.join(checkpoint_dir, MANIFEST_FILE)
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            if json.load(f) == manifest:
+                return
+        print(f"Checkpoint in {checkpoint_dir} belongs to different data, starting over")
+
+    for name in os.listdir(checkpoint_dir):
+        if name.startswith("chunk_"):
+            os.remove(os.path.join(checkpoint_dir, name))
+    _write_json(manifest_path, manifest)
+
+
+def preprocess_parallel(texts: Union[pd.Series, Iterable[str]],
+                        n_workers: Optional[int] = None,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        checkpoint_dir: Optional[str] = None) -> Union[pd.Series, List[str]]:
+    """Preprocess texts in chunks spread over a process pool.
+
+    Args:
+        texts: List or Series of raw texts
+        n_workers: Number of worker processes (defaults to the CPU count, 1 runs inline)
+        chunk_size: Number of texts handed to a worker at a time
+        checkpoint_dir: If set, every finished chunk is written here and chunks
+            already present are reused, so an interrupted run resumes where it stopped
+
+    Returns:
+        Processed texts in the original row order, as a Series (same index) when a
+        Series was passed in and as a list otherwise.
+    """
+    series = texts if isinstance(texts, pd.Series) else None
+    texts = list(texts)
+    n_workers = n_workers or os.cpu_count() or 1
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    results: List[Optional[List[str]]] = [None] * len(chunks)
+
+    if checkpoint_dir is not None:
+        _prepare_checkpoint_dir(checkpoint_dir, {
+            "fingerprint": _fingerprint(texts),
+            "num_texts": len(texts),
+            "chunk_size": chunk_size,
+        })
+        for index in range(len(chunks)):
+            path = _chunk_path(checkpoint_dir, index)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    results[index] = json.load(f)
+        resumed = sum(result is not None for result in results)
+        if resumed:
+            print(f"Resuming preprocessing: {resumed}/{len(chunks)} chunks already done")
+
+    def finish(index: int, processed: List[str]) -> None:
+        results[index] = processed
+        if checkpoint_dir is not None:
+            _write_json(_chunk_path(checkpoint_dir, index), processed)
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    if n_workers == 1 or len(pending) <= 1:
+        for index in pending:
+            finish(index, _preprocess_chunk(chunks[index]))
+    else:
+        # Load the NLTK resources here so a missing corpus fails once, before any
+        # worker starts (forked workers also inherit the loaded preprocessor)
+        get_preprocessor()
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(pending))) as executor:
+            futures = {executor.submit(_preprocess_chunk, chunks[index]): index for index in pending}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+
+    processed = [text for chunk in results for text in chunk]
+    if series is not None:
+        return pd.Series(processed, index=series.index, name=series.name)
+    return processed
@@ -0,0 +1,153 @@
+import hashlib
+import re
+import sys
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+from src.ml import instrumentation
+from src.ml.nltk_resources import ensure_nltk_resources
+
+# Characters removed before tokenizing (same pattern the training scripts used)
+_NON_ALPHA_RE = re.compile(r'[^a-zA-Z\s]')
+# The ASCII characters it removes, for the much faster bytes.translate path
+_NON_ALPHA_ASCII = bytes(code for code in range(128) if _NON_ALPHA_RE.match(chr(code)))
+
+# Once the text only holds ASCII letters and whitespace, word_tokenize reduces to
+# a whitespace split plus the Treebank contraction rules that need no apostrophe.
+_SPLIT_CONTRACTIONS = {
+    "cannot": ("can", "not"),
+    "gimme": ("gim", "me"),
+    "gonna": ("gon", "na"),
+    "gotta": ("got", "ta"),
+    "lemme": ("lem", "me"),
+    "wanna": ("wan", "na"),
+}
+
+DEFAULT_CACHE_SIZE = 100_000
+
+# Bump whenever a change here alters the processed output
+PREPROCESSING_VERSION = 1
+
+
+class TextPreprocessor:
+    """Lowercase, strip non-letters, tokenize, drop stopwords and lemmatize.
+
+    Produces exactly the same output as the original per-call ``preprocess_text``
+    but builds the stopword set, lemmatizer and regex once and memoizes the
+    lemma of every distinct token in a bounded LRU cache. NLTK is imported and
+    its corpora loaded only when the first instance is created.
+    """
+
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE):
+        from nltk.corpus import stopwords
+        from nltk.stem import WordNetLemmatizer
+
+        ensure_nltk_resources()
+        self.stop_words = frozenset(stopwords.words('english'))
+        self.lemmatizer = WordNetLemmatizer()
+        # Maps a token to its lemma, or to '' when the token is a stopword
+        self._normalize_token = lru_cache(maxsize=cache_size)(self._normalize_token_uncached)
+
+    def _normalize_token_uncached(self, token: str) -> str:
+        if token in self.stop_words:
+            return ''
+        return self.lemmatizer.lemmatize(token)
+
+    def _tokenize(self, text: str) -> List[str]:
+        tokens = []
+        for token in text.split():
+            parts = _SPLIT_CONTRACTIONS.get(token)
+            if parts is None:
+                tokens.append(token)
+            else:
+                tokens.extend(parts)
+        return tokens
+
+    def clean(self, text: str) -> str:
+        """Lowercase and strip everything but ASCII letters and whitespace."""
+        text = text.lower()
+        if text.isascii():
+            return text.encode('ascii').translate(None, _NON_ALPHA_ASCII).decode('ascii')
+        return _NON_ALPHA_RE.sub('', text)
+
+    def token_lemmas(self, token: str) -> List[str]:
+        """Lemmas that one whitespace-separated token of cleaned text contributes."""
+        lemmas = [self._normalize_token(part) for part in self._tokenize(token)]
+        return [lemma for lemma in lemmas if lemma]
+
+    def __call__(self, text: str) -> str:
+        text = self.clean(text)
+        normalize = self._normalize_token
+        lemmas = [normalize(token) for token in self._tokenize(text)]
+        return ' '.join([lemma for lemma in lemmas if lemma])
+
+    def batch(self, texts: Union["pd.Series", Iterable[str]]) -> Union["pd.Series", List[str]]:
+        """Preprocess many texts, computing each distinct text only once.
+
+        A Series comes back as a Series with the same index, anything else as a list.
+        """
+        seen: Dict[str, str] = {}
+        processed = []
+        with instrumentation.stage("preprocess"):
+            for text in texts:
+                result = seen.get(text)
+                if result is None:
+                    result = seen[text] = self(text)
+                processed.append(result)
+
+        # pandas is not imported here so scorers that don't use it stay light;
+        # if it isn't loaded, texts can't be a Series
+        pd = sys.modules.get("pandas")
+        if pd is not None and isinstance(texts, pd.Series):
+            return pd.Series(processed, index=texts.index, name=texts.name)
+        return processed
+
+    def cache_info(self):
+        """Hit/miss statistics of the token cache."""
+        return self._normalize_token.cache_info()
+
+
+_default_preprocessor: Optional[TextPreprocessor] = None
+
+
+def get_preprocessor() -> TextPreprocessor:
+    """Return the shared preprocessor, building it on first use."""
+    global _default_preprocessor
+    if _default_preprocessor is None:
+        _default_preprocessor = TextPreprocessor()
+    return _default_preprocessor
+
+
+def preprocess_text(text: str) -> str:
+    """Preprocess a single text."""
+    return get_preprocessor()(text)
+
+
+def preprocess_batch(texts: Union["pd.Series", Iterable[str]]) -> Union["pd.Series", List[str]]:
+    """Preprocess a list or Series of texts."""
+    return get_preprocessor().batch(texts)
+
+
+def preprocessing_fingerprint() -> str:
+    """Hash of everything that determines the processed output.
+
+    Used to key on-disk caches so they are invalidated when the pipeline,
+    the stopword list or the NLTK version changes.
+    """
+    import nltk
+
+    preprocessor = get_preprocessor()
+    digest = hashlib.sha256()
+    for part in (
+        str(PREPROCESSING_VERSION),
+        nltk.__version__,
+        _NON_ALPHA_RE.pattern,
+        repr(sorted(_SPLIT_CONTRACTIONS.items())),
+        repr(sorted(preprocessor.stop_words)),
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+DEFAULT_MAX_SIZE = 10_000
+DEFAULT_TTL_SECONDS = 3600.0
+
+
+def normalize_text(text: str) -> str:
+    """Cache key form of a message: surrounding and repeated whitespace removed.
+
+    Only whitespace is normalized because the tokenizers ignore it; case and
+    punctuation can change what a cased model predicts.
+    """
+    return " ".join(text.split())
+
+
+class ResultCache:
+    """Thread-safe in-memory LRU cache whose entries also expire after a TTL.
+
+    When ``max_size`` is reached the least recently used entry is evicted.
+    Expired entries are dropped on lookup. A ``max_size`` of 0 disables caching;
+    a ``ttl_seconds`` of None keeps entries until they are evicted.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS):
+        if ttl_seconds is not None and ttl_seconds <= 0:
+            raise ValueError(f"ttl_seconds must be positive or None, got {ttl_seconds!r}")
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value for ``key``, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or time.monotonic() < expires:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        expires = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
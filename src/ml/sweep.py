@@ -0,0 +1,207 @@
+"""Hyperparameter sweep for the TF-IDF models (model 1 and model 2).
+
+The corpus is preprocessed once and split once (80/20, seed 42, like the
+training scripts). Each distinct vectorizer configuration is then fitted once,
+on the training split only, and its train/test matrices are written as plain
+``.npy`` arrays. Classifier fits run in a process pool; every worker maps those
+arrays copy-on-write instead of receiving a pickled copy, so all fits of one
+vectorizer configuration share the same pages.
+
+Run from the repository root:
+
+    python -m src.ml.sweep model1 --max-features 2000 5000 --ngram-max 1 2 --C 0.1 1 10
+    python -m src.ml.sweep model2 --svm-mode linear --C 0.5 1 2 --workers 4
+
+Options left unset keep the training script's value. The results table is
+written as CSV, best accuracy first.
+"""
+import argparse
+import importlib
+import itertools
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SCRIPTS = {'model1': 'model1_logistic', 'model2': 'model2_svm'}
+
+CSR_PARTS = ('data', 'indices', 'indptr', 'shape')
+
+
+def _save_csr(prefix: str, matrix) -> None:
+    for part in CSR_PARTS:
+        np.save(f"{prefix}_{part}.npy", np.asarray(getattr(matrix, part)))
+
+
+def _load_csr(prefix: str):
+    from scipy import sparse
+
+    # Copy-on-write: pages stay shared between workers unless a solver writes to
+    # them (libsvm asks for writable arrays even though it only reads)
+    data, indices, indptr = (np.load(f"{prefix}_{part}.npy", mmap_mode='c') for part in CSR_PARTS[:3])
+    shape = tuple(np.load(f"{prefix}_shape.npy"))
+    return sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+
+def _fit_job(job: Dict) -> Dict:
+    # Runs in a worker process
+    from sklearn.metrics import accuracy_score, f1_score
+    from threadpoolctl import threadpool_limits
+
+    script = importlib.import_module(SCRIPTS[job['model']])
+    X_train = _load_csr(os.path.join(job['matrix_dir'], 'train'))
+    X_test = _load_csr(os.path.join(job['matrix_dir'], 'test'))
+    y_train = np.load(os.path.join(job['matrix_dir'], os.pardir, 'y_train.npy'), mmap_mode='r')
+    y_test = np.load(os.path.join(job['matrix_dir'], os.pardir, 'y_test.npy'), mmap_mode='r')
+
+    model = script.build_model(**job['classifier'])
+    # The pool already uses every core; keep BLAS from oversubscribing them
+    with threadpool_limits(limits=1):
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        train_seconds = time.perf_counter() - start
+        y_pred = model.predict(X_test)
+
+    return {
+        'accuracy': accuracy_score(y_test, y_pred),
+        'macro_f1': f1_score(y_test, y_pred, average='macro'),
+        'train_seconds': train_seconds,
+    }
+
+
+def vectorizer_grid(defaults: Dict, max_features=None, ngram_max=None, min_df=None, max_df=None) -> List[Dict]:
+    """Every combination of the given TF-IDF settings; unset ones keep ``defaults``."""
+    axes = {
+        'max_features': max_features or [defaults.get('max_features')],
+        'ngram_range': [(1, n) for n in ngram_max] if ngram_max else [defaults.get('ngram_range', (1, 1))],
+        'min_df': min_df or [defaults.get('min_df', 1)],
+        'max_df': max_df or [defaults.get('max_df', 1.0)],
+    }
+    return [dict(zip(axes, values)) for values in itertools.product(*axes.values())]
+
+
+def classifier_grid(model: str, C=None, svm_modes=None) -> List[Dict]:
+    axes = {'C': C or [1.0]}
+    if model == 'model2':
+        axes['mode'] = svm_modes or ['svc']
+    return [dict(zip(axes, values)) for values in itertools.product(*axes.values())]
+
+
+def run_sweep(model: str, vectorizer_configs: List[Dict], classifier_configs: List[Dict],
+              n_workers: Optional[int] = None, cache_dir: Optional[str] = None,
+              work_dir: Optional[str] = None, download_nltk: bool = False) -> pd.DataFrame:
+    """Fit every vectorizer/classifier combination and return one row of results per fit."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.model_selection import train_test_split
+
+    from src.ml.corpus_cache import CorpusCache
+    from src.ml.nltk_resources import ensure_nltk_resources
+
+    script = importlib.import_module(SCRIPTS[model])
+    ensure_nltk_resources(download=download_nltk)
+    cache = CorpusCache(cache_dir) if cache_dir else None
+    texts, y = script.load_and_preprocess_data(n_workers, cache=cache)
+
+    train_idx, test_idx = train_test_split(np.arange(len(texts)), test_size=0.2, random_state=42)
+    train_texts, test_texts = texts.iloc[train_idx], texts.iloc[test_idx]
+
+    keep_work_dir = work_dir is not None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='sweep_')
+    os.makedirs(work_dir, exist_ok=True)
+    # Labels as integer codes so the workers can map them too
+    _, codes = np.unique(y, return_inverse=True)
+    np.save(os.path.join(work_dir, 'y_train.npy'), codes[train_idx])
+    np.save(os.path.join(work_dir, 'y_test.npy'), codes[test_idx])
+
+    rows, futures = [], []
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            for index, params in enumerate(vectorizer_configs):
+                start = time.perf_counter()
+                vectorizer = TfidfVectorizer(**params)
+                X_train = vectorizer.fit_transform(train_texts)
+                X_test = vectorizer.transform(test_texts)
+                vectorize_seconds = time.perf_counter() - start
+                print(f"Vectorizer {index + 1}/{len(vectorizer_configs)} {params}: "
+                      f"{X_train.shape[1]} features in {vectorize_seconds:.1f}s")
+
+                matrix_dir = os.path.join(work_dir, f'vectorizer_{index:03d}')
+                os.makedirs(matrix_dir, exist_ok=True)
+                _save_csr(os.path.join(matrix_dir, 'train'), X_train)
+                _save_csr(os.path.join(matrix_dir, 'test'), X_test)
+
+                # Submitted right away, so these fits overlap with the next vectorizer
+                for classifier in classifier_configs:
+                    job = {'model': model, 'matrix_dir': matrix_dir, 'classifier': classifier}
+                    row = {**params, 'ngram_range': str(params['ngram_range']), **classifier,
+                           'num_features': X_train.shape[1], 'vectorize_seconds': vectorize_seconds}
+                    futures.append((row, executor.submit(_fit_job, job)))
+
+            for row, future in futures:
+                rows.append({**row, **future.result()})
+                print(f"  {len(rows)}/{len(futures)} accuracy {rows[-1]['accuracy']:.4f}, "
+                      f"trained in {rows[-1]['train_seconds']:.1f}s")
+    finally:
+        if not keep_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if cache is not None:
+        print(cache.report())
+    return pd.DataFrame(rows).sort_values('accuracy', ascending=False, ignore_index=True)
+
+
+def _document_frequencies(values, counts_from: float):
+    # TfidfVectorizer reads an int as a document count and a float as a fraction
+    if not values:
+        return None
+    return [int(v) if v >= counts_from and v.is_integer() else v for v in values]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('model', choices=sorted(SCRIPTS))
+    parser.add_argument('--max-features', type=int, nargs='+')
+    parser.add_argument('--ngram-max', type=int, nargs='+', help='Upper end of ngram_range')
+    parser.add_argument('--min-df', type=float, nargs='+',
+                        help='Document frequency floor (a count if >= 1, else a fraction)')
+    parser.add_argument('--max-df', type=float, nargs='+')
+    parser.add_argument('--C', type=float, nargs='+', help='Inverse regularization strength')
+    parser.add_argument('--svm-mode', nargs='+', choices=('svc', 'linear'), help='model2 only')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Preprocessing and fitting worker processes (default: all CPU cores)')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Directory of the preprocessed corpus cache (disabled if not set)')
+    parser.add_argument('--work-dir', default=None,
+                        help='Where the feature matrices are written (default: a temporary directory, '
+                             'removed afterwards)')
+    parser.add_argument('--output', default=None,
+                        help='Results CSV (default: models/saved_models/<model>/sweep_results.csv)')
+    parser.add_argument('--download-nltk', action='store_true',
+                        help='Download missing NLTK corpora instead of failing')
+    args = parser.parse_args()
+
+    script = importlib.import_module(SCRIPTS[args.model])
+    # A min_df of 1 means one document, a max_df of 1 means all of them
+    vectorizer_configs = vectorizer_grid(script.VECTORIZER_PARAMS, args.max_features, args.ngram_max,
+                                         _document_frequencies(args.min_df, counts_from=1),
+                                         _document_frequencies(args.max_df, counts_from=2))
+    classifier_configs = classifier_grid(args.model, args.C, args.svm_mode)
+    print(f"Sweeping {len(vectorizer_configs)} vectorizer x {len(classifier_configs)} classifier settings")
+
+    results = run_sweep(args.model, vectorizer_configs, classifier_configs, n_workers=args.workers,
+                        cache_dir=args.cache_dir, work_dir=args.work_dir, download_nltk=args.download_nltk)
+
+    output = args.output or os.path.join('models', 'saved_models', args.model, 'sweep_results.csv')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    results.to_csv(output, index=False)
+    print(results.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
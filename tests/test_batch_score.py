@@ -0,0 +1,42 @@
+"""batch_score: resuming only continues a checkpoint written for the same run."""
+import pandas as pd
+import pytest
+
+from src.ml.batch_score import _Writer, input_fingerprint
+
+
+@pytest.fixture
+def run(tmp_path):
+    input_path = tmp_path / "messages.csv"
+    input_path.write_text("text\nhello\nbye\n")
+    return {"input": input_fingerprint(str(input_path)), "models": ["model1"], "text_column": "text",
+            "keep_columns": [], "chunk_size": 1}
+
+
+def test_resumes_same_run(tmp_path, run):
+    output = str(tmp_path / "scored.csv")
+    _Writer(output, False, run).write(pd.DataFrame({"sentiment": ["positive"]}))
+    writer = _Writer(output, False, run)
+    assert writer.rows_done == 1
+
+
+@pytest.mark.parametrize("change", [
+    {"chunk_size": 2},
+    {"models": ["model1", "model2"]},
+    {"text_column": "body"},
+])
+def test_refuses_changed_settings(tmp_path, run, change):
+    output = str(tmp_path / "scored.csv")
+    _Writer(output, False, run).write(pd.DataFrame({"sentiment": ["positive"]}))
+    with pytest.raises(ValueError, match="--restart"):
+        _Writer(output, False, {**run, **change})
+    assert _Writer(output, True, {**run, **change}).rows_done == 0
+
+
+def test_refuses_changed_input(tmp_path, run):
+    output = str(tmp_path / "scored.csv")
+    _Writer(output, False, run).write(pd.DataFrame({"sentiment": ["positive"]}))
+    input_path = tmp_path / "messages.csv"
+    input_path.write_text("text\nsomething else entirely\n")
+    with pytest.raises(ValueError, match="input"):
+        _Writer(output, False, {**run, "input": input_fingerprint(str(input_path))})
@@ -0,0 +1,30 @@
+"""SamplingProfiler: reading the stacks while the sampler thread records them."""
+import threading
+import time
+
+from src.ml.instrumentation import SamplingProfiler
+
+
+def _busy(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_read_while_sampling():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy, args=(stop,))
+    worker.start()
+    profiler = SamplingProfiler(interval=0.0005)
+    profiler.start()
+    try:
+        deadline = time.monotonic() + 5
+        while profiler.samples < 50 and time.monotonic() < deadline:
+            profiler.folded()
+            profiler.top()
+    finally:
+        profiler.stop()
+        stop.set()
+        worker.join()
+    assert profiler.samples > 0
+    assert any(row["function"].startswith("test_instrumentation.py:") for row in profiler.top())
+    assert profiler.folded().count("\n") == len(profiler.stacks)
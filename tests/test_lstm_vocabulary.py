@@ -0,0 +1,21 @@
+"""lstm_vocabulary: an exported vocabulary loads back with the same word IDs."""
+from types import SimpleNamespace
+
+from src.ml.lstm_vocabulary import SequenceVocabulary, export_vocabulary
+
+
+def _tokenizer(words):
+    return SimpleNamespace(char_level=False, num_words=None, filters="", lower=False, split=" ",
+                           oov_token=None, word_index={word: i for i, word in enumerate(words, start=1)})
+
+
+def test_words_with_other_line_breaks_round_trip(tmp_path):
+    words = ["hello", "carriage\rreturn", "line\u2028separator", "tab\tbed", "world"]
+    export_vocabulary(_tokenizer(words), str(tmp_path), maxlen=4)
+    vocabulary = SequenceVocabulary.load(str(tmp_path))
+    assert vocabulary.word_index == {word: i for i, word in enumerate(words, start=1)}
+
+
+def test_empty_vocabulary(tmp_path):
+    export_vocabulary(_tokenizer([]), str(tmp_path), maxlen=4)
+    assert SequenceVocabulary.load(str(tmp_path)).word_index == {}
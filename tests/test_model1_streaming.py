@@ -0,0 +1,46 @@
+"""model1_logistic: a streaming save must not leave the TF-IDF pipeline behind."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import model1_logistic
+from src.ml.batch_score import _LinearScorer
+from src.ml.nltk_resources import ensure_nltk_resources
+
+TEXTS = ["happy sunny cheerful day", "glad joyful bright morning",
+         "gloomy rainy dull evening", "tired grey boring night"] * 25
+
+
+@pytest.fixture(autouse=True)
+def nltk_corpora():
+    try:
+        ensure_nltk_resources()
+    except LookupError as e:
+        pytest.skip(str(e))
+
+
+def test_streaming_save_replaces_tfidf_pipeline(tmp_path, monkeypatch):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    model_dir = str(tmp_path / "model1")
+    monkeypatch.setattr(model1_logistic, "MODEL_DIR", model_dir)
+
+    # An earlier TF-IDF run, with labels the streaming model doesn't have
+    vectorizer = TfidfVectorizer()
+    X = vectorizer.fit_transform(model1_logistic.preprocess_batch(TEXTS))
+    old_model = model1_logistic.build_model().fit(X, np.array(["old_a", "old_b"] * 50))
+    model1_logistic.save_model(old_model, vectorizer)
+    assert os.path.isdir(os.path.join(model_dir, "pipeline"))
+
+    data_path = tmp_path / "stream.csv"
+    labels = ["positive", "positive", "negative", "negative"] * 25
+    pd.DataFrame({"text": TEXTS, "label": labels}).to_csv(data_path, index=False)
+    model1_logistic.train_model_streaming(data_path=str(data_path), chunk_size=40, epochs=2, n_workers=1)
+
+    assert not os.path.exists(os.path.join(model_dir, "pipeline"))
+    scorer = _LinearScorer(model_dir)
+    assert scorer.pipeline is None
+    predicted, _ = scorer(["happy sunny cheerful day", "gloomy rainy dull evening"])
+    assert set(predicted) <= {"positive", "negative"}
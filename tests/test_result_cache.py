@@ -0,0 +1,42 @@
+"""ResultCache: LRU eviction and TTL expiry."""
+import pytest
+
+from src.ml import result_cache
+from src.ml.result_cache import ResultCache
+
+
+def test_rejects_non_positive_ttl():
+    for ttl in (0, -1.0):
+        with pytest.raises(ValueError):
+            ResultCache(ttl_seconds=ttl)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    cache = ResultCache(ttl_seconds=10)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    now[0] += 10
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_no_ttl_keeps_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    cache = ResultCache(ttl_seconds=None)
+    cache.put("a", 1)
+    now[0] += 1e9
+    assert cache.get("a") == 1
+
+
+def test_evicts_least_recently_used():
+    cache = ResultCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1